@@ -40,6 +40,16 @@ parser.add_argument('--seed', type=int, default=267,
                     help='integer used to seed random number generator')
 parser.add_argument('--processes', type=int, default=1,
                     help='number of processes to use in multiprocessing mode')
+parser.add_argument('--threads', default=False, action='store_true',
+                    help='use threads instead of processes for the '
+                    '--processes workers')
+parser.add_argument('--mpi', default=False, action='store_true',
+                    help='distribute the sensors across the ranks of '
+                    'MPI.COMM_WORLD; requires mpi4py and running under mpirun')
+parser.add_argument('--start_method', type=str, default=None,
+                    choices=['fork', 'spawn', 'forkserver'],
+                    help='multiprocessing start method.  If None, then '
+                    'the multiprocessing default is used.')
 parser.add_argument('--psf_file', type=str, default=None,
                     help="Pickle file containing for the persisted PSF. "
                     "If the file exists, the psf will be loaded from that "
@@ -61,16 +71,34 @@ if args.image_path is not None:
     os.environ['IMSIM_IMAGE_PATH']\
         = ':'.join([args.image_path] + desc.imsim.get_image_dirs())
 
-commands = desc.imsim.metadata_from_file(args.instcat)
+# The handle reads the instance catalog header once for the PSF and
+# the ImageSimulator.
+instcat = desc.imsim.InstCatHandle(args.instcat)
 
-obs_md = desc.imsim.phosim_obs_metadata(commands)
+if args.threads:
+    executor = desc.imsim.ThreadExecutor(max_workers=args.processes)
+elif args.processes > 1:
+    executor = desc.imsim.ProcessExecutor(processes=args.processes,
+                                          start_method=args.start_method)
+else:
+    executor = desc.imsim.SerialExecutor()
+node_id = 0
+if args.mpi:
+    executor = desc.imsim.MpiExecutor(executor)
+    node_id = executor.rank
 
-if args.psf_file is None or not os.path.isfile(args.psf_file):
-    psf = desc.imsim.make_psf(args.psf, obs_md, log_level=args.log_level)
+if args.mpi and executor.rank != 0:
+    # Use the PSF made by rank 0 so that all of the sensors see the
+    # same atmosphere.
+    psf = None
+elif args.psf_file is None or not os.path.isfile(args.psf_file):
+    psf = desc.imsim.make_psf(args.psf, instcat, log_level=args.log_level)
     if args.psf_file is not None:
         desc.imsim.save_psf(psf, args.psf_file)
 else:
     psf = desc.imsim.load_psf(args.psf_file, log_level=args.log_level)
+if args.mpi:
+    psf = executor.comm.bcast(psf, root=0)
 
 sensor_list = args.sensors.split('^') if args.sensors is not None \
     else args.sensors
@@ -80,7 +108,7 @@ apply_sensor_model = not args.disable_sensor_model
 with warnings.catch_warnings():
     warnings.filterwarnings('ignore', 'ERFA', ErfaWarning)
     image_simulator \
-        = desc.imsim.ImageSimulator(args.instcat, psf,
+        = desc.imsim.ImageSimulator(instcat, psf,
                                     numRows=args.numrows,
                                     config=args.config_file,
                                     seed=args.seed,
@@ -89,6 +117,8 @@ with warnings.catch_warnings():
                                     apply_sensor_model=apply_sensor_model,
                                     create_centroid_file=args.create_centroid_file,
                                     file_id=args.file_id,
-                                    log_level=args.log_level)
+                                    log_level=args.log_level,
+                                    psf_file=args.psf_file,
+                                    executor=executor)
 
-    image_simulator.run(processes=args.processes)
+    image_simulator.run(node_id=node_id)
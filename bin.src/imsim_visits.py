@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+"""
+Driver to simulate a list of visits back-to-back in a single process,
+reusing the camera, bandpasses, sky model, cosmic ray catalog, and tree
+ring models that are loaded for the first visit.
+"""
+import os
+import argparse
+import desc.imsim
+
+parser = argparse.ArgumentParser()
+parser.add_argument('instcats', nargs='*', help="The instance catalogs")
+parser.add_argument('--instcat_list', type=str, default=None,
+                    help="File containing instance catalog paths, "
+                    "one per line.  These are simulated after any given "
+                    "as positional arguments.")
+parser.add_argument('--outdir', type=str, default='fits',
+                    help='Output directory for eimage file')
+parser.add_argument('--sensors', type=str, default=None,
+                    help='Sensors to simulate, e.g., '
+                    '"R:2,2 S:1,1^R:2,2 S:1,0". '
+                    'If None, then simulate all sensors with sources on them')
+parser.add_argument('--config_file', type=str, default=None,
+                    help="Config file. If None, the default config will be used.")
+parser.add_argument('--log_level', type=str,
+                    choices=['DEBUG', 'INFO', 'WARN', 'ERROR', 'CRITICAL'],
+                    default='INFO', help='Logging level. Default: INFO')
+parser.add_argument('--psf', type=str, default='Kolmogorov',
+                    choices=['DoubleGaussian', 'Kolmogorov', 'Atmospheric'],
+                    help="PSF model to use.  Default: Kolmogorov")
+parser.add_argument('--disable_sensor_model', default=False,
+                    action='store_true',
+                    help='disable sensor effects')
+parser.add_argument('--file_id', type=str, default=None,
+                    help='ID string to use for checkpoint filenames. '
+                    'The visit number is appended for each visit.')
+parser.add_argument('--create_centroid_file', default=False, action="store_true",
+                    help='Write centroid file(s).')
+parser.add_argument('--seed', type=int, default=267,
+                    help='integer used to seed random number generator')
+parser.add_argument('--processes', type=int, default=1,
+                    help='number of processes to use in multiprocessing mode')
+parser.add_argument('--image_path', type=str, default=None,
+                    help="search path for FITS postage stamp images."
+                    "This will be prepended to any existing IMSIM_IMAGE_PATH "
+                    "environment variable, for which $CWD is included by "
+                    "default.")
+parser.add_argument('--stop_on_error', default=False, action='store_true',
+                    help='Stop if the simulation of a visit fails, instead '
+                    'of continuing with the next visit.')
+
+args = parser.parse_args()
+
+instcats = list(args.instcats)
+if args.instcat_list is not None:
+    with open(args.instcat_list) as input_:
+        instcats.extend(line.strip() for line in input_
+                        if line.strip() and not line.startswith('#'))
+if not instcats:
+    parser.error('no instance catalogs given')
+
+# Prepend any additional paths to IMSIM_IMAGE_PATH.
+if args.image_path is not None:
+    os.environ['IMSIM_IMAGE_PATH']\
+        = ':'.join([args.image_path] + desc.imsim.get_image_dirs())
+
+sensor_list = args.sensors.split('^') if args.sensors is not None \
+    else args.sensors
+
+results = desc.imsim.simulate_visits(
+    instcats, psf_name=args.psf, processes=args.processes,
+    config=args.config_file, seed=args.seed, outdir=args.outdir,
+    sensor_list=sensor_list,
+    apply_sensor_model=not args.disable_sensor_model,
+    create_centroid_file=args.create_centroid_file, file_id=args.file_id,
+    log_level=args.log_level, stop_on_error=args.stop_on_error)
+
+failed = [instcat for instcat, result in results.items()
+          if isinstance(result, Exception)]
+if failed:
+    raise SystemExit('{} of {} visits failed:\n  {}'
+                     .format(len(failed), len(results), '\n  '.join(failed)))
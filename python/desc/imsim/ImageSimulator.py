@@ -4,42 +4,74 @@ multiprocessing module.
 """
 import os
 import re
-import multiprocessing
+import time
+import uuid
+import queue
+import hashlib
+import threading
+import concurrent.futures
+from collections import defaultdict
 import warnings
 import gzip
 import shutil
 import sqlite3
 import numpy as np
+import psutil
 from astropy._erfa import ErfaWarning
 from lsst.afw.cameraGeom import WAVEFRONT, GUIDER
 from lsst.sims.photUtils import BandpassDict
 from lsst.sims.GalSimInterface import make_galsim_detector
 from lsst.sims.GalSimInterface import make_gs_interpreter
 from lsst.sims.GalSimInterface import LSSTCameraWrapper
-from .imSim import read_config, parsePhoSimInstanceFile, add_cosmic_rays,\
-    add_treering_info, get_logger, TracebackDecorator
+from .imSim import read_config, get_config, parsePhoSimInstanceFile,\
+    add_cosmic_rays, add_treering_info, get_logger, load_psf,\
+    TracebackDecorator, InstCatHandle
 from .bleed_trails import apply_channel_bleeding
 from .skyModel import make_sky_model
 from .process_monitor import process_monitor
 from .camera_readout import ImageSource
 from .atmPSF import AtmosphericPSF
+from .sed_wrapper import SedWrapper
+from .sensor_cost import SensorCostModel
+from .checkpoint_store import CheckpointStore
+from .visit_manifest import VisitManifest
+from .executors import SerialExecutor, ProcessExecutor, pipeline_stage,\
+    completed_futures
 
-__all__ = ['ImageSimulator', 'compress_files']
+__all__ = ['ImageSimulator', 'SensorSpec', 'compress_files',
+           'generate_object_seed']
 
-# This is global variable is needed since instances of ImageSimulator
-# contain references to unpickleable objects in the LSST Stack (e.g.,
-# various cameraGeom objects), and the multiprocessing module can only
-# execute pickleable functions. The SimulateSensor functor class below
-# uses the global IMAGE_SIMULATOR variable to access its
-# gs_interpreter objects, and the ImageSimulator.run method sets
-# IMAGE_SIMULATOR to self so that it is available in the
-# SimulateSensor functors.
-IMAGE_SIMULATOR = None
+# Instances of ImageSimulator contain references to unpickleable
+# objects in the LSST Stack (e.g., various cameraGeom objects), so the
+# SimulateSensor functors are given a picklable SensorSpec instead,
+# from which a worker process can create the sensor's GalSimInterpreter.
+# For the fork start method, and for serial running, the
+# GalSimInterpreters and PSFs that the ImageSimulator.run method
+# creates in the parent process are registered here, keyed by
+# SensorSpec.key, so that the workers can use them directly.
+_GS_INTERPRETERS = dict()
+_PSFS = dict()
 
-# This global variable is needed since the CheckpointSummary class, of
-# which CHECKPOINT_SUMMARY would be an instance, uses an unpickleable
-# sqlite db connection to persist the checkpoint info.
-CHECKPOINT_SUMMARY = None
+# The camera and the bandpasses for each band are loaded once per
+# process and reused for subsequent sensors and visits.
+_CAMERA_WRAPPER = []
+_TOTAL_BANDPASSES = dict()
+
+def camera_wrapper():
+    "Return the LSSTCameraWrapper for this process."
+    if not _CAMERA_WRAPPER:
+        _CAMERA_WRAPPER.append(LSSTCameraWrapper())
+    return _CAMERA_WRAPPER[0]
+
+def total_bandpasses(band):
+    """
+    Return the BandpassDict of total throughputs for the band, e.g.,
+    'r', loading it from the throughput files on first use.
+    """
+    if band not in _TOTAL_BANDPASSES:
+        _TOTAL_BANDPASSES[band] \
+            = BandpassDict.loadTotalBandpassesFromFiles(bandpassNames=band)
+    return _TOTAL_BANDPASSES[band]
 
 
 class ImageSimulator:
@@ -49,12 +81,14 @@ class ImageSimulator:
     """
     def __init__(self, instcat, psf, numRows=None, config=None, seed=267,
                  outdir='fits', sensor_list=None, apply_sensor_model=True,
-                 create_centroid_file=False, file_id=None, log_level='WARN'):
+                 create_centroid_file=False, file_id=None, log_level='WARN',
+                 camera_wrapper=None, psf_file=None, executor=None):
         """
         Parameters
         ----------
-        instcat: str
-            The instance catalog for the desired visit.
+        instcat: str or InstCatHandle
+            The instance catalog for the desired visit, or a handle
+            for it.
         psf: lsst.sims.GalSimInterface.PSFbase subclass
             PSF to use for drawing objects.  A single instance is used
             by all of the GalSimInterpreters so that memory for any
@@ -80,29 +114,118 @@ class ImageSimulator:
             If None, then no checkpoint file will be used
         log_level: str ['WARN']
             Logging level ('DEBUG', 'INFO', 'WARN', 'ERROR', 'CRITICAL').
+        camera_wrapper: lsst.sims.GalSimInterface.LSSTCameraWrapper [None]
+            Camera wrapper to use.  If None, then a new one is created.
+            Passing the same instance to the ImageSimulators for
+            several visits avoids rebuilding the camera each time.
+        psf_file: str [None]
+            Pickle file containing the persisted psf, see save_psf.
+            Worker processes that are not forked load the PSF from
+            this file instead of receiving a pickled copy with each
+            sensor.
+        executor: SerialExecutor, ThreadExecutor, ProcessExecutor or
+                  MpiExecutor [None]
+            The executor to run the sensor simulations.  Only the
+            sensors in executor.partition(sensor_list) are simulated
+            by this process.  If None, then the sensors are simulated
+            serially or in a ProcessExecutor, depending on the
+            processes argument of .run(...).
         """
         self.config = read_config(config)
         self.log_level = log_level
         self.logger = get_logger(self.log_level, name='ImageSimulator')
         self.create_centroid_file = create_centroid_file
         self.psf = psf
+        self.psf_file = psf_file
         self.outdir = outdir
-        self.camera_wrapper = LSSTCameraWrapper()
+        if camera_wrapper is None:
+            camera_wrapper = LSSTCameraWrapper()
+        self.camera_wrapper = camera_wrapper
         if sensor_list is None:
             sensor_list = self._get_all_sensors()
-        self.logger.debug("parsing instance catalog for %d sensor(s)",
-                          len(sensor_list))
-        checkpoint_files = self._gather_checkpoint_files(sensor_list, file_id)
-        self.obs_md, self.phot_params, sources \
-            = parsePhoSimInstanceFile(instcat, sensor_list, numRows=numRows,
-                                      checkpoint_files=checkpoint_files,
-                                      log_level=log_level)
-        self.gs_obj_dict = sources[1]
+        self.executor = executor
+        if executor is not None:
+            sensor_list = executor.partition(sensor_list)
+        # Drop the sensors that were completed by a previous job
+        # before parsing the instance catalog.
+        instcat = InstCatHandle.get(instcat)
+        commands = instcat.commands
+        self.manifest = VisitManifest(outdir, commands['obshistid'],
+                                      commands['bandpass'])
+        sensor_list = self._remove_completed_sensors(
+            sensor_list, commands['obshistid'], commands['bandpass'])
+        if sensor_list:
+            self.logger.debug("parsing instance catalog for %d sensor(s)",
+                              len(sensor_list))
+            checkpoint_files = self._gather_checkpoint_files(sensor_list,
+                                                             file_id)
+            self.obs_md, self.phot_params, sources \
+                = parsePhoSimInstanceFile(instcat, sensor_list,
+                                          numRows=numRows,
+                                          checkpoint_files=checkpoint_files,
+                                          log_level=log_level)
+            self.gs_obj_dict = sources[1]
+        else:
+            self.logger.info("all sensors have been simulated")
+            with warnings.catch_warnings():
+                warnings.filterwarnings('ignore', 'ERFA', ErfaWarning)
+                self.obs_md = instcat.obs_md
+            self.phot_params = instcat.phot_params
+            self.gs_obj_dict = dict()
         self.apply_sensor_model = apply_sensor_model
         self.file_id = file_id
-        self._make_gs_interpreters(seed, sensor_list, file_id)
-        self.log_level = log_level
-        self.logger = get_logger(self.log_level, name='ImageSimulator')
+        self.seed = seed
+        self.key = uuid.uuid4().hex
+        self.sensor_specs = self._make_sensor_specs(sensor_list, file_id)
+        self.gs_interpreters = dict()
+
+    def _remove_completed_sensors(self, sensor_list, visit, band):
+        """
+        Return the sensors in sensor_list that have not been
+        completed.  Sensors listed in the visit manifest are completed
+        if the output files it lists for them exist.  Other sensors,
+        e.g., ones whose outputs were written before the manifest was
+        introduced, whose manifest record was lost, or which were
+        recorded without output files by earlier versions, are
+        completed if their requested output files (raw or eimage)
+        exist.  If the overwrite flag in the config is True, then no
+        sensors are removed.
+        """
+        if self.config['persistence']['overwrite']:
+            return list(sensor_list)
+        completed = self.manifest.completed_sensors()
+        remaining = []
+        for det_name in sensor_list:
+            if completed.get(det_name):
+                files = completed[det_name]
+            else:
+                files = self._output_files(det_name, visit, band)
+            if all(os.path.isfile(_) for _ in files):
+                self.logger.info("%s output files already exist, skipping.",
+                                 det_name)
+                continue
+            remaining.append(det_name)
+        return remaining
+
+    def _output_files(self, det_name, visit, band):
+        """
+        Return the paths of the output files that the config says to
+        write for a sensor.
+        """
+        persist = self.config['persistence']
+        files = []
+        if persist['make_eimage']:
+            eimage_file = output_file_name(self.outdir,
+                                           persist['eimage_prefix'],
+                                           visit, det_name, band)
+            if persist['eimage_compress']:
+                eimage_file += '.gz'
+            files.append(eimage_file)
+        if persist['make_raw_file']:
+            files.append(output_file_name(self.outdir,
+                                          persist['raw_file_prefix'],
+                                          visit, det_name, band))
+        return files
 
     def _gather_checkpoint_files(self, sensor_list, file_id=None):
         """
@@ -119,58 +242,70 @@ class ImageSimulator:
                 checkpoint_files[det_name] = filename
         return checkpoint_files
 
-    def _make_gs_interpreters(self, seed, sensor_list, file_id):
+    def _make_sensor_specs(self, sensor_list, file_id):
+        """
+        Create the SensorSpecs for the science sensors in sensor_list.
+        """
+        config = {section: dict(self.config[section])
+                  for section in self.config.imsim_sections}
+        sensor_specs = dict()
+        for det in self.camera_wrapper.camera:
+            det_name = det.getName()
+            if sensor_list is not None and det_name not in sensor_list:
+                continue
+            if det.getType() in (WAVEFRONT, GUIDER):
+                continue
+            checkpoint_file = None if file_id is None \
+                else self.checkpoint_file(file_id, det_name)
+            sensor_specs[det_name] \
+                = SensorSpec(det_name, self.obs_md, self.phot_params,
+                             self.psf, config, seed=self.seed,
+                             outdir=self.outdir,
+                             apply_sensor_model=self.apply_sensor_model,
+                             checkpoint_file=checkpoint_file,
+                             create_centroid_file=self.create_centroid_file,
+                             log_level=self.log_level,
+                             psf_file=self.psf_file, key=self.key)
+        return sensor_specs
+
+    def _make_gs_interpreters(self, separate_sky_models=False):
         """
         Create a separate GalSimInterpreter for each sensor so that
         they can be run in parallel and maintain separate checkpoint
-        files.
+        files, and register them so that the SimulateSensor functors
+        in this process, or in processes forked from it, can use them.
 
-        Also extract GsObjectLists from gs_obj_dict for only the
-        sensors in sensor_list so that the memory in the underlying
-        InstCatTrimmer object in gs_obj_dict can be recovered.
+        If separate_sky_models is True, each GalSimInterpreter gets its
+        own sky model, and so its own noise random number generator,
+        so that they can be used by concurrent threads.
         """
-        bp_dict = BandpassDict.loadTotalBandpassesFromFiles(bandpassNames=self.obs_md.bandpass)
+        bp_dict = total_bandpasses(self.obs_md.bandpass)
+        # Compute the Galactic extinction coefficients on the common
+        # wavelength grid here so that the worker processes share them.
+        SedWrapper.shared_resources['ccm_model'].precompute(bp_dict.wavelenMatch)
         noise_and_background \
-            = make_sky_model(self.obs_md, self.phot_params, seed=seed,
+            = make_sky_model(self.obs_md, self.phot_params, seed=self.seed,
                              apply_sensor_model=self.apply_sensor_model)
-        self.gs_interpreters = dict()
-        for det in self.camera_wrapper.camera:
-            det_type = det.getType()
-            det_name = det.getName()
-            if sensor_list is not None and det_name not in sensor_list:
+        _PSFS[self.key] = self.psf
+        for det_name, spec in self.sensor_specs.items():
+            if det_name in self.gs_interpreters:
                 continue
-            if det_type in (WAVEFRONT, GUIDER):
-                continue
-            gs_det = make_galsim_detector(self.camera_wrapper, det_name,
-                                          self.phot_params, self.obs_md)
+            if separate_sky_models:
+                noise_and_background = make_sky_model(
+                    self.obs_md, self.phot_params, seed=self.seed,
+                    apply_sensor_model=self.apply_sensor_model)
             self.gs_interpreters[det_name] \
-                = make_gs_interpreter(self.obs_md, [gs_det], bp_dict,
-                                      noise_and_background,
-                                      epoch=2000.0, seed=seed,
-                                      apply_sensor_model=self.apply_sensor_model,
-                                      bf_strength=self.config['ccd']['bf_strength'])
-
-            self.gs_interpreters[det_name].sky_bg_per_pixel \
-                = noise_and_background.sky_counts(det_name)
-            self.gs_interpreters[det_name].setPSF(PSF=self.psf)
-
-            if self.apply_sensor_model:
-                add_treering_info(self.gs_interpreters[det_name].detectors)
-
-            if file_id is not None:
-                self.gs_interpreters[det_name].checkpoint_file \
-                    = self.checkpoint_file(file_id, det_name)
-                self.gs_interpreters[det_name].nobj_checkpoint \
-                    = self.config['checkpointing']['nobj']
-                self.gs_interpreters[det_name]\
-                    .restore_checkpoint(self.camera_wrapper,
-                                        self.phot_params,
-                                        self.obs_md)
-
-            if self.create_centroid_file:
-                self.gs_interpreters[det_name].centroid_base_name = \
-                    os.path.join(self.outdir,
-                                 self.config['persistence']['centroid_prefix'])
+                = spec.make_gs_interpreter(self.camera_wrapper, bp_dict,
+                                           noise_and_background)
+            _GS_INTERPRETERS[spec.key, det_name] \
+                = self.gs_interpreters[det_name]
+
+    def _release_gs_interpreters(self):
+        "Remove the registered GalSimInterpreters and PSF."
+        for det_name in self.gs_interpreters:
+            _GS_INTERPRETERS.pop((self.key, det_name), None)
+        _PSFS.pop(self.key, None)
+        self.gs_interpreters = dict()
 
     def _get_all_sensors(self):
         """Get a list of all of the science sensors."""
@@ -214,144 +349,553 @@ class ImageSimulator:
         -------
         str: The output file path.
         """
-        prefix_key = 'raw_file_prefix' if raw else 'eimage_prefix'
-        detector = self.gs_interpreters[det_name].detectors[0]
-        prefix = self.config['persistence'][prefix_key]
-        visit = str(self.obs_md.OpsimMetaData['obshistID'])
-        return os.path.join(self.outdir, prefix + '_'.join(
-            (visit, detector.fileName, self.obs_md.bandpass + '.fits')))
-
-    def run(self, processes=1, wait_time=None, node_id=0):
-        """
-        Use multiprocessing module to simulate sensors in parallel.
-        """
-        # Set the IMAGE_SIMULATOR variable so that the SimulateSensor
-        # instance can use it to access the GalSimInterpreter
-        # instances to draw objects.
-        global IMAGE_SIMULATOR
-        if IMAGE_SIMULATOR is None:
-            IMAGE_SIMULATOR = self
-        elif id(IMAGE_SIMULATOR) != id(self):
-            raise RuntimeError("Attempt to use more than one instance of "
-                               "ImageSimulator in the same python interpreter")
-
-        # Set the CHECKPOINT_SUMMARY variable so that the summary info
-        # from the subprocesses can be persisted.
-        global CHECKPOINT_SUMMARY
-        if (self.file_id is not None and processes > 1 and
-            CHECKPOINT_SUMMARY is None):
+        return self.sensor_specs[det_name].output_file(raw=raw)
+
+    def run(self, processes=1, wait_time=None, node_id=0, start_method=None):
+        """
+        Simulate the sensors using the executor given to the
+        constructor or, if that is None, serially or with a
+        multiprocessing pool.
+
+        Parameters
+        ----------
+        processes: int [1]
+            Number of processes to use if no executor was given.  If
+            1, then the sensors are simulated serially in this process.
+        wait_time: float [None]
+            Time interval in seconds for the process_monitor.  If None,
+            then the process_monitor is not run.
+        node_id: int [0]
+            ID of the node, used in the checkpoint summary db filename.
+        start_method: str [None]
+            The multiprocessing start method, 'fork', 'spawn' or
+            'forkserver', if no executor was given.  If None, then use
+            the multiprocessing default.  For the 'fork' method, the
+            GalSimInterpreters are created in this process and
+            inherited by the workers; otherwise, each worker creates
+            the GalSimInterpreter for its sensor from the SensorSpec.
+
+        Returns
+        -------
+        list: The results of the tasks, gathered by the executor.
+        """
+        executor = self.executor
+        if executor is None:
+            executor = SerialExecutor() if processes == 1 \
+                else ProcessExecutor(processes, start_method=start_method)
+        if executor.in_process or executor.forked:
+            self._make_gs_interpreters(
+                separate_sky_models=executor.in_process and executor.parallel)
+        for spec in self.sensor_specs.values():
+            spec.ship_psf = not (executor.in_process or executor.forked)
+
+        # If checkpointing, create the summary db and start the
+        # ProgressAggregator so that the progress info from the
+        # workers can be persisted.
+        checkpoint_summary = None
+        progress = None
+        if self.file_id is not None and executor.parallel:
             db_file = 'ckpt_{}_{}.sqlite3'.format(self.file_id, node_id)
-            CHECKPOINT_SUMMARY = CheckpointSummary(db_file=db_file)
+            checkpoint_summary = CheckpointSummary(db_file=db_file)
+            context = None if executor.in_process else executor.context
+            progress = ProgressAggregator(db_file, context=context,
+                                          log_level=self.log_level)
+            progress.start()
 
-        results = []
-        if processes == 1:
-            # Don't need multiprocessing, so just run serially.
-            for det_name in self.gs_interpreters:
-                if self._outfiles_exist(det_name):
-                    continue
-                simulate_sensor = SimulateSensor(det_name, self.log_level)
-                results.append(simulate_sensor(self.gs_obj_dict[det_name]))
-            return results
-
-        # Use multiprocessing.
-        pool = multiprocessing.Pool(processes=processes)
-        receivers = []
-        if wait_time is not None:
-            results.append(pool.apply_async(TracebackDecorator(process_monitor),
-                                            (), dict(wait_time=wait_time)))
-        for det_name in self.gs_interpreters:
+        try:
+            futures = self._simulate_sensors(executor, wait_time,
+                                             checkpoint_summary, progress)
+        finally:
+            executor.shutdown()
+            # Wait for the outputs of sensors drawn in this process to
+            # be finalized.
+            pipeline_stage().drain()
+            self._release_gs_interpreters()
+            if progress is not None:
+                progress.stop()
+            if checkpoint_summary is not None:
+                checkpoint_summary.close()
+        if self.config['persistence'].get('async_write', False):
+            futures = self._check_finalized(futures)
+        return executor.gather(futures)
+
+    def _check_finalized(self, futures):
+        """
+        Replace the futures of sensors that are missing from the visit
+        manifest with failed futures.  With async_write, a sensor's
+        task returns before its outputs are finalized, so a failure
+        in finalize, including one in the drain of the PipelineStage
+        when a worker exits, does not fail the task.  The executor has
+        been shut down, so all of the outputs have been finalized.
+        """
+        completed = self.manifest.completed_sensors()
+        checked = []
+        for future in futures:
+            try:
+                result = future.result()
+            except Exception:
+                checked.append(future)
+                continue
+            if result in self.sensor_specs and result not in completed:
+                self.logger.error("outputs of %s were not finalized",
+                                  result)
+                future = concurrent.futures.Future()
+                future.set_exception(RuntimeError(
+                    "finalizing the outputs of {} failed".format(result)))
+            checked.append(future)
+        return checked
+
+    def _simulate_sensors(self, executor, wait_time, checkpoint_summary,
+                          progress):
+        """
+        Submit the sensor simulation tasks to the executor and return
+        the futures for their results.
+        """
+        futures = []
+        progress_queue = None if progress is None else progress.queue
+        if wait_time is not None and executor.parallel:
+            futures.append(executor.submit(TracebackDecorator(process_monitor),
+                                           wait_time=wait_time))
+        # Submit the sensors in order of decreasing estimated cost so
+        # that the most expensive ones do not start last.  Idle
+        # workers take the next sensor from the executor's task queue.
+        cost_estimates = self.estimate_sensor_costs()
+        num_shards = self.config['objects'].get('sensor_shards', 1)
+        shard_min_cost = self.config['objects'].get('shard_min_cost', 0)
+        if self.create_centroid_file or executor.in_process:
+            # The centroid files are written by the process that
+            # draws the first shard, and threads would share the
+            # random number generators of a sensor's shards, so don't
+            # split the sensors in those cases.
+            num_shards = 1
+        if (num_shards > 1
+                and not self.config['objects'].get('per_object_seeds', True)):
+            # The shards are only equivalent to drawing all of the
+            # objects in one process if per-object seeds are used.
+            raise RuntimeError("sensor_shards > 1 requires "
+                               "per_object_seeds = True in the [objects] "
+                               "section of the config")
+        sharded_sensors = dict()
+        for det_name in sorted(cost_estimates, key=cost_estimates.get,
+                               reverse=True):
             gs_objects = self.gs_obj_dict[det_name]
-            if self._outfiles_exist(det_name) or not gs_objects:
+            spec = self.sensor_specs[det_name]
+            if not gs_objects:
+                # Sensors without objects are not added to the visit
+                # manifest, since whether a sensor has objects depends
+                # on the numRows and minsource settings of the run.
+                continue
+
+            if num_shards > 1 and cost_estimates[det_name] >= shard_min_cost:
+                # Draw all of the shards in separate tasks.  The summed
+                # shard images are added to the sky background by the
+                # SimulateSensor functor, which is submitted below once
+                # all of the shards are finished.
+                draw_shard = DrawSensorShard(spec)
+                sharded_sensors[det_name] = \
+                    (len(gs_objects),
+                     [executor.submit(TracebackDecorator(draw_shard), shard)
+                      for shard in gs_objects.shards(num_shards)])
                 continue
 
-            # If we are checkpointing, create the connections between
-            # the checkpoint_aggregator and the SimulateSensor
-            # functors, insert a record into the summary db for the
-            # current detector, and add the receiver to the list to
-            # pass to the checkpoint_aggregator.
-            sender = None
-            if CHECKPOINT_SUMMARY is not None:
-                receiver, sender = multiprocessing.Pipe(duplex=False)
-                CHECKPOINT_SUMMARY.insert_record(det_name, len(gs_objects))
-                receivers.append(receiver)
+            # If we are checkpointing, insert a record into the
+            # summary db for the current detector, which the
+            # ProgressAggregator updates with the progress info sent
+            # by the SimulateSensor functor.
+            if checkpoint_summary is not None:
+                checkpoint_summary.insert_record(det_name, len(gs_objects))
 
             # Create the function that renders the night sky on
             # the sensor.
-            simulate_sensor = SimulateSensor(det_name, self.log_level, sender)
-
-            # Add it to the processing pool.
-            results.append(pool.apply_async(TracebackDecorator(simulate_sensor),
-                                            (gs_objects,)))
-        pool.close()
-
-        if CHECKPOINT_SUMMARY is not None:
-            # Create a separate processing pool for the
-            # checkpoint_aggregator.
-            agg_pool = multiprocessing.Pool(processes=1)
-            aggregator \
-                = agg_pool.apply_async(TracebackDecorator(checkpoint_aggregator),
-                                       (receivers,))
-            agg_pool.close()
-            agg_pool.join()
-            aggregator.get()
-
-        # The simulate_sensor pool must be joined after the aggregator
-        # pool so that the checkpoint_aggregator is running when the
-        # summary info is sent by the simulate_sensor workers.
-        pool.join()
-        return [res.get() for res in results]
-
-    def _outfiles_exist(self, det_name):
-        """
-        Check if requested output files (raw or eimage) exist.  If
-        either do not, then return False.  Otherwise, return True.
-
-        However, if the overwrite flag in the config is True, then
-        return False so that any existing files are overwritten.
-        """
-        persist = self.config['persistence']
+            simulate_sensor = SimulateSensor(
+                spec, progress_queue, cost_estimate=cost_estimates[det_name])
 
-        if persist['overwrite']:
-            return False
+            # Submit it to the executor.
+            futures.append(executor.submit(TracebackDecorator(simulate_sensor),
+                                           gs_objects))
 
-        if persist['make_eimage']:
-            eimage_file = self.output_file(det_name, raw=False)
-            if persist['eimage_compress']:
-                eimage_file += '.gz'
-            if not os.path.isfile(eimage_file):
-                return False
+        # Sum the shard images as they finish, and submit the
+        # SimulateSensor functor for each sharded sensor as soon as all
+        # of its shards are finished.
+        shard_sensors = {shard_future: det_name for det_name, (_, shard_futures)
+                         in sharded_sensors.items()
+                         for shard_future in shard_futures}
+        shard_images = defaultdict(dict)
+        for shard_future in completed_futures(list(shard_sensors)):
+            det_name = shard_sensors[shard_future]
+            if det_name not in sharded_sensors:
+                # Another shard of the sensor failed.
+                continue
+            num_objects, shard_futures = sharded_sensors[det_name]
+            try:
+                results = shard_future.result()
+            except Exception as eobj:
+                # Mark the sensor as failed, and return the exception
+                # with the results of the other sensors.
+                self.logger.error("drawing a shard of %s failed: %s",
+                                  det_name, eobj)
+                del sharded_sensors[det_name]
+                shard_images.pop(det_name, None)
+                if checkpoint_summary is not None:
+                    checkpoint_summary.insert_record(det_name, num_objects)
+                    try:
+                        checkpoint_summary.update_records(
+                            {det_name: dict(status='failed',
+                                            end_time=time.time())})
+                    except sqlite3.OperationalError:
+                        pass
+                futures.append(shard_future)
+                continue
+            images = shard_images[det_name]
+            for name, array in results.items():
+                if name in images:
+                    images[name] += array
+                else:
+                    images[name] = array
+            shard_futures.remove(shard_future)
+            if shard_futures:
+                continue
+            del sharded_sensors[det_name]
+            if checkpoint_summary is not None:
+                checkpoint_summary.insert_record(det_name, num_objects)
+            simulate_sensor = SimulateSensor(
+                self.sensor_specs[det_name], progress_queue,
+                cost_estimate=cost_estimates[det_name])
+            futures.append(executor.submit(TracebackDecorator(simulate_sensor),
+                                           None, shard_images.pop(det_name)))
+        return futures
 
-        if persist['make_raw_file']:
-            raw_file = self.output_file(det_name, raw=True)
-            if not os.path.isfile(raw_file):
-                return False
+    def estimate_sensor_costs(self, cost_model=None):
+        """
+        Estimate the relative cost of simulating each sensor from its
+        trimmed instance catalog objects.
 
-        self.logger.info("%s output files already exists, skipping.", det_name)
-        return True
+        Parameters
+        ----------
+        cost_model: SensorCostModel [None]
+            Model to use.  If None, use SensorCostModel with the default
+            coefficients.
+
+        Returns
+        -------
+        dict: Cost estimates keyed by sensor name.
+        """
+        if cost_model is None:
+            cost_model = SensorCostModel()
+        cost_estimates = dict()
+        for det_name in self.sensor_specs:
+            cost_estimates[det_name] = cost_model.estimate(
+                self.gs_obj_dict[det_name].object_array())
+            self.logger.debug("%s: estimated cost %.1f", det_name,
+                              cost_estimates[det_name])
+        return cost_estimates
 
 
-class SimulateSensor:
+class SensorSpec:
     """
-    Functor class for simulating sensors in parallel using the
-    multiprocessing module.  Note that the IMAGE_SIMULATOR variable is
-    defined in the global scope.
+    Picklable specification of the work to simulate one sensor for a
+    visit: the visit metadata, a snapshot of the configuration, and a
+    handle to the PSF.  The objects to draw are passed separately as a
+    GsObjectList, which refers to the shared object table.
+
+    A worker process uses the GalSimInterpreter registered for the
+    sensor by the parent process if it has one, i.e., if it was
+    forked, and otherwise creates it from the spec, so that the
+    SimulateSensor functors work with any multiprocessing start method.
     """
-    def __init__(self, sensor_name, log_level='WARN', sender=None):
+    def __init__(self, det_name, obs_md, phot_params, psf, config, seed=267,
+                 outdir='fits', apply_sensor_model=True, checkpoint_file=None,
+                 create_centroid_file=False, log_level='WARN', psf_file=None,
+                 key=None):
         """
         Parameters
         ----------
-        sensor_name: str
-            The name of the sensor to be simulated, e.g., "R:2,2 S:1,1".
+        det_name: str
+            The name of the sensor, e.g., "R:2,2 S:1,1".
+        obs_md: lsst.sims.utils.ObservationMetaData
+            The visit metadata.
+        phot_params: lsst.sims.photUtils.PhotometricParameters
+            The photometric parameters of the visit.
+        psf: lsst.sims.GalSimInterface.PSFbase subclass
+            PSF to use for drawing objects.
+        config: dict
+            Snapshot of the configuration parameters, keyed by section.
+        seed: int [267]
+            Random number seed to pass to the GalSimInterpreter.
+        outdir: str ['fits']
+            Output directory to write the FITS images.
+        apply_sensor_model: bool [True]
+            Flag to apply galsim.SiliconSensor model.
+        checkpoint_file: str [None]
+            The checkpoint file.  If None, then don't checkpoint.
+        create_centroid_file: bool [False]
+            Flag to write a centroid file.
         log_level: str ['WARN']
             Logging level ('DEBUG', 'INFO', 'WARN', 'ERROR', 'CRITICAL').
-        sender: multiprocessing.connection.Connection
-            Sender to the checkpoint_aggregator.
+        psf_file: str [None]
+            Pickle file containing the persisted psf.
+        key: str [None]
+            Key of the ImageSimulator, used to look up the
+            GalSimInterpreters and PSF registered by it.
         """
-        self.sensor_name = sensor_name
+        self.det_name = det_name
+        self.obs_md = obs_md
+        self.phot_params = phot_params
+        self.psf = psf
+        self.config = config
+        self.seed = seed
+        self.outdir = outdir
+        self.apply_sensor_model = apply_sensor_model
+        self.checkpoint_file = checkpoint_file
+        self.create_centroid_file = create_centroid_file
         self.log_level = log_level
-        self.sender = sender
+        self.psf_file = psf_file
+        self.key = key
+        # If True, the PSF is pickled with the spec if it can't be
+        # loaded from psf_file.
+        self.ship_psf = False
 
-    def __call__(self, gs_objects):
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        if not self.ship_psf or self.psf_file is not None:
+            state['psf'] = None
+        return state
+
+    @property
+    def visit(self):
+        "The visit number."
+        return self.obs_md.OpsimMetaData['obshistID']
+
+    def install_config(self):
+        """
+        Set the configuration of this process from the snapshot, so
+        that code using get_config() sees the same parameters as the
+        parent process.
+        """
+        my_config = get_config()
+        for section, params in self.config.items():
+            my_config[section].update(params)
+
+    def get_psf(self):
+        "Return the PSF, loading it from the psf_file if necessary."
+        if self.psf is not None:
+            return self.psf
+        if self.key in _PSFS:
+            return _PSFS[self.key]
+        if self.psf_file is None:
+            raise RuntimeError("PSF for {} is not available"
+                               .format(self.det_name))
+        if self.psf_file not in _PSFS:
+            _PSFS[self.psf_file] = load_psf(self.psf_file,
+                                            log_level=self.log_level)
+        return _PSFS[self.psf_file]
+
+    def output_file(self, raw=True):
+        """
+        Generate the path of the output FITS file for either raw or
+        eimage files.
+
+        Parameters
+        ----------
+        raw: bool [True]
+            Generate a raw filename.
+
+        Returns
+        -------
+        str: The output file path.
+        """
+        prefix_key = 'raw_file_prefix' if raw else 'eimage_prefix'
+        return output_file_name(self.outdir,
+                                self.config['persistence'][prefix_key],
+                                self.visit, self.det_name,
+                                self.obs_md.bandpass)
+
+    def make_gs_interpreter(self, camera_wrapper, bp_dict,
+                            noise_and_background):
+        """
+        Create the GalSimInterpreter for the sensor.
+
+        Parameters
+        ----------
+        camera_wrapper: lsst.sims.GalSimInterface.LSSTCameraWrapper
+        bp_dict: lsst.sims.photUtils.BandpassDict
+            The total throughput for the visit's band.
+        noise_and_background: ESOSkyModel
+            The sky model for the visit.
+
+        Returns
+        -------
+        lsst.sims.GalSimInterface.GalSimInterpreter
+        """
+        gs_interpreter = self._new_gs_interpreter(camera_wrapper, bp_dict,
+                                                  noise_and_background)
+
+        gs_interpreter.checkpoint_store = None
+        if self.checkpoint_file is not None:
+            gs_interpreter.checkpoint_file = self.checkpoint_file
+            gs_interpreter.nobj_checkpoint \
+                = self.config['checkpointing']['nobj']
+            if self.use_checkpoint_store:
+                # Checkpoints are written by the CheckpointStore, so
+                # disable the GalSimInterpreter checkpointing.
+                store = CheckpointStore(self.checkpoint_file)
+                if CheckpointStore.is_legacy(self.checkpoint_file):
+                    gs_interpreter.restore_checkpoint(camera_wrapper,
+                                                      self.phot_params,
+                                                      self.obs_md)
+                    store.write(gs_interpreter)
+                else:
+                    store.restore(gs_interpreter, self.obs_md.bandpass)
+                gs_interpreter.checkpoint_file = None
+                gs_interpreter.checkpoint_store = store
+            else:
+                gs_interpreter.restore_checkpoint(camera_wrapper,
+                                                  self.phot_params,
+                                                  self.obs_md)
+
+        if self.create_centroid_file:
+            gs_interpreter.centroid_base_name = \
+                os.path.join(self.outdir,
+                             self.config['persistence']['centroid_prefix'])
+        return gs_interpreter
+
+    def _new_gs_interpreter(self, camera_wrapper, bp_dict,
+                            noise_and_background):
+        """
+        Create a GalSimInterpreter for the sensor without restoring
+        its checkpoint or setting up the centroid file.
+        """
+        gs_det = make_galsim_detector(camera_wrapper, self.det_name,
+                                      self.phot_params, self.obs_md)
+        gs_interpreter \
+            = make_gs_interpreter(self.obs_md, [gs_det], bp_dict,
+                                  noise_and_background,
+                                  epoch=2000.0, seed=self.seed,
+                                  apply_sensor_model=self.apply_sensor_model,
+                                  bf_strength=self.config['ccd']['bf_strength'])
+
+        gs_interpreter.sky_bg_per_pixel \
+            = noise_and_background.sky_counts(self.det_name)
+        gs_interpreter.setPSF(PSF=self.get_psf())
+
+        if self.apply_sensor_model:
+            add_treering_info(gs_interpreter.detectors)
+        return gs_interpreter
+
+    def _visit_models(self):
+        """
+        Set the configuration of this process from the snapshot and
+        return the bandpasses and a new sky model for the visit.
+        """
+        self.install_config()
+        bp_dict = total_bandpasses(self.obs_md.bandpass)
+        SedWrapper.shared_resources['ccm_model'].precompute(bp_dict.wavelenMatch)
+        noise_and_background \
+            = make_sky_model(self.obs_md, self.phot_params, seed=self.seed,
+                             apply_sensor_model=self.apply_sensor_model)
+        return bp_dict, noise_and_background
+
+    @property
+    def use_checkpoint_store(self):
+        """
+        True if the sensor is checkpointed with a CheckpointStore.
+        The GalSimInterpreter checkpoints are used if the config says
+        so, or if centroid files are written, since the centroids of
+        the drawn objects are only saved in those checkpoints.
+        """
+        return (self.checkpoint_file is not None
+                and not self.create_centroid_file
+                and self.config['checkpointing'].get('incremental', True))
+
+    def gs_interpreter(self):
+        """
+        Return the GalSimInterpreter for the sensor, creating it if
+        it was not registered by the parent process.
+        """
+        try:
+            return _GS_INTERPRETERS[self.key, self.det_name]
+        except KeyError:
+            pass
+        bp_dict, noise_and_background = self._visit_models()
+        _GS_INTERPRETERS[self.key, self.det_name] \
+            = self.make_gs_interpreter(camera_wrapper(), bp_dict,
+                                       noise_and_background)
+        return _GS_INTERPRETERS[self.key, self.det_name]
+
+    def shard_gs_interpreter(self):
+        """
+        Create a GalSimInterpreter to draw a shard of the sensor's
+        objects into blank images, i.e., without sky background and
+        noise.  It does not checkpoint or write a centroid file, and
+        it has its own random number generator and sensor model, so
+        it shares no state with the GalSimInterpreters drawing the
+        sensor's other shards.
+        """
+        bp_dict, noise_and_background = self._visit_models()
+        gs_interpreter = self._new_gs_interpreter(camera_wrapper(), bp_dict,
+                                                  noise_and_background)
+        gs_interpreter.noiseWrapper = None
+        gs_interpreter.checkpoint_file = None
+        gs_interpreter.checkpoint_store = None
+        gs_interpreter.centroid_base_name = None
+        return gs_interpreter
+
+    def release_gs_interpreter(self):
+        """
+        Remove the reference to the GalSimInterpreter in order to
+        recover the memory associated with that object.
+        """
+        _GS_INTERPRETERS.pop((self.key, self.det_name), None)
+
+
+class SimulateSensor:
+    """
+    Functor class for simulating sensors in parallel using the
+    multiprocessing module.  The functor only holds a SensorSpec, so it
+    can be pickled for any multiprocessing start method.
+    """
+    def __init__(self, spec, progress=None, cost_estimate=None,
+                 per_object_seeds=None):
+        """
+        Parameters
+        ----------
+        spec: SensorSpec
+            The specification of the sensor to be simulated.
+        progress: queue [None]
+            The queue of a ProgressAggregator, to which the progress
+            info is sent.  If None, then no progress info is sent.
+        cost_estimate: float [None]
+            Estimated cost from the SensorCostModel, which is logged
+            with the actual run time.
+        per_object_seeds: bool [None]
+            If True, the random number generator of the
+            GalSimInterpreter is reseeded before drawing each object
+            with a seed derived from the spec's seed, the visit, the
+            sensor name, and the object's uniqueId, see
+            generate_object_seed, and the sky noise generator is
+            seeded in the same way from the sensor before the sky is
+            added.  The realization of each object then does not
+            depend on which other objects are drawn, or in what order,
+            so restarts from checkpoints, different orderings of the
+            objects, and shards all draw the same photons for each
+            object.  The images are bit-identical only if the objects
+            do not interact: with the brighter-fatter effect of the
+            sensor model, the pixel boundaries, and so the image,
+            depend on the charge from the objects drawn earlier.
+            If None, then use the per_object_seeds option in the
+            objects section of the config.
+        """
+        self.spec = spec
+        self.sensor_name = spec.det_name
+        self.log_level = spec.log_level
+        self.progress = progress
+        self.cost_estimate = cost_estimate
+        if per_object_seeds is None:
+            per_object_seeds \
+                = spec.config['objects'].get('per_object_seeds', True)
+        self.per_object_seeds = per_object_seeds
+
+    def __call__(self, gs_objects, shard_images=None):
         """
         Draw objects using the corresponding GalSimInterpreter.
 
@@ -359,24 +903,159 @@ class SimulateSensor:
         ----------
         gs_objects: list of GalSimCelestialObjects
             The list of objects to draw.  This should be restricted to
-            the objects for the corresponding sensor.
+            the objects for the corresponding sensor.  This is ignored,
+            and can be None, if shard_images is given.
+        shard_images: dict [None]
+            Summed image arrays, keyed by detector image name, of the
+            shards of the sensor's objects, as returned by
+            DrawSensorShard.  These are added to the images with the
+            sky background and noise, instead of drawing gs_objects.
+
+        Returns
+        -------
+        str: The sensor name, or None if there were no objects to draw.
         """
-        if not gs_objects:
-            return
+        if not gs_objects and shard_images is None:
+            return None
+        self.report_progress(status='running', start_time=time.time(),
+                             pid=os.getpid())
+        try:
+            self.simulate(gs_objects, shard_images)
+        except Exception:
+            self.report_progress(status='failed', end_time=time.time())
+            raise
+        return self.sensor_name
 
+    def simulate(self, gs_objects, shard_images=None):
+        """
+        Draw the objects and finalize the sensor's outputs.  If the
+        async_write option in the persistence section of the config
+        is True, the outputs are finalized by the PipelineStage of
+        this process, so that the next sensor can be drawn while this
+        one is written.  See __call__ for the parameters.
+        """
         logger = get_logger(self.log_level, name=self.sensor_name)
+        t0 = time.time()
+
+        self.spec.install_config()
+        gs_interpreter = self.spec.gs_interpreter()
+        if shard_images is None:
+            self.draw_objects(gs_interpreter, gs_objects, logger)
+        else:
+            self.add_shard_images(gs_interpreter, shard_images, logger)
+
+        # Remove the registered reference to gs_interpreter so that
+        # the memory associated with that object is recovered once it
+        # has been finalized.
+        self.spec.release_gs_interpreter()
+
+        if self.spec.config['persistence'].get('async_write', False):
+            pipeline_stage().submit(self.finalize_async, gs_interpreter, t0)
+        else:
+            self.finalize(gs_interpreter, t0)
+
+    def finalize(self, gs_interpreter, t0):
+        """
+        Apply cosmic rays and bleeding, write the output files, add
+        the sensor to the visit manifest, and remove the checkpoint
+        files.
+
+        Parameters
+        ----------
+        gs_interpreter: GalSimInterpreter object
+        t0: float
+            The time the simulation of the sensor started.
+        """
+        logger = get_logger(self.log_level, name=self.sensor_name)
+        config = self.spec.config
+        add_cosmic_rays(gs_interpreter, self.spec.phot_params)
+        full_well = int(config['ccd']['full_well'])
+        apply_channel_bleeding(gs_interpreter, full_well)
+
+        outdir = self.spec.outdir
+        if not os.path.isdir(outdir):
+            os.makedirs(outdir, exist_ok=True)
+        outfiles = []
+        if config['persistence']['make_eimage']:
+            outfiles.extend(self.write_eimage_files(gs_interpreter))
+        if config['persistence']['make_raw_file']:
+            outfiles.extend(self.write_raw_files(gs_interpreter))
+
+        # Write out the centroid files if they were made.
+        gs_interpreter.write_centroid_files()
+
+        # All of the output files have been written, so add the
+        # sensor to the visit manifest.
+        VisitManifest(outdir, self.spec.visit, self.spec.obs_md.bandpass)\
+            .record(self.sensor_name, outfiles)
+
+        # The image for the sensor-visit has been drawn, so delete any
+        # existing checkpoint files if the config says to do so.
+        store = gs_interpreter.checkpoint_store
+        if store is not None:
+            if config['checkpointing']['cleanup']:
+                store.remove()
+            else:
+                store.close()
+        elif (gs_interpreter.checkpoint_file is not None
+                and os.path.isfile(gs_interpreter.checkpoint_file)
+                and config['checkpointing']['cleanup']):
+            os.remove(gs_interpreter.checkpoint_file)
+
+        self.report_progress(objects_drawn=len(gs_interpreter.drawn_objects),
+                             status='done', end_time=time.time())
+
+        if self.cost_estimate is not None:
+            logger.info("estimated cost %.1f, actual run time %.1f s",
+                        self.cost_estimate, time.time() - t0)
 
-        # IMAGE_SIMULATOR must be a variable declared in the
-        # outer scope and set to an ImageSimulator instance.
-        max_flux_simple = IMAGE_SIMULATOR.config['ccd']['max_flux_simple']
-        sensor_limit = IMAGE_SIMULATOR.config['ccd']['sensor_limit']
-        fft_sb_thresh = IMAGE_SIMULATOR.config['ccd'].get('fft_sb_thresh',None)
-        gs_interpreter = IMAGE_SIMULATOR.gs_interpreters[self.sensor_name]
+    def finalize_async(self, gs_interpreter, t0):
+        """
+        Run finalize in the PipelineStage.  Since the task that drew
+        the sensor has already returned, any exception is logged and
+        the sensor is marked as failed in the checkpoint summary.  The
+        sensor is not added to the visit manifest, so
+        ImageSimulator.run reports it as failed, and it will be
+        simulated again by a restarted job.
+        """
+        try:
+            self.finalize(gs_interpreter, t0)
+        except Exception:
+            logger = get_logger(self.log_level, name=self.sensor_name)
+            logger.exception("finalizing the outputs failed")
+            self.report_progress(status='failed', end_time=time.time())
+
+    def draw_objects(self, gs_interpreter, gs_objects, logger):
+        """
+        Draw the objects that are not already in the drawn object set
+        of the GalSimInterpreter.
+
+        Parameters
+        ----------
+        gs_interpreter: GalSimInterpreter object
+        gs_objects: list of GalSimCelestialObjects
+            The list of objects to draw.
+        logger: logging.Logger
+        """
+        config = self.spec.config
+        max_flux_simple = config['ccd']['max_flux_simple']
+        sensor_limit = config['ccd']['sensor_limit']
+        fft_sb_thresh = config['ccd'].get('fft_sb_thresh',None)
+        band = self.spec.obs_md.bandpass
+        store = gs_interpreter.checkpoint_store
+        num_logged = 0
+        if not gs_interpreter.detectorImages:
+            # The sky is added when the image is created.  This is
+            # skipped for images restored from a checkpoint, which
+            # already have the sky.
+            self.seed_sky(gs_interpreter)
         with warnings.catch_warnings():
             warnings.filterwarnings('ignore', 'Automatic n_photons',
                                     UserWarning)
             warnings.filterwarnings('ignore', 'ERFA function', ErfaWarning)
-            nan_fluxes = 0
+            # Compute the fluxes of all of the objects up front,
+            # omitting those with NaN fluxes.
+            nan_fluxes = gs_objects.compute_fluxes(band)
             starting_for_loop = True
             for gs_obj in gs_objects:
                 if starting_for_loop:
@@ -384,10 +1063,20 @@ class SimulateSensor:
                     starting_for_loop = False
                 if gs_obj.uniqueId in gs_interpreter.drawn_objects:
                     continue
-                flux = gs_obj.flux(IMAGE_SIMULATOR.obs_md.bandpass)
+                flux = gs_obj.flux(band)
                 if not np.isnan(flux):
                     logger.debug("%s  %s  %s", gs_obj.uniqueId, flux,
                                  gs_obj.galSimType)
+                    if self.per_object_seeds:
+                        # Use seed rather than reset so that the
+                        # deviates connected to _rng, e.g., the rng
+                        # of the SiliconSensor, also use the object's
+                        # stream.
+                        gs_interpreter._rng.seed(
+                            generate_object_seed(self.spec.seed,
+                                                 self.spec.visit,
+                                                 self.sensor_name,
+                                                 gs_obj.uniqueId))
                     gs_interpreter.drawObject(gs_obj,
                                               max_flux_simple=max_flux_simple,
                                               sensor_limit=sensor_limit,
@@ -395,56 +1084,95 @@ class SimulateSensor:
                     # Ensure the object's id is added to the drawn
                     # object set.
                     gs_interpreter.drawn_objects.add(gs_obj.uniqueId)
+                    if store is not None:
+                        store.append(gs_obj.uniqueId)
+                        num_logged += 1
+                        if (len(gs_interpreter.drawn_objects)
+                                % gs_interpreter.nobj_checkpoint == 0):
+                            store.commit(gs_interpreter.detectorImages)
+                            num_logged = 0
                     self.update_checkpoint_summary(gs_interpreter,
                                                    len(gs_objects))
                 else:
                     nan_fluxes += 1
                 gs_obj.sed.delete_sed_obj()
+            if num_logged > 0:
+                store.commit(gs_interpreter.detectorImages)
             if nan_fluxes > 0:
                 logger.info("%s objects had nan fluxes", nan_fluxes)
+            sed_cache = SedWrapper.shared_resources['sed_cache']
+            logger.debug("SED template cache: %d hits, %d misses, %d files",
+                         sed_cache.hits, sed_cache.misses, len(sed_cache))
 
         # Recover the memory devoted to the GalSimCelestialObject instances.
         gs_objects.reset()
 
-        add_cosmic_rays(gs_interpreter, IMAGE_SIMULATOR.phot_params)
-        full_well = int(IMAGE_SIMULATOR.config['ccd']['full_well'])
-        apply_channel_bleeding(gs_interpreter, full_well)
-
-        outdir = IMAGE_SIMULATOR.outdir
-        if not os.path.isdir(outdir):
-            os.makedirs(outdir)
-        if IMAGE_SIMULATOR.config['persistence']['make_eimage']:
-            self.write_eimage_files(gs_interpreter)
-        if IMAGE_SIMULATOR.config['persistence']['make_raw_file']:
-            self.write_raw_files(gs_interpreter)
-
-        # Write out the centroid files if they were made.
-        gs_interpreter.write_centroid_files()
+    def seed_sky(self, gs_interpreter):
+        """
+        If per-object seeds are used, seed the sky noise generator of
+        the GalSimInterpreter for this sensor.
+        """
+        if self.per_object_seeds and gs_interpreter.noiseWrapper is not None:
+            gs_interpreter.noiseWrapper.randomNumbers.seed(
+                generate_object_seed(self.spec.seed, self.spec.visit,
+                                     self.sensor_name, 'sky'))
 
-        # The image for the sensor-visit has been drawn, so delete any
-        # existing checkpoint file if the config says to do so.
-        if (gs_interpreter.checkpoint_file is not None
-                and os.path.isfile(gs_interpreter.checkpoint_file)
-                and IMAGE_SIMULATOR.config['checkpointing']['cleanup']):
-            os.remove(gs_interpreter.checkpoint_file)
+    def add_shard_images(self, gs_interpreter, shard_images, logger):
+        """
+        Add the summed images of the shards of a sensor's objects to
+        the detector images of the GalSimInterpreter.  Images that
+        were not restored from a checkpoint are created with the sky
+        background and noise first, as GalSimInterpreter.drawObject
+        does, so that the noise of the objects is not drawn twice.
 
-        # Remove reference to gs_interpreter in order to recover the
-        # memory associated with that object.
-        IMAGE_SIMULATOR.gs_interpreters[self.sensor_name] = None
+        Parameters
+        ----------
+        gs_interpreter: GalSimInterpreter object
+        shard_images: dict
+            Image arrays keyed by detector image name.
+        logger: logging.Logger
+        """
+        band = self.spec.obs_md.bandpass
+        detectors = {gs_interpreter._getFileName(detector, band): detector
+                     for detector in gs_interpreter.detectors}
+        if not gs_interpreter.detectorImages:
+            self.seed_sky(gs_interpreter)
+        for name, array in shard_images.items():
+            if name not in gs_interpreter.detectorImages:
+                detector = detectors[name]
+                image = gs_interpreter.blankImage(detector=detector)
+                if gs_interpreter.noiseWrapper is not None:
+                    image = gs_interpreter.noiseWrapper.addNoiseAndBackground(
+                        image, photParams=self.spec.phot_params,
+                        detector=detector)
+                gs_interpreter.detectorImages[name] = image
+            gs_interpreter.detectorImages[name].array[:] += array
+        logger.info("added the images of the shards")
 
     def update_checkpoint_summary(self, gs_interpreter, num_objects):
         """
-        If the checkpoint file has been updated, send the summary
-        information to the checkpoint_aggregator.
+        If the checkpoint file has been updated, send the number of
+        objects drawn to the ProgressAggregator.
         """
-        if CHECKPOINT_SUMMARY is None:
-            # No checkpointing, so return without sending.
+        if self.progress is None:
+            # No checkpoint summary, so return without sending.
             return
         # Apply the checkpointing criterion used by the gs_interpreter.
         nobjs = len(gs_interpreter.drawn_objects)
         if nobjs % gs_interpreter.nobj_checkpoint == 0:
-            self.sender.send((nobjs, self.sensor_name, num_objects,
-                              gs_interpreter.nobj_checkpoint))
+            self.report_progress(objects_drawn=nobjs,
+                                 total_objects=num_objects)
+
+    def report_progress(self, **values):
+        """
+        Send column values for the sensor's record in the checkpoint
+        summary db, along with the current RSS of this process, to the
+        ProgressAggregator.
+        """
+        if self.progress is None:
+            return
+        values['rss_mb'] = psutil.Process().memory_info().rss/1024.**2
+        self.progress.put((self.sensor_name, values))
 
     def write_raw_files(self, gs_interpreter):
         """
@@ -453,9 +1181,14 @@ class SimulateSensor:
         Parameters
         ----------
         gs_interpreter: GalSimInterpreter object
+
+        Returns
+        -------
+        list: The files written.
         """
-        persist = IMAGE_SIMULATOR.config['persistence']
-        band = IMAGE_SIMULATOR.obs_md.bandpass
+        persist = self.spec.config['persistence']
+        band = self.spec.obs_md.bandpass
+        outfiles = []
         for detector in gs_interpreter.detectors:
             filename = gs_interpreter._getFileName(detector, band)
             try:
@@ -464,14 +1197,24 @@ class SimulateSensor:
                 continue
             else:
                 raw = ImageSource.create_from_galsim_image(gs_image)
-                outfile = IMAGE_SIMULATOR.output_file(detector.name, raw=True)
+                outfile = self.spec.output_file(raw=True)
                 added_keywords = dict()
-                if isinstance(IMAGE_SIMULATOR.psf, AtmosphericPSF):
-                    gaussianFWHM = IMAGE_SIMULATOR.config['psf']['gaussianFWHM']
+                if isinstance(self.spec.get_psf(), AtmosphericPSF):
+                    gaussianFWHM = self.spec.config['psf']['gaussianFWHM']
                     added_keywords['GAUSFWHM'] = gaussianFWHM
-                raw.write_fits_file(outfile,
+                # Write the file to a scratch directory on the same
+                # file system and then move it into place, so that a
+                # partially written file never has the output name.
+                tmp_dir = os.path.join(os.path.dirname(outfile),
+                                       '.incomplete')
+                os.makedirs(tmp_dir, exist_ok=True)
+                tmp_file = os.path.join(tmp_dir, os.path.basename(outfile))
+                raw.write_fits_file(tmp_file,
                                     compress=persist['raw_file_compress'],
                                     added_keywords=added_keywords)
+                os.replace(tmp_file, outfile)
+                outfiles.append(outfile)
+        return outfiles
 
     def write_eimage_files(self, gs_interpreter):
         """
@@ -480,13 +1223,86 @@ class SimulateSensor:
         Parameters
         ----------
         gs_interpreter: GalSimInterpreter object
+
+        Returns
+        -------
+        list: The files written.
         """
-        prefix = IMAGE_SIMULATOR.config['persistence']['eimage_prefix']
-        obsHistID = str(IMAGE_SIMULATOR.obs_md.OpsimMetaData['obshistID'])
-        nameRoot = os.path.join(IMAGE_SIMULATOR.outdir, prefix) + obsHistID
+        persist = self.spec.config['persistence']
+        prefix = persist['eimage_prefix']
+        obsHistID = str(self.spec.visit)
+        nameRoot = os.path.join(self.spec.outdir, prefix) + obsHistID
         outfiles = gs_interpreter.writeImages(nameRoot=nameRoot)
-        if IMAGE_SIMULATOR.config['persistence']['eimage_compress']:
+        if persist['eimage_compress']:
             compress_files(outfiles)
+            outfiles = [_ + '.gz' for _ in outfiles]
+        return outfiles
+
+
+class DrawSensorShard(SimulateSensor):
+    """
+    Functor class to draw one shard of a sensor's objects, see
+    GsObjectList.shards, in a separate process.  The objects are drawn
+    into blank images, i.e., without sky background and noise, which
+    are returned so that the SimulateSensor functor for the sensor can
+    add their sum to the image with the sky background.
+    """
+    def __call__(self, gs_objects):
+        """
+        Draw the objects in a shard.
+
+        Parameters
+        ----------
+        gs_objects: GsObjectList
+            The shard of objects to draw.
+
+        Returns
+        -------
+        dict: Image arrays keyed by detector image name.
+        """
+        if not gs_objects:
+            return dict()
+        logger = get_logger(self.log_level, name=self.sensor_name)
+        # The objects drawn before a restart are in the checkpoint of
+        # the sensor and were omitted from the object lists by the
+        # InstCatTrimmer, so the shard's GalSimInterpreter does not
+        # need to read the checkpoint.
+        gs_interpreter = self.spec.shard_gs_interpreter()
+        self.draw_objects(gs_interpreter, gs_objects, logger)
+        return {name: image.array for name, image
+                in gs_interpreter.detectorImages.items()}
+
+    def update_checkpoint_summary(self, gs_interpreter, num_objects):
+        "Shards are not checkpointed, so there is nothing to send."
+        pass
+
+
+def output_file_name(outdir, prefix, visit, det_name, band):
+    """
+    Generate the path of an output FITS file.
+
+    Parameters
+    ----------
+    outdir: str
+        The output directory.
+    prefix: str
+        The file name prefix, e.g., the raw_file_prefix or
+        eimage_prefix in the persistence section of the config.
+    visit: int
+        The visit number.
+    det_name: str
+        Detector slot name following DM conventions, e.g., 'R:2,2 S:1,1'.
+    band: str
+        The band of the visit.
+
+    Returns
+    -------
+    str: The output file path.
+    """
+    file_name = "R{}{}_S{}{}".format(*[_ for _ in det_name if _.isdigit()])
+    return os.path.join(outdir, prefix + '_'.join(
+        (str(visit), file_name, band + '.fits')))
+
 
 def compress_files(file_list, remove_originals=True, compresslevel=1):
     """
@@ -508,21 +1324,62 @@ def compress_files(file_list, remove_originals=True, compresslevel=1):
     """
     for infile in file_list:
         outfile = infile + '.gz'
+        tmp_file = outfile + '.tmp'
         with open(infile, 'rb') as src, \
-             gzip.open(outfile, 'wb', compresslevel) as output:
+             gzip.open(tmp_file, 'wb', compresslevel) as output:
             shutil.copyfileobj(src, output)
+        os.replace(tmp_file, outfile)
         if remove_originals:
             os.remove(infile)
 
 
+def generate_object_seed(seed, visit, det_name, unique_id):
+    """
+    Deterministically construct a random number seed for drawing an
+    object from the global seed, the visit number, the detector name
+    and the object's uniqueId, cf. CosmicRays.generate_seed.
+
+    Parameters
+    ----------
+    seed: int
+        The global random number seed.
+    visit: int
+        Visit (or obsHistID) number.
+    det_name: str
+        Name of the sensor in the LSST focal plane, e.g., "R:2,2 S:1,1".
+    unique_id: int or str
+        The uniqueId of the object, or 'sky' for the sky background
+        and noise of the sensor.
+
+    Returns
+    -------
+    int: A seed between 1 and 2**32-1.
+    """
+    my_string = "{}_{}_{}_{}".format(seed, visit, det_name, unique_id)
+    my_int = int(hashlib.sha256(my_string.encode('utf-8')).hexdigest(), 16)
+    # galsim treats a seed of 0 as a request to seed from the system
+    # time, so avoid it.
+    return my_int % (2**32 - 2) + 1
+
+
 class CheckpointSummary:
     """
     Class to manage the sqlite3 db file.  Since sqlite3 connection
-    objects are not pickleable, this class should live in the global
-    namespace.
+    objects are not pickleable, instances of this class are not passed
+    to other processes or threads: the ProgressAggregator creates its
+    own instance for the db file.
     """
+    columns = (('detector', 'text primary key'),
+               ('objects_drawn', 'int default 0'),
+               ('total_objects', 'int'),
+               ('status', "text default 'pending'"),
+               ('start_time', 'real'),
+               ('end_time', 'real'),
+               ('pid', 'int'),
+               ('rss_mb', 'real'))
+
     def __init__(self, db_file='checkpoint_summary.sqlite',
-                 table='summary', overwrite=True):
+                 table='summary', overwrite=True, timeout=30):
         """
         Parameters
         ----------
@@ -532,18 +1389,48 @@ class CheckpointSummary:
             The name of the summary table.
         overwrite: bool [True]
             Flag to overwrite any existing sqlite db file.
+        timeout: float [30]
+            Time in seconds to wait for a lock on the db file held by
+            another connection, e.g., of a process reading the
+            progress info.
         """
         self.db_file = db_file
         self.table = table
         if overwrite and os.path.isfile(db_file):
             os.remove(db_file)
-        self.conn = sqlite3.connect(db_file)
-        self.cursor = self.conn.cursor()
-        sql = """create table if not exists {}
-              (detector text primary key, objects_drawn int default 0,
-              total_objects int)""".format(self.table)
-        self.cursor.execute(sql)
-        self.conn.commit()
+        self.conn = sqlite3.connect(db_file, timeout=timeout)
+        # In WAL mode, readers do not block the writer.
+        self.conn.execute('pragma journal_mode=wal')
+        sql = "create table if not exists {} ({})".format(
+            self.table, ', '.join(' '.join(_) for _ in self.columns))
+        with self.conn:
+            self.conn.execute(sql)
+
+    def update_records(self, records):
+        """
+        Update the records for a set of detectors in a single
+        transaction.
+
+        Parameters
+        ----------
+        records: dict
+            Dicts of column values keyed by detector name.
+
+        Raises
+        ------
+        sqlite3.OperationalError: If the db is locked, in which case
+            none of the records are updated.
+        """
+        rows = defaultdict(list)
+        for detector, values in records.items():
+            columns = tuple(sorted(values))
+            rows[columns].append(tuple(values[_] for _ in columns)
+                                 + (detector,))
+        with self.conn:
+            for columns, column_rows in rows.items():
+                sql = "update {} set {} where detector=?".format(
+                    self.table, ', '.join('{}=?'.format(_) for _ in columns))
+                self.conn.executemany(sql, column_rows)
 
     def update_record(self, objects_drawn, detector, num_objects):
         """
@@ -558,12 +1445,9 @@ class CheckpointSummary:
         num_objects: int
             The expected number of objects to be drawn.
         """
-        sql = """update {} set objects_drawn={}, total_objects={}
-              where detector='{}'"""\
-                  .format(self.table, objects_drawn, num_objects, detector)
         try:
-            self.cursor.execute(sql)
-            self.conn.commit()
+            self.update_records({detector: dict(objects_drawn=objects_drawn,
+                                                total_objects=num_objects)})
         except sqlite3.OperationalError:
             # This will occur if an external process is accessing the
             # db file and a database lock is encountered.
@@ -581,31 +1465,115 @@ class CheckpointSummary:
             The number of objects to be drawn.
         """
         sql = """insert into {} (detector, objects_drawn, total_objects)
-              values ('{}', 0, {})""".format(self.table, detector, nobjects)
-        self.cursor.execute(sql)
-        self.conn.commit()
+              values (?, 0, ?)""".format(self.table)
+        with self.conn:
+            self.conn.execute(sql, (detector, nobjects))
 
+    def close(self):
+        "Close the connection to the sqlite3 db."
+        self.conn.close()
 
-def checkpoint_aggregator(receivers):
-    """
-    This function receives checkpoint summary info from the
-    SimulateSensor class via multiprocessing.Pipe connections and
-    writes that info via the global CHECKPOINT_SUMMARY object to
-    an sqlite3 db.
 
-    Parameters
-    ----------
-    receivers: list
-        List of receiver connections for each SimulateSensor instance.
+class ProgressAggregator:
+    """
+    Class to collect the progress info sent by the SimulateSensor
+    functors and write it to the checkpoint summary db.  The info is
+    received from a queue by a thread in the calling process, and the
+    latest values for each sensor are written in one transaction per
+    time interval.  If the db is locked, the values are kept and
+    written in a later transaction.
     """
-    global CHECKPOINT_SUMMARY
-    while receivers:
-        for receiver in multiprocessing.connection.wait(receivers, timeout=0.1):
+    def __init__(self, db_file, table='summary', context=None,
+                 interval=5., max_retries=10, log_level='WARN'):
+        """
+        Parameters
+        ----------
+        db_file: str
+            sqlite3 db file created by a CheckpointSummary.
+        table: str ['summary']
+            The name of the summary table.
+        context: multiprocessing context [None]
+            The context of the worker processes, used to create a
+            managed queue that can be passed to them.  If None, then
+            the workers are threads in this process, and a queue.Queue
+            is used.
+        interval: float [5.]
+            Time interval in seconds between writes to the db.
+        max_retries: int [10]
+            Number of times to retry the last write, at the same time
+            interval, if the db is locked.
+        log_level: str ['WARN']
+            Logging level.
+        """
+        self.db_file = db_file
+        self.table = table
+        self.interval = interval
+        self.max_retries = max_retries
+        self.log_level = log_level
+        self._manager = None
+        if context is None:
+            self.queue = queue.Queue()
+        else:
+            self._manager = context.Manager()
+            self.queue = self._manager.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        "Start the thread that writes the progress info."
+        self._thread.start()
+
+    def stop(self):
+        """
+        Write any remaining progress info and stop the thread.  This
+        should be called after the workers have finished.
+        """
+        self.queue.put(None)
+        self._thread.join()
+        if self._manager is not None:
+            self._manager.shutdown()
+            self._manager = None
+
+    def _run(self):
+        logger = get_logger(self.log_level, name='ProgressAggregator')
+        checkpoint_summary = CheckpointSummary(db_file=self.db_file,
+                                               table=self.table,
+                                               overwrite=False)
+        records = dict()
+        done = False
+        next_write = time.time() + self.interval
+        while not done:
             try:
-                nobj, det, nmax, nobj_ckpt = receiver.recv()
-                if nobj >= nmax - nobj_ckpt:
-                    receivers.remove(receiver)
-            except EOFError:
-                receivers.remove(receiver)
+                item = self.queue.get(timeout=max(next_write - time.time(),
+                                                  0))
+            except queue.Empty:
+                pass
             else:
-                CHECKPOINT_SUMMARY.update_record(nobj, det, nmax)
+                if item is None:
+                    done = True
+                else:
+                    detector, values = item
+                    records.setdefault(detector, dict()).update(values)
+                    if time.time() < next_write:
+                        continue
+            next_write = time.time() + self.interval
+            if records and self._write(checkpoint_summary, records, logger):
+                records = dict()
+        retries = 0
+        while records and retries < self.max_retries:
+            time.sleep(self.interval)
+            if self._write(checkpoint_summary, records, logger):
+                records = dict()
+            retries += 1
+        if records:
+            logger.warning("progress info for %d sensors was not written",
+                           len(records))
+        checkpoint_summary.close()
+
+    @staticmethod
+    def _write(checkpoint_summary, records, logger):
+        try:
+            checkpoint_summary.update_records(records)
+        except sqlite3.OperationalError as eobj:
+            logger.debug("progress info not written: %s", eobj)
+            return False
+        return True
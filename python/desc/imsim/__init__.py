@@ -10,12 +10,23 @@ from .camera_readout import *
 from .camera_info import *
 from .skyModel import *
 from .ImageSimulator import *
+from .visit_batch import *
+from .executors import *
 from .optical_system import OpticalZernikes
 from .atmPSF import *
 from .fopen import *
+from .instcat_parser import *
+from .instcat_cache import *
+from .shared_objects import *
 from .trim import *
 from .sed_wrapper import *
+from .batch_photometry import *
+from .sed_grid import *
+from .fits_stamps import *
+from .sensor_cost import *
 from .bleed_trails import *
 from .process_monitor import *
 from .instcat_tools import *
 from .flats import *
+from .checkpoint_store import *
+from .visit_manifest import *
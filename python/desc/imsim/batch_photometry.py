@@ -0,0 +1,148 @@
+"""
+Vectorized computation of instance catalog object fluxes.
+"""
+import numpy as np
+import lsst.sims.photUtils as sims_photUtils
+from .sed_wrapper import SedWrapper
+
+__all__ = ['BatchPhotometry']
+
+
+def _interp_rows(x, xp, fp):
+    """
+    Linearly interpolate each row of fp, tabulated at xp, at the
+    locations in the corresponding row of x, returning NaN outside of
+    the range of xp, as is done by Sed.resampleSED.
+
+    Parameters
+    ----------
+    x: numpy.ndarray
+        (n, m) array of locations at which to interpolate.
+    xp: numpy.ndarray
+        Increasing array of the k tabulated locations.
+    fp: numpy.ndarray
+        (n, k) array of tabulated values.
+
+    Returns
+    -------
+    numpy.ndarray: (n, m) array of interpolated values.
+    """
+    index = np.clip(np.searchsorted(xp, x), 1, len(xp) - 1)
+    x0 = xp[index - 1]
+    dx = xp[index] - x0
+    weight = np.divide(x - x0, dx, out=np.zeros_like(x), where=(dx != 0))
+    rows = np.arange(fp.shape[0])[:, None]
+    values = fp[rows, index - 1]*(1. - weight) + fp[rows, index]*weight
+    values[(x < xp[0]) | (x > xp[-1])] = np.nan
+    return values
+
+
+def _dust_factors(a_x, b_x, Av, Rv):
+    """
+    Compute the CCM extinction factors, 10**(-0.4*A(lambda)), for
+    arrays of Av and Rv values, as applied by Sed.addDust.  Entries
+    with Av == 0 have no extinction applied.
+
+    Returns
+    -------
+    numpy.ndarray: (len(Av), len(a_x)) array of multiplicative factors.
+    """
+    Av = np.asarray(Av, dtype=float)[:, None]
+    Rv = np.where(Av != 0, np.asarray(Rv, dtype=float)[:, None], 1.)
+    return np.where(Av != 0, 10.**(-0.4*Av*(a_x + b_x/Rv)), 1.)
+
+
+class BatchPhotometry:
+    """
+    Class to compute the ADU values in a bandpass for arrays of
+    instance catalog objects using numpy operations on a common
+    wavelength grid, rather than constructing a Sed for each object.
+
+    The calculation follows SedWrapper._compute_SED and Sed.calcADU:
+    the SED template is normalized to mag_norm, intrinsic dust is
+    applied on the rest-frame template grid, the SED is redshifted
+    with dimming and linearly interpolated onto the bandpass grid
+    (with NaN values outside of the template wavelength range),
+    Galactic dust is applied, and the result is integrated against
+    the bandpass.  Since the ADU is linear in flambda, the last step
+    is a dot product with a response vector that is computed once.
+    """
+    def __init__(self, bandpass, phot_params, chunk_size=256):
+        """
+        Parameters
+        ----------
+        bandpass: lsst.sims.photUtils.Bandpass
+            The bandpass, e.g., from a BandpassDict.  The ADU values are
+            computed on the wavelength grid of the bandpass.
+        phot_params: lsst.sims.photUtils.PhotometricParameters
+            Photometric parameters for the visit.
+        chunk_size: int [256]
+            Number of objects to process at a time.
+        """
+        self.wavelen = np.array(bandpass.wavelen, dtype=float)
+        self.chunk_size = chunk_size
+        # Response vector such that adu = flambda.dot(response) for
+        # flambda tabulated on self.wavelen:  fnu/wavelen is
+        # proportional to flambda*wavelen, so normalize that weighting
+        # by the ADU for a flat flambda.
+        self.response = self.wavelen*bandpass.sb
+        flat_sed = sims_photUtils.Sed(wavelen=self.wavelen,
+                                      flambda=np.ones(len(self.wavelen)))
+        self.response *= (flat_sed.calcADU(bandpass, phot_params)
+                          /np.sum(self.response))
+        self.a_gal, self.b_gal \
+            = SedWrapper.shared_resources['ccm_model'].ab(self.wavelen)
+        self._templates = dict()
+
+    def _template(self, sed_file):
+        """
+        Return the wavelength and flambda arrays, the flux
+        normalization for mag_norm=0, and the CCM a(x), b(x) arrays
+        for an SED template.
+        """
+        if sed_file not in self._templates:
+            wavelen, flambda \
+                = SedWrapper.shared_resources['sed_cache'].get(sed_file)
+            sed_obj = sims_photUtils.Sed(wavelen=wavelen, flambda=flambda)
+            fnorm0 = sims_photUtils.getImsimFluxNorm(sed_obj, 0)
+            a_x, b_x = SedWrapper.shared_resources['ccm_model'].ab(wavelen)
+            self._templates[sed_file] = (wavelen, flambda, fnorm0, a_x, b_x)
+        return self._templates[sed_file]
+
+    def adu(self, sed_files, mag_norm, redshift, iAv, iRv, gAv, gRv):
+        """
+        Compute the ADU values for arrays of objects.
+
+        Parameters
+        ----------
+        sed_files: sequence of str
+            Paths to the SED template files.
+        mag_norm, redshift, iAv, iRv, gAv, gRv: numpy.ndarray
+            The object parameters as given in the instance catalog.
+
+        Returns
+        -------
+        numpy.ndarray: ADU values, with NaN for objects whose redshifted
+            templates do not cover the bandpass.
+        """
+        templates, template_ids = np.unique(np.asarray(sed_files),
+                                            return_inverse=True)
+        mag_norm, redshift, iAv, iRv, gAv, gRv \
+            = [np.asarray(_, dtype=float) for _ in
+               (mag_norm, redshift, iAv, iRv, gAv, gRv)]
+        adu = np.zeros(len(template_ids))
+        for template_id, sed_file in enumerate(templates):
+            wavelen, flambda, fnorm0, a_x, b_x = self._template(sed_file)
+            index = np.where(template_ids == template_id)[0]
+            for start in range(0, len(index), self.chunk_size):
+                rows = index[start:start + self.chunk_size]
+                rest_flambda = flambda*_dust_factors(a_x, b_x, iAv[rows],
+                                                     iRv[rows])
+                one_plus_z = 1. + redshift[rows][:, None]
+                obs_flambda = _interp_rows(self.wavelen/one_plus_z, wavelen,
+                                           rest_flambda)/one_plus_z
+                obs_flambda *= _dust_factors(self.a_gal, self.b_gal,
+                                             gAv[rows], gRv[rows])
+                adu[rows] = (fnorm0*10.**(-0.4*mag_norm[rows])
+                             *obs_flambda.dot(self.response))
+        return adu
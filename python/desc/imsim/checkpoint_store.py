@@ -0,0 +1,318 @@
+"""
+Incremental checkpointing of the objects drawn on a sensor.
+"""
+import os
+import json
+import pickle
+import numpy as np
+import galsim
+
+__all__ = ['CheckpointStore', 'read_drawn_objects']
+
+
+class _RowTrackingImage(galsim.Image):
+    """
+    View of a detector image that records which rows are covered by
+    the subimages taken from it.  The GalSimInterpreter draws each
+    object on a subimage of the detector image for its postage stamp,
+    so these are the rows containing the objects drawn on it.  Changes
+    made without taking a subimage, e.g., via the array attribute, are
+    not recorded.
+    """
+    def __init__(self, image):
+        super(_RowTrackingImage, self).__init__(image.array, xmin=image.xmin,
+                                                ymin=image.ymin,
+                                                wcs=image.wcs)
+        self.dirty_rows = np.zeros(self.array.shape[0], dtype=bool)
+
+    def subImage(self, bounds):
+        self.dirty_rows[bounds.ymin - self.ymin:
+                        bounds.ymax - self.ymin + 1] = True
+        return super(_RowTrackingImage, self).subImage(bounds)
+
+
+class CheckpointStore:
+    """
+    Checkpoint store for a sensor-visit that only writes the work done
+    since the previous checkpoint, in contrast to the GalSimInterpreter
+    checkpoints, which pickle the entire image and drawn object set
+    each time.
+
+    The store consists of a text log and, for each detector image, two
+    .npy files that are memory-mapped and updated in place.  The
+    uniqueIds of the drawn objects are appended to the log as they are
+    drawn.  At each commit, the rows of each image that have changed
+    since the image file was last written are copied into it, and a
+    commit record naming that file is appended to the log.  Commits
+    alternate between the two image files, so an interrupted commit
+    never overwrites the image of the last complete one, and the
+    objects logged after the last commit record are ignored on restore.
+
+    The changed rows are found without comparing the images: commit
+    replaces each detector image with a view that records the rows
+    covered by the postage stamps drawn on it, and only those rows are
+    copied.  Changes to the images that bypass galsim.Image.subImage,
+    e.g., writes to the array attribute, are not tracked and so are
+    not checkpointed.  Images that are not such views, e.g., new or
+    restored images, are written in full.
+
+    The log file is the checkpoint file passed to the constructor, and
+    the image files are named <checkpoint file>.<image index>.<0|1>.npy.
+    """
+    _header = '# imSim checkpoint store v1\n'
+
+    def __init__(self, checkpoint_file):
+        """
+        Parameters
+        ----------
+        checkpoint_file: str
+            The name of the log file.
+        """
+        self.checkpoint_file = checkpoint_file
+        self._images = dict()
+        self._memmaps = dict()
+        self._num_commits = 0
+        self._log = None
+        # The row tracking views of the detector images, and the masks
+        # of the rows of each image that have changed since each of
+        # its two image files was written, keyed by image name.
+        self._tracked = dict()
+        self._dirty_rows = dict()
+
+    @staticmethod
+    def is_legacy(checkpoint_file):
+        """
+        Return True if checkpoint_file exists and was written by the
+        GalSimInterpreter, i.e., is a pickle file.  An empty file,
+        e.g., one left by a worker killed before its first commit, is
+        not a checkpoint.
+        """
+        if (not os.path.isfile(checkpoint_file)
+                or os.path.getsize(checkpoint_file) == 0):
+            return False
+        with open(checkpoint_file, 'rb') as fd:
+            return fd.read(1) != CheckpointStore._header[:1].encode()
+
+    def read(self):
+        """
+        Read the log file.
+
+        Returns
+        -------
+        (set, dict, int, int): The uniqueIds of the committed objects,
+            the headers of the committed images keyed by image name,
+            the number of commits, and the size in bytes of the
+            committed part of the log.
+        """
+        drawn_objects = set()
+        images = dict()
+        num_commits, size = 0, 0
+        if not os.path.isfile(self.checkpoint_file):
+            return drawn_objects, images, num_commits, size
+        pending, pending_images = [], dict()
+        with open(self.checkpoint_file, 'rb') as fd:
+            offset = 0
+            for line in fd:
+                offset += len(line)
+                if not line.endswith(b'\n'):
+                    # Partially written line.
+                    break
+                tokens = line.decode().rstrip('\n').split(' ', 1)
+                if tokens[0] == '#':
+                    size = offset
+                elif tokens[0] == 'drawn':
+                    pending.append(tokens[1])
+                elif tokens[0] == 'image':
+                    header = json.loads(tokens[1])
+                    pending_images[header['name']] = header
+                elif tokens[0] == 'commit':
+                    drawn_objects.update(pending)
+                    images.update(pending_images)
+                    for header in images.values():
+                        header['buffer'] = int(tokens[1].split()[1])
+                    pending, pending_images = [], dict()
+                    num_commits += 1
+                    size = offset
+        return drawn_objects, images, num_commits, size
+
+    def restore(self, gs_interpreter, band):
+        """
+        Restore the drawn object set and the detector images of a
+        GalSimInterpreter from the last commit.  Any objects logged
+        after that commit are removed from the log.
+
+        Parameters
+        ----------
+        gs_interpreter: GalSimInterpreter
+        band: str
+            The band of the visit, used to match the detector image
+            names to the detectors.
+
+        Returns
+        -------
+        int: The number of objects restored.
+        """
+        drawn_objects, images, self._num_commits, size = self.read()
+        self._images = images
+        self._tracked = dict()
+        if os.path.isfile(self.checkpoint_file):
+            os.truncate(self.checkpoint_file, size)
+        detectors = {gs_interpreter._getFileName(detector, band): detector
+                     for detector in gs_interpreter.detectors}
+        for name, header in images.items():
+            array = np.load(self._image_file(header['index'],
+                                             header['buffer']))
+            gs_interpreter.detectorImages[name] \
+                = galsim.Image(array, xmin=header['xmin'],
+                               ymin=header['ymin'],
+                               wcs=detectors[name].wcs)
+        gs_interpreter.drawn_objects = drawn_objects
+        return len(drawn_objects)
+
+    def write(self, gs_interpreter):
+        """
+        Write a new store containing the current state of a
+        GalSimInterpreter, e.g., one restored from a legacy checkpoint
+        file.  The log is written to a temporary file that replaces
+        the checkpoint file once it is committed, so the legacy
+        checkpoint is kept if the conversion is interrupted.
+        """
+        self.close()
+        self._images = dict()
+        self._tracked = dict()
+        self._num_commits = 0
+        tmp_file = self.checkpoint_file + '.tmp'
+        self._log = open(tmp_file, 'w')
+        self._log.write(self._header)
+        for unique_id in gs_interpreter.drawn_objects:
+            self.append(unique_id)
+        self.commit(gs_interpreter.detectorImages)
+        self.close()
+        os.replace(tmp_file, self.checkpoint_file)
+
+    def append(self, unique_id):
+        """
+        Log a drawn object.  It is not part of the checkpoint until the
+        next commit.
+        """
+        self._write('drawn {}\n'.format(unique_id))
+
+    def commit(self, images):
+        """
+        Write the changes to the detector images since the last commit
+        to the alternate image files, and then commit them and the
+        objects logged since then.
+
+        Parameters
+        ----------
+        images: dict
+            The galsim.Images keyed by detector image name, i.e., the
+            GalSimInterpreter.detectorImages attribute.  The images
+            are replaced by row tracking views of them.
+        """
+        buffer = self._num_commits % 2
+        for name, image in list(images.items()):
+            if name not in self._images:
+                header = dict(name=name, index=len(self._images),
+                              xmin=image.xmin, ymin=image.ymin)
+                self._images[name] = header
+                self._write('image {}\n'.format(json.dumps(header)))
+            if image is self._tracked.get(name):
+                dirty_rows = self._dirty_rows[name]
+                for rows in dirty_rows:
+                    rows |= image.dirty_rows
+                image.dirty_rows[:] = False
+            else:
+                image = _RowTrackingImage(image)
+                images[name] = image
+                self._tracked[name] = image
+                dirty_rows = [np.ones(image.array.shape[0], dtype=bool)
+                              for _ in (0, 1)]
+                self._dirty_rows[name] = dirty_rows
+            image_file, new_file = self._memmap(self._images[name]['index'],
+                                                buffer, image.array)
+            if new_file:
+                dirty_rows[buffer][:] = True
+            # Only the rows containing objects drawn since the image
+            # file was last written need to be copied.
+            rows = np.flatnonzero(dirty_rows[buffer])
+            if len(rows) > 0:
+                image_file[rows] = image.array[rows]
+                image_file.flush()
+            dirty_rows[buffer][:] = False
+        self._write('commit {} {}\n'.format(self._num_commits, buffer))
+        self._log.flush()
+        os.fsync(self._log.fileno())
+        self._num_commits += 1
+
+    def close(self):
+        "Close the log and image files."
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+        self._memmaps = dict()
+
+    def remove(self):
+        "Close and delete the log and image files."
+        self.close()
+        if os.path.isfile(self.checkpoint_file):
+            os.remove(self.checkpoint_file)
+        for header in self._images.values():
+            for buffer in (0, 1):
+                image_file = self._image_file(header['index'], buffer)
+                if os.path.isfile(image_file):
+                    os.remove(image_file)
+
+    def _write(self, line):
+        if self._log is None:
+            new_file = (not os.path.isfile(self.checkpoint_file)
+                        or os.path.getsize(self.checkpoint_file) == 0)
+            self._log = open(self.checkpoint_file, 'a')
+            if new_file:
+                # Make sure that the file is recognized as a store,
+                # even if the process is killed before the first commit.
+                self._log.write(self._header)
+                self._log.flush()
+                os.fsync(self._log.fileno())
+        self._log.write(line)
+
+    def _image_file(self, index, buffer):
+        return '{}.{}.{}.npy'.format(self.checkpoint_file, index, buffer)
+
+    def _memmap(self, index, buffer, array):
+        """
+        Return the memory map of an image file and whether the file
+        was created by this call.
+        """
+        key = index, buffer
+        new_file = False
+        if key not in self._memmaps:
+            image_file = self._image_file(index, buffer)
+            if os.path.isfile(image_file):
+                memmap = np.load(image_file, mmap_mode='r+')
+            else:
+                memmap = np.lib.format.open_memmap(image_file, mode='w+',
+                                                   dtype=array.dtype,
+                                                   shape=array.shape)
+                new_file = True
+            self._memmaps[key] = memmap
+        return self._memmaps[key], new_file
+
+
+def read_drawn_objects(checkpoint_file):
+    """
+    Read the committed drawn objects from a checkpoint file written by
+    either a CheckpointStore or a GalSimInterpreter.
+
+    Parameters
+    ----------
+    checkpoint_file: str
+
+    Returns
+    -------
+    set: The uniqueIds of the drawn objects.
+    """
+    if CheckpointStore.is_legacy(checkpoint_file):
+        with open(checkpoint_file, 'rb') as fd:
+            return pickle.load(fd)['drawn_objects']
+    return CheckpointStore(checkpoint_file).read()[0]
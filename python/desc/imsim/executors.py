@@ -0,0 +1,315 @@
+"""
+Executor backends for running the per-sensor simulation tasks.
+"""
+import os
+import time
+import threading
+import multiprocessing
+import multiprocessing.util
+import concurrent.futures
+
+__all__ = ['SerialExecutor', 'ThreadExecutor', 'ProcessExecutor',
+           'MpiExecutor', 'PipelineStage', 'pipeline_stage',
+           'completed_futures']
+
+
+class SerialExecutor:
+    """
+    Executor that runs each task in the calling thread when it is
+    submitted.
+
+    Attributes
+    ----------
+    in_process: bool
+        True if the tasks run in the calling process, in which case
+        they use the GalSimInterpreters created by the ImageSimulator.
+    forked: bool
+        True if the tasks run in processes forked after submission
+        starts, so that they also inherit those GalSimInterpreters.
+    parallel: bool
+        True if tasks run concurrently.
+    context: multiprocessing context
+        Context used to create the queue of the ProgressAggregator.
+    """
+    in_process = True
+    forked = False
+    parallel = False
+
+    def __init__(self):
+        self.context = multiprocessing.get_context()
+
+    def partition(self, sensors):
+        """
+        Return the sensors to be simulated by this process.
+
+        Parameters
+        ----------
+        sensors: list
+            The names of all of the sensors to be simulated.
+
+        Returns
+        -------
+        list
+        """
+        return list(sensors)
+
+    def submit(self, func, *args, **kwds):
+        """
+        Submit a task.
+
+        Returns
+        -------
+        concurrent.futures.Future
+        """
+        future = concurrent.futures.Future()
+        try:
+            future.set_result(func(*args, **kwds))
+        except Exception as eobj:
+            future.set_exception(eobj)
+        return future
+
+    def shutdown(self):
+        "Wait for the submitted tasks to finish."
+        pass
+
+    def gather(self, futures):
+        """
+        Return the results of the futures, raising the exception of
+        the first failed task, if any.
+        """
+        return [future.result() for future in futures]
+
+
+class ThreadExecutor(SerialExecutor):
+    """
+    Executor that runs the tasks in a pool of threads in the calling
+    process.  The drawing code holds the GIL for much of its run time,
+    so this is mostly useful for tasks dominated by I/O and for
+    debugging.
+    """
+    parallel = True
+
+    def __init__(self, max_workers=1):
+        """
+        Parameters
+        ----------
+        max_workers: int [1]
+            The number of threads.
+        """
+        super(ThreadExecutor, self).__init__()
+        self.max_workers = max_workers
+        self._executor = None
+
+    def submit(self, func, *args, **kwds):
+        if self._executor is None:
+            self._executor = concurrent.futures\
+                .ThreadPoolExecutor(max_workers=self.max_workers)
+        return self._executor.submit(func, *args, **kwds)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+class _AsyncResultFuture:
+    "Adapter to give a multiprocessing AsyncResult a Future interface."
+    def __init__(self, async_result):
+        self.async_result = async_result
+
+    def result(self, timeout=None):
+        return self.async_result.get(timeout)
+
+    def done(self):
+        return self.async_result.ready()
+
+
+class ProcessExecutor(SerialExecutor):
+    """
+    Executor that runs the tasks in a multiprocessing pool.  The pool
+    is created on the first submission after each shutdown, so for the
+    fork start method the workers inherit the state of the calling
+    process at that time.
+    """
+    in_process = False
+    parallel = True
+
+    def __init__(self, processes=1, start_method=None):
+        """
+        Parameters
+        ----------
+        processes: int [1]
+            The number of worker processes.
+        start_method: str [None]
+            The multiprocessing start method, 'fork', 'spawn' or
+            'forkserver'.  If None, then use the multiprocessing default.
+        """
+        self.processes = processes
+        self.context = multiprocessing.get_context(start_method)
+        self._pool = None
+
+    @property
+    def forked(self):
+        return self.context.get_start_method() == 'fork'
+
+    def submit(self, func, *args, **kwds):
+        if self._pool is None:
+            self._pool = self.context.Pool(processes=self.processes)
+        return _AsyncResultFuture(self._pool.apply_async(func, args, kwds))
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+
+class MpiExecutor:
+    """
+    Executor that distributes the sensors across the ranks of an MPI
+    communicator.  Each rank simulates its share of the sensors with a
+    local executor and the task results are gathered on rank 0.
+
+    This requires mpi4py, and the script must be run under mpirun,
+    e.g., `mpirun -n 4 imsim.py --mpi ...`.
+    """
+    def __init__(self, executor=None, comm=None):
+        """
+        Parameters
+        ----------
+        executor: SerialExecutor, ThreadExecutor or ProcessExecutor [None]
+            The executor for the tasks of this rank.  If None, then
+            use a SerialExecutor.
+        comm: mpi4py.MPI.Comm [None]
+            The communicator.  If None, then use MPI.COMM_WORLD.
+        """
+        if comm is None:
+            from mpi4py import MPI
+            comm = MPI.COMM_WORLD
+        self.comm = comm
+        self.rank = comm.Get_rank()
+        self.size = comm.Get_size()
+        self.executor = SerialExecutor() if executor is None else executor
+
+    def __getattr__(self, attr):
+        # Delegate in_process, forked, parallel, context, submit and
+        # shutdown to the local executor.
+        if attr == 'executor':
+            raise AttributeError(attr)
+        return getattr(self.executor, attr)
+
+    def partition(self, sensors):
+        """
+        Return the sensors to be simulated by this rank.  The sensors
+        are dealt out to the ranks in turn in sorted order, so every
+        rank computes the same partition.
+        """
+        return sorted(sensors)[self.rank::self.size]
+
+    def gather(self, futures):
+        """
+        Gather the results of the tasks of all of the ranks on rank 0.
+        The result of a failed task is its exception.
+
+        Returns
+        -------
+        list: The results of all of the ranks on rank 0, None on the
+            other ranks.
+        """
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as eobj:
+                results.append(eobj)
+        all_results = self.comm.gather(results, root=0)
+        if self.rank != 0:
+            return None
+        return [result for rank_results in all_results
+                for result in rank_results]
+
+
+def completed_futures(futures, poll_interval=0.1):
+    """
+    Generator that returns the futures of any of the executors as they
+    finish, in the order in which they finish.
+
+    Parameters
+    ----------
+    futures: list
+        The futures returned by the submit method of an executor.
+    poll_interval: float [0.1]
+        Time in seconds to wait between checks of unfinished futures.
+    """
+    pending = list(futures)
+    while pending:
+        finished = [future for future in pending if future.done()]
+        if not finished:
+            time.sleep(poll_interval)
+            continue
+        for future in finished:
+            pending.remove(future)
+            yield future
+
+
+class PipelineStage:
+    """
+    Background thread that runs one task at a time, so that a process
+    can overlap the finalization of one sensor's outputs, e.g., cosmic
+    rays, readout, compression, and file writing, with the drawing of
+    the next sensor.  At most one task is pending: submit waits for the
+    previous task to finish, which limits the memory used to one
+    additional sensor's images.  The stage can be shared by the
+    threads of a ThreadExecutor: submit and drain are serialized by a
+    lock, so the threads take turns using it.
+    """
+    def __init__(self):
+        self._executor = None
+        self._future = None
+        self._lock = threading.Lock()
+
+    def submit(self, func, *args, **kwds):
+        """
+        Wait for the previous task, if any, to finish and then start
+        running func(*args, **kwds) in the background thread.
+        Exceptions raised by func are re-raised by the next call to
+        submit or drain, so func should handle any that should not
+        stop the caller.
+        """
+        with self._lock:
+            self._drain()
+            if self._executor is None:
+                self._executor = concurrent.futures.ThreadPoolExecutor(1)
+            self._future = self._executor.submit(func, *args, **kwds)
+
+    def drain(self):
+        "Wait for the pending task, if any, to finish."
+        with self._lock:
+            self._drain()
+
+    def _drain(self):
+        future, self._future = self._future, None
+        if future is not None:
+            future.result()
+
+
+_PIPELINE_STAGES = dict()
+_PIPELINE_STAGES_LOCK = threading.Lock()
+
+def pipeline_stage():
+    """
+    Return the PipelineStage of the current process, creating it if
+    needed.  The stage is drained when the process exits, including
+    multiprocessing pool workers, so that pending outputs are written.
+    """
+    pid = os.getpid()
+    with _PIPELINE_STAGES_LOCK:
+        if pid not in _PIPELINE_STAGES:
+            # A stage inherited from a forked parent has no thread in
+            # this process, so it is not reused.
+            _PIPELINE_STAGES.clear()
+            _PIPELINE_STAGES[pid] = PipelineStage()
+            multiprocessing.util.Finalize(_PIPELINE_STAGES[pid],
+                                          _PIPELINE_STAGES[pid].drain,
+                                          exitpriority=10)
+        return _PIPELINE_STAGES[pid]
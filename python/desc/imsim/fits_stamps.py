@@ -0,0 +1,189 @@
+"""
+Caches of FITS postage stamp images: decompressed copies on local
+disk, and the images read by each process.
+"""
+import os
+import gzip
+import shutil
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+import galsim
+
+__all__ = ['FitsStampCache', 'get_stamp_cache', 'StampImageCache',
+           'get_stamp_image_cache']
+
+
+class FitsStampCache:
+    """
+    Class to provide local, uncompressed copies of the FITS postage
+    stamp images used by _FITS_IMAGE objects.
+
+    Each .fits.gz file is decompressed once into the cache directory,
+    under a name that includes a hash of the source path, modification
+    time, and size, and the written file is moved into place
+    atomically so that concurrent processes can share the cache.  The
+    uncompressed copies can be memory-mapped by the FITS reader and
+    stay in the local page cache when stamps are reused across objects
+    and sensors.  Resolved paths are memoized per process.
+    """
+    def __init__(self, cache_dir):
+        """
+        Parameters
+        ----------
+        cache_dir: str
+            Directory in which to write the decompressed images,
+            preferably on a local disk.
+        """
+        self.cache_dir = cache_dir
+        self._paths = dict()
+
+    def __call__(self, fits_file):
+        """
+        Return the path to an uncompressed copy of fits_file.  Files
+        that are not gzipped, or that cannot be read, are returned
+        as is.
+        """
+        try:
+            return self._paths[fits_file]
+        except KeyError:
+            pass
+        local_path = fits_file
+        if fits_file.endswith('.gz'):
+            try:
+                local_path = self._decompress(fits_file)
+            except OSError:
+                pass
+        self._paths[fits_file] = local_path
+        return local_path
+
+    def _decompress(self, fits_file):
+        stat = os.stat(fits_file)
+        key = '{} {} {}'.format(os.path.abspath(fits_file), stat.st_mtime_ns,
+                                stat.st_size)
+        local_path = os.path.join(
+            self.cache_dir, '{}_{}'.format(
+                hashlib.sha1(key.encode('utf-8')).hexdigest()[:16],
+                os.path.basename(fits_file)[:-len('.gz')]))
+        if not os.path.isfile(local_path):
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # The temporary file name is unique to this call, so threads
+            # and processes decompressing the same file do not collide.
+            fd, tmp_path = tempfile.mkstemp(
+                prefix=os.path.basename(local_path) + '.tmp-',
+                dir=self.cache_dir)
+            try:
+                with os.fdopen(fd, 'wb') as output, \
+                     gzip.open(fits_file, 'rb') as input_:
+                    shutil.copyfileobj(input_, output, 2**22)
+                # mkstemp creates the file readable only by its owner.
+                os.chmod(tmp_path, 0o644)
+                os.replace(tmp_path, local_path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+        return local_path
+
+
+_STAMP_CACHES = dict()
+
+
+def get_stamp_cache(cache_dir):
+    """
+    Return the FitsStampCache for cache_dir, creating it if needed.
+    """
+    if cache_dir not in _STAMP_CACHES:
+        _STAMP_CACHES[cache_dir] = FitsStampCache(cache_dir)
+    return _STAMP_CACHES[cache_dir]
+
+
+class StampImageCache:
+    """
+    Least-recently-used cache of the FITS postage stamp images read
+    by a process, so that stamps used by several objects, on one
+    sensor or on the sensors simulated subsequently by the process,
+    are only read once.  The cached images are passed to GalSim in
+    place of the file names.
+
+    Attributes
+    ----------
+    max_bytes: int
+        Maximum number of bytes of pixel data to cache.  The most
+        recently used image is kept even if it is larger than this.
+    nbytes: int
+        Number of bytes of pixel data in the cache.
+    hits: int
+        Number of images found in the cache.
+    misses: int
+        Number of images read from files.
+    """
+    def __init__(self, max_bytes=2**28):
+        """
+        Parameters
+        ----------
+        max_bytes: int [2**28]
+            Maximum number of bytes of pixel data to cache.
+        """
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+        # Serialize access by threads simulating different sensors.
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._cache)
+
+    def get(self, fits_file):
+        """
+        Return the image in a FITS file, reading the file if it is not
+        in the cache.  The returned image is immutable.
+
+        Parameters
+        ----------
+        fits_file: str
+            Path to the FITS file, which may be gzipped.
+
+        Returns
+        -------
+        galsim.Image
+        """
+        with self._lock:
+            try:
+                image = self._cache[fits_file]
+            except KeyError:
+                self.misses += 1
+                image = galsim.fits.read(fits_file).view(make_const=True)
+                self._cache[fits_file] = image
+                self.nbytes += image.array.nbytes
+                while self.nbytes > self.max_bytes and len(self._cache) > 1:
+                    _, evicted = self._cache.popitem(last=False)
+                    self.nbytes -= evicted.array.nbytes
+            else:
+                self.hits += 1
+                self._cache.move_to_end(fits_file)
+            return image
+
+    def clear(self):
+        "Empty the cache and reset the counters."
+        with self._lock:
+            self._cache.clear()
+            self.nbytes = 0
+            self.hits = 0
+            self.misses = 0
+
+
+_STAMP_IMAGE_CACHE = []
+
+
+def get_stamp_image_cache(max_bytes=2**28):
+    """
+    Return the StampImageCache of this process, creating it if needed,
+    and set its maximum size.
+    """
+    if not _STAMP_IMAGE_CACHE:
+        _STAMP_IMAGE_CACHE.append(StampImageCache(max_bytes))
+    _STAMP_IMAGE_CACHE[0].max_bytes = max_bytes
+    return _STAMP_IMAGE_CACHE[0]
@@ -4,12 +4,14 @@ Utilities to read in gzipped instance catalogs with includeobj directives.
 import os
 import contextlib
 import gzip
+import queue
+import threading
 
-__all__ = ["fopen"]
+__all__ = ["fopen", "fopen_blocks"]
 
 
 @contextlib.contextmanager
-def fopen(filename, **kwds):
+def fopen(filename, opened_files=None, **kwds):
     """
     Return a file descriptor-like object that closes the underlying
     file descriptor when used with the with-statement.
@@ -18,6 +20,10 @@ def fopen(filename, **kwds):
     ----------
     filename: str
         Filename of the instance catalog.
+    opened_files: list [None]
+        If not None, the absolute paths of the files that are opened,
+        including those given by includeobj directives, are appended
+        to this list as they are read.
     **kwds: dict
         Keyword arguments to pass to the gzip.open or open functions.
 
@@ -27,17 +33,19 @@ def fopen(filename, **kwds):
         over to return the lines in a file.
     """
     abspath = os.path.split(os.path.abspath(filename))[0]
+    if opened_files is not None:
+        opened_files.append(os.path.abspath(filename))
     try:
         if filename.endswith('.gz'):
             fd = gzip.open(filename, **kwds)
         else:
             fd = open(filename, **kwds)
-        yield fopen_generator(fd, abspath, **kwds)
+        yield fopen_generator(fd, abspath, opened_files=opened_files, **kwds)
     finally:
         fd.close()
 
 
-def fopen_generator(fd, abspath, **kwds):
+def fopen_generator(fd, abspath, opened_files=None, **kwds):
     """
     Return a generator for the provided file descriptor that knows how
     to recursively read in instance catalogs specified by the
@@ -49,6 +57,177 @@ def fopen_generator(fd, abspath, **kwds):
                 yield line
             else:
                 filename = os.path.join(abspath, line.strip().split()[-1])
-                with fopen(filename, **kwds) as my_input:
+                with fopen(filename, opened_files=opened_files,
+                           **kwds) as my_input:
                     for line in my_input:
                         yield line
+
+
+class _BlockReader(threading.Thread):
+    """
+    Thread that reads and decompresses a single catalog file and puts
+    blocks of lines on a bounded queue.  includeobj directives are not
+    followed here, but are put on the queue as separate entries so
+    that the consumer can read the included files in order.  Since
+    zlib releases the GIL while inflating, several of these threads
+    can decompress files concurrently.
+    """
+    def __init__(self, filename, block_size, semaphore, queue_size=2,
+                 read_size=2**24):
+        """
+        Parameters
+        ----------
+        filename: str
+            The file to read.
+        block_size: int
+            Maximum number of lines in each block.
+        semaphore: threading.Semaphore
+            Semaphore that limits the number of files being read and
+            decompressed concurrently.
+        queue_size: int [2]
+            Maximum number of entries waiting to be consumed.
+        read_size: int [2**24]
+            Number of (decompressed) bytes to read at a time.
+        """
+        super(_BlockReader, self).__init__(daemon=True)
+        self.filename = filename
+        self.abspath = os.path.split(os.path.abspath(filename))[0]
+        self.block_size = block_size
+        self.semaphore = semaphore
+        self.read_size = read_size
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.stop_event = threading.Event()
+
+    def run(self):
+        try:
+            opener = gzip.open if self.filename.endswith('.gz') else open
+            with opener(self.filename, 'rb') as fd:
+                remainder = b''
+                while not self.stop_event.is_set():
+                    with self.semaphore:
+                        data = fd.read(self.read_size)
+                    if not data:
+                        break
+                    data = remainder + data
+                    end = data.rfind(b'\n') + 1
+                    remainder = data[end:]
+                    self._put_lines(data[:end].decode().splitlines(True))
+                self._put_lines(remainder.decode().splitlines(True))
+        except Exception as eobj:
+            self._put(('error', eobj))
+        self._put(('done', None))
+
+    def _put_lines(self, lines):
+        "Put the lines on the queue in blocks, splitting out includeobjs."
+        start = 0
+        for i, line in enumerate(lines):
+            if line.startswith('includeobj'):
+                self._put_blocks(lines[start:i])
+                self._put(('include', os.path.join(self.abspath,
+                                                   line.strip().split()[-1])))
+                start = i + 1
+        self._put_blocks(lines[start:] if start else lines)
+
+    def _put_blocks(self, lines):
+        for i in range(0, len(lines), self.block_size):
+            self._put(('lines', lines[i:i + self.block_size]))
+
+    def _put(self, item):
+        "Put an item on the queue unless the consumer has gone away."
+        while not self.stop_event.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def items(self):
+        "Generator of the (kind, value) entries from the queue."
+        while True:
+            kind, value = self.queue.get()
+            if kind == 'done':
+                return
+            if kind == 'error':
+                raise value
+            yield kind, value
+
+
+@contextlib.contextmanager
+def fopen_blocks(filename, block_size=100000, max_workers=4,
+                 opened_files=None):
+    """
+    Return a generator of blocks of lines from an instance catalog,
+    with includeobj directives resolved.  The files are read and
+    decompressed in background threads, and consecutive includeobj
+    files are read ahead concurrently, so that decompression overlaps
+    with the processing of the blocks by the caller.  Only complete
+    lines are returned, in the same order as they would be by fopen.
+
+    Parameters
+    ----------
+    filename: str
+        Filename of the instance catalog.
+    block_size: int [100000]
+        Maximum number of lines in each block.
+    max_workers: int [4]
+        Maximum number of files to decompress concurrently.
+    opened_files: list [None]
+        If not None, the absolute paths of the files that are opened,
+        including those given by includeobj directives, are appended
+        to this list.
+
+    Returns
+    -------
+    generator: generator of lists of str lines.
+    """
+    semaphore = threading.Semaphore(max_workers)
+    readers = []
+
+    def start_reader(path):
+        if opened_files is not None:
+            opened_files.append(os.path.abspath(path))
+        reader = _BlockReader(path, block_size, semaphore)
+        reader.start()
+        readers.append(reader)
+        return reader
+
+    try:
+        yield _read_blocks(start_reader(filename), start_reader, max_workers)
+    finally:
+        for reader in readers:
+            reader.stop_event.set()
+
+
+def _read_blocks(reader, start_reader, max_workers):
+    """
+    Generator of the line blocks from a _BlockReader and, recursively,
+    from the files given by its includeobj directives.  When an
+    includeobj entry is found, the readers for up to max_workers
+    consecutive includeobj entries are started so that those files
+    are decompressed concurrently.
+    """
+    items = reader.items()
+    pending = None
+    while True:
+        if pending is not None:
+            (kind, value), pending = pending, None
+        else:
+            try:
+                kind, value = next(items)
+            except StopIteration:
+                return
+        if kind == 'lines':
+            yield value
+            continue
+        include_readers = [start_reader(value)]
+        for kind, value in items:
+            if kind != 'include':
+                pending = kind, value
+                break
+            include_readers.append(start_reader(value))
+            if len(include_readers) >= max_workers:
+                break
+        for include_reader in include_readers:
+            for block in _read_blocks(include_reader, start_reader,
+                                      max_workers):
+                yield block
@@ -11,6 +11,7 @@ import logging
 import traceback
 import gc
 import copy
+import threading
 import psutil
 import galsim
 
@@ -32,6 +33,8 @@ from lsst.sims.utils import ObservationMetaData, radiansFromArcsec
 from lsst.sims.utils import applyProperMotion, ModifiedJulianDate
 from lsst.sims.coordUtils import getCornerPixels
 from lsst.sims.coordUtils import pixelCoordsFromPupilCoords
+from lsst.sims.coordUtils import pupilCoordsFromPixelCoords
+from lsst.sims.coordUtils import focalPlaneCoordsFromPupilCoords
 from lsst.sims.catUtils.mixins import PhoSimAstrometryBase
 from lsst.sims.utils import _pupilCoordsFromObserved
 from lsst.sims.utils import _observedFromAppGeo
@@ -43,22 +46,23 @@ from lsst.sims.utils import defaultSpecMap
 from .tree_rings import TreeRings
 from .cosmic_rays import CosmicRays
 from .fopen import fopen
+from .instcat_parser import parse_object_lines, _POINT_SOURCE, _SERSIC_2D,\
+    _RANDOM_WALK, _FITS_IMAGE
 from .trim import InstCatTrimmer
+from .shared_objects import SharedObjectTable
 from .sed_wrapper import SedWrapper
+from .batch_photometry import BatchPhotometry
+from .sed_grid import get_flux_grid
+from .fits_stamps import get_stamp_cache, get_stamp_image_cache
 from .atmPSF import AtmosphericPSF
 
-_POINT_SOURCE = 1
-_SERSIC_2D = 2
-_RANDOM_WALK = 3
-_FITS_IMAGE = 4
-
 __all__ = ['PhosimInstanceCatalogParseError',
            'photometricParameters', 'phosim_obs_metadata',
            'sources_from_list',
-           'metadata_from_file',
+           'metadata_from_file', 'InstCatHandle',
            'read_config', 'get_config', 'get_logger', 'get_image_dirs',
            'get_obs_lsstSim_camera',
-           'add_cosmic_rays',
+           'add_cosmic_rays', 'get_cosmic_ray_catalog',
            '_POINT_SOURCE', '_SERSIC_2D', '_RANDOM_WALK', '_FITS_IMAGE',
            'parsePhoSimInstanceFile',
            'add_treering_info', 'airmass', 'FWHMeff', 'FWHMgeom', 'make_psf',
@@ -153,12 +157,78 @@ def metadata_from_file(file_name):
     return commands
 
 
+class InstCatHandle:
+    """
+    Handle for an instance catalog that reads its header once and
+    caches the PhoSim commands and the ObservationMetaData and
+    PhotometricParameters derived from them.  A handle can be passed
+    in place of the instance catalog filename to make_psf,
+    parsePhoSimInstanceFile, InstCatTrimmer, and ImageSimulator so
+    that the header is not re-read by each of them.
+    """
+    def __init__(self, instcat_file):
+        """
+        Parameters
+        ----------
+        instcat_file: str
+            The instance catalog filename.
+        """
+        self.instcat_file = instcat_file
+        self._commands = None
+        self._obs_md = None
+        self._phot_params = None
+
+    @staticmethod
+    def get(instcat):
+        """
+        Return instcat if it is an InstCatHandle, otherwise a new
+        handle for the instance catalog filename instcat.
+        """
+        if isinstance(instcat, InstCatHandle):
+            return instcat
+        return InstCatHandle(instcat)
+
+    @property
+    def commands(self):
+        "The PhoSim commands, see metadata_from_file."
+        if self._commands is None:
+            self._commands = metadata_from_file(self.instcat_file)
+        return self._commands
+
+    @property
+    def obs_md(self):
+        "The ObservationMetaData, see phosim_obs_metadata."
+        if self._obs_md is None:
+            self._obs_md = phosim_obs_metadata(self.commands)
+        return self._obs_md
+
+    @property
+    def phot_params(self):
+        "The PhotometricParameters, see photometricParameters."
+        if self._phot_params is None:
+            self._phot_params = photometricParameters(self.commands)
+        return self._phot_params
+
+
 def uss_mem():
     """Return unique set size memory of current process in GB."""
     my_process = psutil.Process(os.getpid())
     return my_process.memory_full_info().uss/1024.**3
 
 
+def _object_array(object_lines):
+    """
+    Return the structured array of parsed objects for a list of
+    instance catalog object lines, a structured array, or a
+    SharedObjectTable.
+    """
+    if isinstance(object_lines, SharedObjectTable):
+        return object_lines.array
+    if isinstance(object_lines, np.ndarray):
+        return object_lines
+    return parse_object_lines(object_lines)
+
+
 def sources_from_list(object_lines, obs_md, phot_params, file_name,
                       target_chip=None, log_level='INFO'):
     """.
@@ -170,8 +240,10 @@ def sources_from_list(object_lines, obs_md, phot_params, file_name,
 
     Parameters
     ----------
-    object_lines: list
-        List of object line entries from the instance catalog.
+    object_lines: list, numpy.ndarray, or SharedObjectTable
+        List of object line entries from the instance catalog or a
+        structured array of those entries as returned by
+        parse_object_lines, e.g., from the InstCatTrimmer.
     obs_md: ObservationMetaData
         Visit-specific metadata from the instance catalog.
     phot_params: PhotometricParameters
@@ -192,234 +264,333 @@ def sources_from_list(object_lines, obs_md, phot_params, file_name,
 
     Returns
     -------
-    list, dict:  A list of all the GalSimCelestialObjects that pass
-        the focalplane-level selections and a dict of those objects keyed
-        by chip name.
+    LazyGsObjects, dict:  A sequence of all the GalSimCelestialObjects
+        that pass the focalplane-level selections and a dict of sequences
+        of those objects keyed by chip name.  The GalSimCelestialObjects
+        are constructed as they are accessed.
     """
-    camera = get_obs_lsstSim_camera()
-    config = get_config()
-    logger = get_logger(log_level, name=(target_chip if target_chip is
-                                         not None else 'sources_from_list'))
-
-    num_objects = len(object_lines)
-
-    logger.debug('allocating object arrays, %s GB', uss_mem())
-    # RA, Dec in the coordinate system expected by PhoSim
-    ra_phosim = np.zeros(num_objects, dtype=float)
-    dec_phosim = np.zeros(num_objects, dtype=float)
-
-    sed_name = [None]*num_objects
-    mag_norm = 55.0*np.ones(num_objects, dtype=float)
-    gamma1 = np.zeros(num_objects, dtype=float)
-    gamma2 = np.zeros(num_objects, dtype=float)
-    gamma2_sign = config['wl_params']['gamma2_sign']
-    kappa = np.zeros(num_objects, dtype=float)
-
-    internal_av = np.zeros(num_objects, dtype=float)
-    internal_rv = np.zeros(num_objects, dtype=float)
-    galactic_av = np.zeros(num_objects, dtype=float)
-    galactic_rv = np.zeros(num_objects, dtype=float)
-    semi_major_arcsec = np.zeros(num_objects, dtype=float)
-    semi_minor_arcsec = np.zeros(num_objects, dtype=float)
-    position_angle_degrees = np.zeros(num_objects, dtype=float)
-    sersic_index = np.zeros(num_objects, dtype=float)
-    npoints = np.zeros(num_objects, dtype=int)
-    redshift = np.zeros(num_objects, dtype=float)
-    pixel_scale = np.zeros(num_objects, dtype=float)
-    rotation_angle = np.zeros(num_objects, dtype=float)
-    fits_image_file = dict()
-
-    unique_id = [None]*num_objects
-    object_type = np.zeros(num_objects, dtype=int)
-
-    logger.debug('looping over %s objects; %s GB', num_objects, uss_mem())
-    i_obj = -1
-    for line in object_lines:
-        params = line.strip().split()
-        if params[0] != 'object':
-            continue
-        i_obj += 1
-        unique_id[i_obj] = params[1]
-        ra_phosim[i_obj] = float(params[2])
-        dec_phosim[i_obj] = float(params[3])
-        mag_norm[i_obj] = float(params[4])
-        sed_name[i_obj] = params[5]
-        redshift[i_obj] = float(params[6])
-        gamma1[i_obj] = float(params[7])
-        gamma2[i_obj] = gamma2_sign*float(params[8])
-        kappa[i_obj] = float(params[9])
-        if params[12].lower() == 'point':
-            object_type[i_obj] = _POINT_SOURCE
-            i_gal_dust_model = 14
-            if params[13].lower() != 'none':
-                i_gal_dust_model = 16
-                internal_av[i_obj] = float(params[14])
-                internal_rv[i_obj] =float(params[15])
-            if params[i_gal_dust_model].lower() != 'none':
-                galactic_av[i_obj] = float(params[i_gal_dust_model+1])
-                galactic_rv[i_obj] = float(params[i_gal_dust_model+2])
-        elif params[12].lower() == 'sersic2d':
-            object_type[i_obj] = _SERSIC_2D
-            semi_major_arcsec[i_obj] = float(params[13])
-            semi_minor_arcsec[i_obj] = float(params[14])
-            position_angle_degrees[i_obj] = float(params[15])
-            sersic_index[i_obj] = float(params[16])
-            i_gal_dust_model = 18
-            if params[17].lower() != 'none':
-                i_gal_dust_model = 20
-                internal_av[i_obj] = float(params[18])
-                internal_rv[i_obj] = float(params[19])
-            if params[i_gal_dust_model].lower() != 'none':
-                galactic_av[i_obj] = float(params[i_gal_dust_model+1])
-                galactic_rv[i_obj] =float(params[i_gal_dust_model+2])
-        elif params[12].lower() == 'knots':
-            object_type[i_obj] = _RANDOM_WALK
-            semi_major_arcsec[i_obj] = float(params[13])
-            semi_minor_arcsec[i_obj] = float(params[14])
-            position_angle_degrees[i_obj] = float(params[15])
-            npoints[i_obj] = int(params[16])
-            i_gal_dust_model = 18
-            if params[17].lower() != 'none':
-                i_gal_dust_model = 20
-                internal_av[i_obj] = float(params[18])
-                internal_rv[i_obj] = float(params[19])
-            if params[i_gal_dust_model].lower() != 'none':
-                galactic_av[i_obj] = float(params[i_gal_dust_model+1])
-                galactic_rv[i_obj] = float(params[i_gal_dust_model+2])
-        elif (params[12].endswith('.fits') or params[12].endswith('.fits.gz')):
-            object_type[i_obj] = _FITS_IMAGE
-            fits_image_file[i_obj] = find_file_path(params[12], get_image_dirs())
-            pixel_scale[i_obj] = float(params[13])
-            rotation_angle[i_obj] = float(params[14])
-            i_gal_dust_model = 16
-            if params[15].lower() != 'none':
-                i_gal_dust_model = 18
-                internal_av[i_obj] = float(params[16])
-                internal_rv[i_obj] = float(params[17])
-            if params[i_gal_dust_model].lower() != 'none':
-                galactic_av[i_obj] = float(params[i_gal_dust_model+1])
-                galactic_rv[i_obj] = float(params[i_gal_dust_model+2])
+    selection = SourceSelection(object_lines, obs_md, phot_params, file_name,
+                                target_chip=target_chip, log_level=log_level)
+    logger = selection.logger
+
+    logger.debug('collecting selections for %s objects; %s GB',
+                 len(selection.objects), uss_mem())
+    # The objects selected for any chip, in order of first appearance.
+    all_selected = np.concatenate([np.zeros(0, dtype=int)]
+                                  + list(selection.chip_indices.values()))
+    unique_index, first = np.unique(all_selected, return_index=True)
+    gs_object_arr = LazyGsObjects(selection, unique_index[np.argsort(first)])
+    out_obj_dict = defaultdict(list)
+    for chip_name, index in selection.chip_indices.items():
+        out_obj_dict[chip_name] = LazyGsObjects(selection, index)
+    if target_chip is not None:
+        logger.debug('objects remaining %s', len(out_obj_dict[target_chip]))
+    logger.debug("about to return from sources_from_list, %s GB", uss_mem())
+    return gs_object_arr, out_obj_dict
+
+
+class LazyGsObjects:
+    """
+    Sequence of GalSimCelestialObjects backed by the arrays of a
+    SourceSelection.  Only the indices of the objects are stored, and
+    each GalSimCelestialObject is constructed when it is accessed, so
+    that the memory cost of an object that has not yet been drawn is
+    that of its rows in the SourceSelection arrays.  Note that each
+    access returns a new instance.
+    """
+    __slots__ = ('selection', 'index')
+
+    def __init__(self, selection, index):
+        """
+        Parameters
+        ----------
+        selection: SourceSelection
+            The selection providing the object data.
+        index: numpy.ndarray
+            Indices into selection.objects of the objects in the sequence.
+        """
+        self.selection = selection
+        self.index = np.asarray(index, dtype=int)
+
+    def __len__(self):
+        return len(self.index)
+
+    def __iter__(self):
+        for i_obj in self.index:
+            yield self.selection.gs_objects([i_obj])[0]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return LazyGsObjects(self.selection, self.index[index])
+        return self.selection.gs_objects([self.index[index]])[0]
+
+    def __getstate__(self):
+        return self.selection, self.index
+
+    def __setstate__(self, state):
+        self.selection, self.index = state
+
+
+class SourceSelection:
+    """
+    Class to apply the on-chip selections and consistency cuts on
+    mag_norm, extinction parameters, and galaxy shape and knot
+    parameters to instance catalog objects, and to construct
+    GalSimCelestialObjects for the selected objects on request.
+
+    The selection is done with array operations, so it is cheap to
+    keep around; only the arrays for the selected objects are retained.
+    The GalSimCelestialObjects can then be built in batches of any size.
+
+    Attributes
+    ----------
+    objects: numpy.ndarray
+        Structured array of the objects that pass the selections for
+        any of the target chips.
+    chip_indices: dict
+        Arrays of the indices into objects of the objects selected for
+        each chip, keyed by chip name.  The objects are in the order
+        of the input entries.
+    """
+    def __init__(self, object_lines, obs_md, phot_params, file_name,
+                 target_chip=None, log_level='INFO'):
+        """
+        Parameters
+        ----------
+        See sources_from_list.
+        """
+        config = get_config()
+        self.logger = get_logger(log_level,
+                                 name=(target_chip if target_chip is
+                                       not None else 'sources_from_list'))
+        self.phot_params = phot_params
+        self.sed_dirs = sed_dirs(file_name)
+        self._bp_dict = None
+        self.adu = None
+        self.adu_bandpass = None
+        logger = self.logger
+
+        logger.debug('parsing object entries, %s GB', uss_mem())
+        objects = _object_array(object_lines)
+        num_objects = len(objects)
+
+        # RA, Dec in the coordinate system expected by PhoSim
+        ra_phosim = objects['ra_phosim']
+        dec_phosim = objects['dec_phosim']
+
+        mag_norm = objects['mag_norm']
+        galactic_av = objects['galactic_av']
+        galactic_rv = objects['galactic_rv']
+        semi_major_arcsec = objects['semi_major_arcsec']
+        semi_minor_arcsec = objects['semi_minor_arcsec']
+        npoints = objects['npoints']
+        object_type = objects['object_type']
+
+        logger.debug("computing pupil coords, %s GB", uss_mem())
+        ra_appGeo, dec_appGeo \
+            = PhoSimAstrometryBase._appGeoFromPhoSim(np.radians(ra_phosim),
+                                                     np.radians(dec_phosim),
+                                                     obs_md)
+
+        ra_obs_rad, dec_obs_rad \
+            = _observedFromAppGeo(ra_appGeo, dec_appGeo,
+                                  obs_metadata=obs_md,
+                                  includeRefraction=True)
+
+        x_pupil, y_pupil = _pupilCoordsFromObserved(ra_obs_rad,
+                                                    dec_obs_rad,
+                                                    obs_md)
+
+        object_is_valid = np.array([True]*num_objects)
+
+        invalid_objects = np.where(np.logical_or(np.logical_or(
+                                        mag_norm>50.0,
+                                        np.logical_and(galactic_av==0.0, galactic_rv==0.0)),
+                                   np.logical_or(
+                                        np.logical_and(object_type==_SERSIC_2D,
+                                                     semi_major_arcsec<semi_minor_arcsec),
+                                        np.logical_and(object_type==_RANDOM_WALK,npoints<=0))))
+
+        object_is_valid[invalid_objects] = False
+
+        if len(invalid_objects[0]) > 0:
+            message = "\nOmitted %d suspicious objects from " % len(invalid_objects[0])
+            message += "the instance catalog:\n"
+            n_bad_mag_norm = len(np.where(mag_norm>50.0)[0])
+            message += "    %d had mag_norm > 50.0\n" % n_bad_mag_norm
+            n_bad_av = len(np.where(np.logical_and(galactic_av==0.0, galactic_rv==0.0))[0])
+            message += "    %d had galactic_Av == galactic_Rv == 0\n" % n_bad_av
+            n_bad_axes = len(np.where(np.logical_and(object_type==_SERSIC_2D,
+                                                     semi_major_arcsec<semi_minor_arcsec))[0])
+            message += "    %d had semi_major_axis < semi_minor_axis\n" % n_bad_axes
+            n_bad_knots = len(np.where(np.logical_and(object_type==_RANDOM_WALK,npoints<=0))[0])
+            message += "    %d had n_points <= 0 \n" % n_bad_knots
+            warnings.warn(message)
+
+        if target_chip is not None:
+            target_chips = [target_chip]
         else:
-            raise RuntimeError("Do not know how to handle "
-                               "object type: %s" % params[12])
-
-    logger.debug("computing pupil coords, %s GB", uss_mem())
-    ra_appGeo, dec_appGeo \
-        = PhoSimAstrometryBase._appGeoFromPhoSim(np.radians(ra_phosim),
-                                                 np.radians(dec_phosim),
-                                                 obs_md)
-
-    ra_obs_rad, dec_obs_rad \
-        = _observedFromAppGeo(ra_appGeo, dec_appGeo,
-                              obs_metadata=obs_md,
-                              includeRefraction=True)
-
-    semi_major_radians = radiansFromArcsec(semi_major_arcsec)
-    semi_minor_radians = radiansFromArcsec(semi_minor_arcsec)
-    # Account for PA sign difference wrt phosim convention.
-    position_angle_radians = np.radians(360. - position_angle_degrees)
-
-    x_pupil, y_pupil = _pupilCoordsFromObserved(ra_obs_rad,
-                                                dec_obs_rad,
-                                                obs_md)
-
-    bp_dict = BandpassDict.loadTotalBandpassesFromFiles()
-
-    object_is_valid = np.array([True]*num_objects)
-
-    invalid_objects = np.where(np.logical_or(np.logical_or(
-                                    mag_norm>50.0,
-                                    np.logical_and(galactic_av==0.0, galactic_rv==0.0)),
-                               np.logical_or(
-                                    np.logical_and(object_type==_SERSIC_2D,
-                                                 semi_major_arcsec<semi_minor_arcsec),
-                                    np.logical_and(object_type==_RANDOM_WALK,npoints<=0))))
-
-    object_is_valid[invalid_objects] = False
-
-    if len(invalid_objects[0]) > 0:
-        message = "\nOmitted %d suspicious objects from " % len(invalid_objects[0])
-        message += "the instance catalog:\n"
-        n_bad_mag_norm = len(np.where(mag_norm>50.0)[0])
-        message += "    %d had mag_norm > 50.0\n" % n_bad_mag_norm
-        n_bad_av = len(np.where(np.logical_and(galactic_av==0.0, galactic_rv==0.0))[0])
-        message += "    %d had galactic_Av == galactic_Rv == 0\n" % n_bad_av
-        n_bad_axes = len(np.where(np.logical_and(object_type==_SERSIC_2D,
-                                                 semi_major_arcsec<semi_minor_arcsec))[0])
-        message += "    %d had semi_major_axis < semi_minor_axis\n" % n_bad_axes
-        n_bad_knots = len(np.where(np.logical_and(object_type==_RANDOM_WALK,npoints<=0))[0])
-        message += "    %d had n_points <= 0 \n" % n_bad_knots
-        warnings.warn(message)
+            # Set target_chips to None, in which case the _chip_downselect
+            # function will use all of the science sensors in the
+            # focalplane.
+            target_chips = None
+
+        on_chip_dict = _chip_downselect(mag_norm, x_pupil, y_pupil, logger,
+                                        target_chips)
+
+        # Keep only the valid objects that are on one of the chips,
+        # and re-index the per-chip selections accordingly.
+        chip_indices = {chip_name: on_chip[0][object_is_valid[on_chip[0]]]
+                        for chip_name, on_chip in on_chip_dict.items()}
+        keep = np.unique(np.concatenate([np.zeros(0, dtype=int)]
+                                        + list(chip_indices.values())))
+        self.chip_indices = {chip_name: np.searchsorted(keep, index)
+                             for chip_name, index in chip_indices.items()}
+        self.objects = objects[keep]
+        self.x_pupil = x_pupil[keep]
+        self.y_pupil = y_pupil[keep]
+        self.semi_major_radians \
+            = radiansFromArcsec(self.objects['semi_major_arcsec'])
+        self.semi_minor_radians \
+            = radiansFromArcsec(self.objects['semi_minor_arcsec'])
+        # Account for PA sign difference wrt phosim convention.
+        self.position_angle_radians \
+            = np.radians(360. - self.objects['position_angle_degrees'])
+        self.gamma2 = config['wl_params']['gamma2_sign']*self.objects['gamma2']
+
+    def __getstate__(self):
+        # The BandpassDict is reloaded as needed.
+        state = dict(self.__dict__)
+        state['_bp_dict'] = None
+        return state
 
-    if target_chip is not None:
-        target_chips = [target_chip]
-    else:
-        # Set target_chips to None, in which case the _chip_downselect
-        # function will use all of the science sensors in the
-        # focalplane.
-        target_chips = None
+    @property
+    def bp_dict(self):
+        "BandpassDict of the LSST total throughputs."
+        if self._bp_dict is None:
+            self._bp_dict = BandpassDict.loadTotalBandpassesFromFiles()
+        return self._bp_dict
 
-    on_chip_dict = _chip_downselect(mag_norm, x_pupil, y_pupil, logger,
-                                    target_chips)
+    def compute_adu(self, bandpass_name):
+        """
+        Compute the ADU values of all of the selected objects in the
+        specified bandpass with BatchPhotometry, or with a SedFluxGrid
+        if the objects.flux_grid_tolerance config parameter is set, and
+        remove the objects with NaN values from the per-chip selections.
+        The ADU values are set in the SedWrappers of the
+        GalSimCelestialObjects that are constructed subsequently.
 
-    my_sed_dirs = sed_dirs(file_name)
+        Parameters
+        ----------
+        bandpass_name: str
+            Name of the bandpass, e.g., 'r'.
 
-    logger.debug('constructing GalSimCelestialObjects for %s objects; %s GB',
-                 num_objects, uss_mem())
-    gs_object_ids = set()
-    gs_object_arr = []
-    out_obj_dict = defaultdict(list)
-    for chip_name, on_chip in on_chip_dict.items():
-        i_obj_index = np.arange(num_objects)
-        for i_obj in i_obj_index[on_chip]:
-            if not object_is_valid[i_obj]:
-                continue
+        Returns
+        -------
+        numpy.ndarray: Boolean array that is True for the objects with
+            NaN fluxes.
+        """
+        objects = self.objects
+        sed_names, inverse = np.unique(objects['sed_name'],
+                                       return_inverse=True)
+        find_sed_file = get_path_resolver(self.sed_dirs)
+        sed_files = np.array([find_sed_file(sed_name)
+                              for sed_name in sed_names])
+        tolerance = get_config()['objects'].get('flux_grid_tolerance')
+        if tolerance is None:
+            photometry = BatchPhotometry(self.bp_dict[bandpass_name],
+                                         self.phot_params)
+        else:
+            photometry = get_flux_grid(bandpass_name,
+                                       self.bp_dict[bandpass_name],
+                                       self.phot_params, tolerance)
+        self.adu = photometry.adu(sed_files[inverse], objects['mag_norm'],
+                                  objects['redshift'], objects['internal_av'],
+                                  objects['internal_rv'],
+                                  objects['galactic_av'],
+                                  objects['galactic_rv'])
+        self.adu_bandpass = bandpass_name
+        nan_flux = np.isnan(self.adu)
+        self.chip_indices = {chip_name: index[~nan_flux[index]]
+                             for chip_name, index in self.chip_indices.items()}
+        return nan_flux
+
+    def gs_objects(self, index):
+        """
+        Construct the GalSimCelestialObjects for the selected objects.
+
+        Parameters
+        ----------
+        index: sequence of ints
+            Indices into self.objects of the desired objects.
 
+        Returns
+        -------
+        list of GalSimCelestialObjects in the order of index.
+        """
+        objects = self.objects
+        bp_dict = self.bp_dict
+        find_sed_file = get_path_resolver(self.sed_dirs)
+        find_image_file = get_path_resolver(get_image_dirs())
+        stamp_cache_dir = get_config()['objects'].get('stamp_cache_dir')
+        stamp_image_cache_bytes \
+            = get_config()['objects'].get('stamp_image_cache_bytes', 2**28)
+        stamp_images = None
+        if stamp_image_cache_bytes:
+            stamp_images = get_stamp_image_cache(stamp_image_cache_bytes)
+        gs_objects = []
+        for i_obj in index:
+            obj = objects[i_obj]
             fits_file = None
-            if object_type[i_obj] == _POINT_SOURCE:
+            if obj['object_type'] == _POINT_SOURCE:
                 gs_type = 'pointSource'
-            elif object_type[i_obj] == _SERSIC_2D:
+            elif obj['object_type'] == _SERSIC_2D:
                 gs_type = 'sersic'
-            elif object_type[i_obj] == _RANDOM_WALK:
+            elif obj['object_type'] == _RANDOM_WALK:
                 gs_type = 'RandomWalk'
-            elif object_type[i_obj] == _FITS_IMAGE:
+            elif obj['object_type'] == _FITS_IMAGE:
                 gs_type = 'FitsImage'
-                fits_file = fits_image_file[i_obj]
-
-            sed_obj = SedWrapper(find_file_path(sed_name[i_obj], my_sed_dirs),
-                                 mag_norm[i_obj], redshift[i_obj],
-                                 internal_av[i_obj], internal_rv[i_obj],
-                                 galactic_av[i_obj], galactic_rv[i_obj],
+                fits_file = find_image_file(obj['fits_image_file'])
+                if stamp_cache_dir is not None:
+                    fits_file = get_stamp_cache(stamp_cache_dir)(fits_file)
+                if stamp_images is not None:
+                    # Pass the image to GalSim, so that stamps shared
+                    # by several objects are read once.  Unreadable
+                    # files are left for GalSim to report.
+                    try:
+                        fits_file = stamp_images.get(fits_file)
+                    except OSError:
+                        pass
+
+            sed_obj = SedWrapper(find_sed_file(obj['sed_name']),
+                                 obj['mag_norm'], obj['redshift'],
+                                 obj['internal_av'], obj['internal_rv'],
+                                 obj['galactic_av'], obj['galactic_rv'],
                                  bp_dict)
+            if self.adu is not None:
+                sed_obj.set_adu(bp_dict[self.adu_bandpass], self.adu[i_obj])
 
             gs_object = GalSimCelestialObject(gs_type,
-                                              x_pupil[i_obj],
-                                              y_pupil[i_obj],
-                                              semi_major_radians[i_obj],
-                                              semi_minor_radians[i_obj],
-                                              semi_major_radians[i_obj],
-                                              position_angle_radians[i_obj],
-                                              sersic_index[i_obj],
+                                              self.x_pupil[i_obj],
+                                              self.y_pupil[i_obj],
+                                              self.semi_major_radians[i_obj],
+                                              self.semi_minor_radians[i_obj],
+                                              self.semi_major_radians[i_obj],
+                                              self.position_angle_radians[i_obj],
+                                              obj['sersic_index'],
                                               sed_obj,
                                               bp_dict,
-                                              phot_params,
-                                              npoints[i_obj],
+                                              self.phot_params,
+                                              obj['npoints'],
                                               fits_file,
-                                              pixel_scale[i_obj],
-                                              rotation_angle[i_obj],
-                                              gamma1=gamma1[i_obj],
-                                              gamma2=gamma2[i_obj],
-                                              kappa=kappa[i_obj],
-                                              uniqueId=unique_id[i_obj])
-            if gs_object.uniqueId not in gs_object_ids:
-                gs_object_ids.add(gs_object.uniqueId)
-                gs_object_arr.append(gs_object)
-            out_obj_dict[chip_name].append(gs_object)
-    gs_object_arr = np.array(gs_object_arr)
-    if target_chip is not None:
-        logger.debug('objects remaining %s', len(out_obj_dict[target_chip]))
-    logger.debug("about to return from sources_from_list, %s GB", uss_mem())
-    return gs_object_arr, out_obj_dict
+                                              obj['pixel_scale'],
+                                              obj['rotation_angle'],
+                                              gamma1=obj['gamma1'],
+                                              gamma2=self.gamma2[i_obj],
+                                              kappa=obj['kappa'],
+                                              uniqueId=str(obj['unique_id']))
+            gs_objects.append(gs_object)
+        return gs_objects
 
 def _chip_downselect(mag_norm, x_pupil, y_pupil, logger, target_chips=None):
     """
@@ -427,6 +598,10 @@ def _chip_downselect(mag_norm, x_pupil, y_pupil, logger, target_chips=None):
     boundaries.  If target_chips is None, then the down-selection will
     be made for all of the science sensors in the focalplane.
 
+    For more than one target chip, the objects are partitioned among
+    the chips in a single pass using a FocalPlaneChipGrid, so that the
+    pixel coordinates are only computed for the objects near each chip.
+
     Returns
     -------
     dict: Dictionary of np.where indexes keyed by chip name
@@ -446,26 +621,165 @@ def _chip_downselect(mag_norm, x_pupil, y_pupil, logger, target_chips=None):
     # Down-select by object location in focalplane relative to chip
     # boundaries.
     logger.debug('down-selecting by chip, %s GB', uss_mem())
+    if len(target_chips) > 1:
+        chip_grid = _get_chip_grid(tuple(target_chips), pix_tol)
+        candidates = chip_grid.candidates(x_pupil, y_pupil)
+    else:
+        candidates = {chip_name: np.arange(len(x_pupil))
+                      for chip_name in target_chips}
+    bright = np.where(mag_norm < max_mag)[0]
     on_chip_dict = {}
     for chip_name in target_chips:
+        index = candidates.get(chip_name, np.zeros(0, dtype=int))
+        if len(index) == 0:
+            on_chip_dict[chip_name] = (bright,)
+            continue
         pixel_corners = getCornerPixels(chip_name, lsst_camera())
         x_min = pixel_corners[0][0]
         x_max = pixel_corners[2][0]
         y_min = pixel_corners[0][1]
         y_max = pixel_corners[3][1]
-        xpix, ypix = pixelCoordsFromPupilCoords(x_pupil, y_pupil,
+        xpix, ypix = pixelCoordsFromPupilCoords(x_pupil[index],
+                                                y_pupil[index],
                                                 chipName=chip_name,
                                                 camera=lsst_camera())
 
-        on_chip = np.where(np.logical_or(mag_norm<max_mag,
-                           np.logical_and(xpix>x_min-pix_tol,
+        on_chip = np.where(np.logical_and(xpix>x_min-pix_tol,
                            np.logical_and(xpix<x_max+pix_tol,
                            np.logical_and(ypix>y_min-pix_tol,
-                                          ypix<y_max+pix_tol)))))
+                                          ypix<y_max+pix_tol))))
 
-        on_chip_dict[chip_name] = on_chip
+        on_chip_dict[chip_name] = (np.union1d(bright, index[on_chip]),)
     return on_chip_dict
 
+
+class FocalPlaneChipGrid:
+    """
+    Lookup grid of the chips in the focal plane.  Each cell of a
+    regular grid in focal plane coordinates lists the chips whose
+    bounding boxes, including the pixel tolerance at the chip edges,
+    overlap that cell, so that the candidate chips for a set of
+    objects can be found with one focal plane coordinate transform.
+    """
+    def __init__(self, chip_names, pix_tol=50., camera=None):
+        """
+        Parameters
+        ----------
+        chip_names: sequence
+            Names of the chips, e.g., "R:2,2 S:1,1", to include in the grid.
+        pix_tol: float [50.]
+            Tolerance in pixels to apply to the chip boundaries.
+        camera: lsst.afw.cameraGeom.Camera [None]
+            The camera object.  If None, then use lsst_camera().
+        """
+        if camera is None:
+            camera = lsst_camera()
+        self.camera = camera
+        self.chip_names = list(chip_names)
+        bounds = []
+        for chip_name in self.chip_names:
+            corners = getCornerPixels(chip_name, camera)
+            x_min = corners[0][0] - pix_tol
+            x_max = corners[2][0] + pix_tol
+            y_min = corners[0][1] - pix_tol
+            y_max = corners[3][1] + pix_tol
+            x_pix = np.array([x_min, x_min, x_max, x_max])
+            y_pix = np.array([y_min, y_max, y_min, y_max])
+            x_pup, y_pup = pupilCoordsFromPixelCoords(x_pix, y_pix,
+                                                      chipName=chip_name,
+                                                      camera=camera)
+            x_fp, y_fp = focalPlaneCoordsFromPupilCoords(x_pup, y_pup,
+                                                         camera=camera)
+            # Pad the bounding box by 1% to be conservative since the
+            # exact pixel boundaries are applied to the candidates.
+            x_pad = 0.01*(max(x_fp) - min(x_fp))
+            y_pad = 0.01*(max(y_fp) - min(y_fp))
+            bounds.append((min(x_fp) - x_pad, max(x_fp) + x_pad,
+                           min(y_fp) - y_pad, max(y_fp) + y_pad))
+        self.bounds = bounds = np.array(bounds)
+
+        # Use cells half the size of the smallest chip dimension.
+        self.cell_size = 0.5*min(np.min(bounds[:, 1] - bounds[:, 0]),
+                                 np.min(bounds[:, 3] - bounds[:, 2]))
+        self.x0 = np.min(bounds[:, 0])
+        self.y0 = np.min(bounds[:, 2])
+        self.nx = int(np.ceil((np.max(bounds[:, 1]) - self.x0)/self.cell_size))
+        self.ny = int(np.ceil((np.max(bounds[:, 3]) - self.y0)/self.cell_size))
+
+        # Fill the table of chip indexes for each cell, padding with -1.
+        cell_chips = [[] for _ in range(self.nx*self.ny)]
+        for ichip, (x_min, x_max, y_min, y_max) in enumerate(bounds):
+            ix_min, ix_max = self._cell_range(x_min, x_max, self.x0, self.nx)
+            iy_min, iy_max = self._cell_range(y_min, y_max, self.y0, self.ny)
+            for iy in range(iy_min, iy_max + 1):
+                for ix in range(ix_min, ix_max + 1):
+                    cell_chips[iy*self.nx + ix].append(ichip)
+        max_chips = max(len(_) for _ in cell_chips)
+        self.cell_chips = -np.ones((len(cell_chips), max_chips), dtype=int)
+        for icell, chips in enumerate(cell_chips):
+            self.cell_chips[icell, :len(chips)] = chips
+
+    def _cell_range(self, xmin, xmax, x0, nx):
+        "Range of cell indexes covered by the interval [xmin, xmax]."
+        return (max(int(np.floor((xmin - x0)/self.cell_size)), 0),
+                min(int(np.floor((xmax - x0)/self.cell_size)), nx - 1))
+
+    def candidates(self, x_pupil, y_pupil):
+        """
+        Find the candidate chips for each object.
+
+        Parameters
+        ----------
+        x_pupil: numpy.array
+            x pupil coordinates of the objects in radians.
+        y_pupil: numpy.array
+            y pupil coordinates of the objects in radians.
+
+        Returns
+        -------
+        dict: Arrays of indexes of the candidate objects keyed by chip name.
+        """
+        if len(x_pupil) == 0:
+            return dict()
+        x_fp, y_fp = focalPlaneCoordsFromPupilCoords(x_pupil, y_pupil,
+                                                     camera=self.camera)
+        ix = np.floor((x_fp - self.x0)/self.cell_size)
+        iy = np.floor((y_fp - self.y0)/self.cell_size)
+        in_grid = np.where((ix >= 0) & (ix < self.nx) &
+                           (iy >= 0) & (iy < self.ny))[0]
+        cells = (iy[in_grid]*self.nx + ix[in_grid]).astype(int)
+
+        # Make (object, chip) pairs for all of the candidate chips,
+        # keep those within the chip bounding boxes, and group the
+        # objects by chip.
+        chips = self.cell_chips[cells].ravel()
+        objects = np.repeat(in_grid, self.cell_chips.shape[1])
+        objects = objects[chips >= 0]
+        chips = chips[chips >= 0]
+        bounds = self.bounds[chips]
+        inside = np.where((x_fp[objects] >= bounds[:, 0]) &
+                          (x_fp[objects] <= bounds[:, 1]) &
+                          (y_fp[objects] >= bounds[:, 2]) &
+                          (y_fp[objects] <= bounds[:, 3]))
+        chips, objects = chips[inside], objects[inside]
+        order = np.argsort(chips, kind='stable')
+        chips, objects = chips[order], objects[order]
+        ichips, starts = np.unique(chips, return_index=True)
+        return {self.chip_names[ichip]: index for ichip, index in
+                zip(ichips, np.split(objects, starts[1:]))}
+
+
+_CHIP_GRIDS = dict()
+def _get_chip_grid(chip_names, pix_tol):
+    """
+    Return the FocalPlaneChipGrid for the chips and pixel tolerance,
+    creating it on first use.
+    """
+    key = (chip_names, pix_tol)
+    if key not in _CHIP_GRIDS:
+        _CHIP_GRIDS[key] = FocalPlaneChipGrid(chip_names, pix_tol=pix_tol)
+    return _CHIP_GRIDS[key]
+
 def get_image_dirs():
     """
     Return a list of possible directories for FITS images, making sure
@@ -497,6 +811,68 @@ def find_file_path(file_name, path_directories):
             return my_path
     return file_name
 
+
+class PathResolver:
+    """
+    Class to resolve file names in a list of directories, as is done
+    by find_file_path, but using directory listings that are read
+    once per directory with os.scandir, rather than checking each
+    candidate path with os.path.isfile.  Resolved names are memoized.
+    """
+    def __init__(self, path_directories):
+        """
+        Parameters
+        ----------
+        path_directories: list
+            The directories to search, in order.
+        """
+        self.path_directories = list(path_directories)
+        self._listings = dict()
+        self._paths = dict()
+
+    def _files(self, directory):
+        "Return the set of names of the files in a directory."
+        if directory not in self._listings:
+            try:
+                with os.scandir(directory) as entries:
+                    self._listings[directory] \
+                        = set(entry.name for entry in entries
+                              if entry.is_file())
+            except OSError:
+                self._listings[directory] = set()
+        return self._listings[directory]
+
+    def __call__(self, file_name):
+        """
+        Return the path of the first file found in the directories,
+        or file_name if none is found.
+        """
+        try:
+            return self._paths[file_name]
+        except KeyError:
+            pass
+        my_path = file_name
+        subdir, basename = os.path.split(file_name)
+        for path_dir in self.path_directories:
+            if basename in self._files(os.path.join(path_dir, subdir)):
+                my_path = os.path.join(path_dir, file_name)
+                break
+        self._paths[file_name] = my_path
+        return my_path
+
+
+_PATH_RESOLVERS = dict()
+
+def get_path_resolver(path_directories):
+    """
+    Return a PathResolver for the list of directories, reusing one
+    from a previous call, and its directory listings, if possible.
+    """
+    key = tuple(path_directories)
+    if key not in _PATH_RESOLVERS:
+        _PATH_RESOLVERS[key] = PathResolver(path_directories)
+    return _PATH_RESOLVERS[key]
+
 def photometricParameters(phosim_commands):
     """
     Factory function to create a PhotometricParameters object based on
@@ -578,8 +954,8 @@ def parsePhoSimInstanceFile(fileName, sensor_list, numRows=None,
 
     Parameters
     ----------
-    fileName: str
-        The instance catalog filename.
+    fileName: str or InstCatHandle
+        The instance catalog filename or a handle for it.
     sensor_list: list
         List of sensors for which to extract object lists.
     numRows: int [None]
@@ -601,18 +977,26 @@ def parsePhoSimInstanceFile(fileName, sensor_list, numRows=None,
     """
     logger = get_logger(log_level, 'parsePhoSimInstanceFile')
     config = get_config()
-    commands = metadata_from_file(fileName)
-    obs_metadata = phosim_obs_metadata(commands)
-    phot_params = photometricParameters(commands)
+    instcat = InstCatHandle.get(fileName)
+    obs_metadata = instcat.obs_md
+    phot_params = instcat.phot_params
     logger.debug('creating InstCatTrimmer object')
     sort_magnorm = config['objects']['sort_magnorm']
-    instcats = InstCatTrimmer(fileName, sensor_list, numRows=numRows,
+    instcats = InstCatTrimmer(instcat, sensor_list, numRows=numRows,
                               checkpoint_files=checkpoint_files,
-                              log_level=log_level, sort_magnorm=sort_magnorm)
-    gs_object_dict = {detname: GsObjectList(instcats[detname], instcats.obs_md,
+                              log_level=log_level, sort_magnorm=sort_magnorm,
+                              cache_dir=config['objects'].get('cache_dir'))
+    # Put the objects for all of the sensors in shared memory so that
+    # the GsObjectLists passed to the worker processes only carry a
+    # handle to the table and the row indices for their sensors.
+    object_table = SharedObjectTable(instcats.objects)
+    batch_size = config['objects'].get('batch_size')
+    gs_object_dict = {detname: GsObjectList(object_table, instcats.obs_md,
                                             phot_params, instcats.instcat_file,
                                             chip_name=detname,
-                                            log_level=log_level)
+                                            log_level=log_level,
+                                            index=instcats.indices[detname],
+                                            batch_size=batch_size)
                       for detname in sensor_list}
 
     return PhoSimInstanceCatalogContents(obs_metadata,
@@ -625,52 +1009,174 @@ class GsObjectList:
     List-like class to provide access to lists of objects from an
     instance catalog, deferring creation of GalSimCelestialObjects
     until items in the list are accessed.
+
+    The objects can be given as instance catalog lines, as a
+    structured array returned by parse_object_lines, or as a
+    SharedObjectTable with the row indices of the objects in the
+    list.
+
+    If batch_size is set and chip_name is not None, iterating over the
+    list streams the GalSimCelestialObjects: they are constructed in
+    batches of batch_size in catalog order, i.e., in mag_norm order
+    for lists from the InstCatTrimmer, and are not retained after each
+    batch is consumed, so that peak memory use does not grow with the
+    number of objects.  len() is the exact number of selected objects.
+
+    If shard = (ishard, num_shards) is given and chip_name is not None,
+    the list contains every num_shards-th selected object starting
+    with the ishard-th, see .shards(...).
     """
     def __init__(self, object_lines, obs_md, phot_params, file_name,
-                 chip_name=None, log_level='INFO'):
+                 chip_name=None, log_level='INFO', index=None,
+                 batch_size=None, shard=None):
         self.object_lines = object_lines
+        self.index = index
+        self.shard = shard
         self.obs_md = obs_md
         self.phot_params = phot_params
         self.file_name = file_name
         self.chip_name = chip_name
         self.log_level = log_level
+        self.batch_size = batch_size
         self._gs_objects = None
+        self._selection = None
 
     @property
     def gs_objects(self):
         if self._gs_objects is None:
-            obj_arr, obj_dict \
-                = sources_from_list(self.object_lines, self.obs_md,
+            if self.chip_name is not None:
+                self._gs_objects = LazyGsObjects(self.selection,
+                                                 self._selected_indices())
+                return self._gs_objects
+            self._gs_objects, _ \
+                = sources_from_list(self.object_array(), self.obs_md,
                                     self.phot_params, self.file_name,
-                                    target_chip=self.chip_name,
                                     log_level=self.log_level)
-            if self.chip_name is not None:
-                try:
-                    self._gs_objects = obj_dict[self.chip_name]
-                except KeyError:
-                    self._gs_objects = []
-            else:
-                self._gs_objects = obj_arr
         return self._gs_objects
 
+    def object_array(self):
+        """
+        Return the structured array of the objects in the list, prior
+        to the on-chip selections.
+        """
+        objects = _object_array(self.object_lines)
+        if self.index is not None:
+            objects = objects[self.index]
+        return objects
+
+    @property
+    def streaming(self):
+        "True if the GalSimCelestialObjects are constructed in batches."
+        return bool(self.batch_size) and self.chip_name is not None
+
+    @property
+    def selection(self):
+        "The SourceSelection for the objects in the list."
+        if self._selection is None:
+            self._selection = SourceSelection(self.object_array(),
+                                              self.obs_md, self.phot_params,
+                                              self.file_name,
+                                              target_chip=self.chip_name,
+                                              log_level=self.log_level)
+        return self._selection
+
+    def _selected_indices(self):
+        index = self.selection.chip_indices.get(self.chip_name,
+                                                np.zeros(0, dtype=int))
+        if self.shard is not None:
+            ishard, num_shards = self.shard
+            index = index[ishard::num_shards]
+        return index
+
+    def shards(self, num_shards):
+        """
+        Split the list into shards that can be drawn by separate
+        processes.
+
+        The selected objects are dealt out to the shards in turn, so
+        that, for lists in mag_norm order, the brightest objects are
+        spread across the shards and the first shard contains the
+        brightest object.
+
+        Parameters
+        ----------
+        num_shards: int
+            The number of shards.
+
+        Returns
+        -------
+        list of GsObjectLists
+        """
+        if self.chip_name is None:
+            raise RuntimeError("GsObjectList.shards requires a chip_name")
+        if self.shard is not None:
+            raise RuntimeError("GsObjectList has already been sharded")
+        return [GsObjectList(self.object_lines, self.obs_md, self.phot_params,
+                             self.file_name, chip_name=self.chip_name,
+                             log_level=self.log_level, index=self.index,
+                             batch_size=self.batch_size,
+                             shard=(ishard, num_shards))
+                for ishard in range(num_shards)]
+
+    def compute_fluxes(self, bandpass_name):
+        """
+        Compute the fluxes of all of the objects in the list in a single
+        vectorized calculation, see SourceSelection.compute_adu, and
+        remove the objects with NaN fluxes from the list.
+
+        Parameters
+        ----------
+        bandpass_name: str
+            Name of the bandpass, e.g., 'r'.
+
+        Returns
+        -------
+        int: The number of objects removed.
+        """
+        if self.chip_name is None:
+            return 0
+        num_objects = len(self._selected_indices())
+        self.selection.compute_adu(bandpass_name)
+        self._gs_objects = None
+        return num_objects - len(self._selected_indices())
+
     def reset(self):
         """
         Reset the ._gs_objects attribute to None in order to recover
         memory devoted to the GalSimCelestialObject instances.
         """
         self._gs_objects = None
+        self._selection = None
 
     def __len__(self):
+        if self._gs_objects is None and (self.streaming
+                                         or self.shard is not None):
+            return len(self._selected_indices())
         try:
             return len(self._gs_objects)
         except TypeError:
+            if self.index is not None:
+                return len(self.index)
             return len(self.object_lines)
 
     def __iter__(self):
-        for gs_obj in self.gs_objects:
-            yield gs_obj
+        if self._gs_objects is not None or not self.streaming:
+            for gs_obj in self.gs_objects:
+                yield gs_obj
+            return
+        index = self._selected_indices()
+        for start in range(0, len(index), self.batch_size):
+            batch = self.selection.gs_objects(index[start:start +
+                                                    self.batch_size])
+            for gs_obj in batch:
+                yield gs_obj
 
     def __getitem__(self, index):
+        if self._gs_objects is None and self.streaming:
+            selected = self._selected_indices()[index]
+            if isinstance(index, slice):
+                return self.selection.gs_objects(selected)
+            return self.selection.gs_objects([selected])[0]
         return self.gs_objects[index]
 
 
@@ -804,6 +1310,25 @@ def get_logger(log_level, name=None):
 
     return logger
 
+_COSMIC_RAY_CATALOGS = dict()
+_COSMIC_RAY_LOCK = threading.Lock()
+
+def get_cosmic_ray_catalog(catalog, ccd_rate):
+    """
+    Return a CosmicRays object for a cosmic ray catalog file, reusing
+    the cosmic rays read by a previous call if possible.  Each call
+    returns a shallow copy of the cached object, so that threads
+    simulating different sensors can set its random seed and paint
+    with it independently.
+    """
+    key = (catalog, ccd_rate)
+    with _COSMIC_RAY_LOCK:
+        if key not in _COSMIC_RAY_CATALOGS:
+            _COSMIC_RAY_CATALOGS[key] \
+                = CosmicRays.read_catalog(catalog, ccd_rate=ccd_rate)
+    return copy.copy(_COSMIC_RAY_CATALOGS[key])
+
+
 def add_cosmic_rays(gs_interpreter, phot_params):
     """
     Add cosmic rays draw from a catalog of CRs extracted from single
@@ -831,7 +1356,7 @@ def add_cosmic_rays(gs_interpreter, phot_params):
     if catalog == 'default':
         catalog = os.path.join(lsstUtils.getPackageDir('imsim'),
                                'data', 'cosmic_ray_catalog.fits.gz')
-    crs = CosmicRays.read_catalog(catalog, ccd_rate=ccd_rate)
+    crs = get_cosmic_ray_catalog(catalog, ccd_rate)
 
     # Retrieve the visit number for the random seeds.
     visit = gs_interpreter.obs_metadata.OpsimMetaData['obshistID']
@@ -848,6 +1373,11 @@ def add_cosmic_rays(gs_interpreter, phot_params):
         image.wcs.fitsHeader.set('CR_SEED', str(cr_seed))
 
 
+# The tree ring models depend only on the sensor, so they are computed
+# once per process and reused for subsequent visits.
+_TREE_RINGS = dict()
+_TREE_RING_MODELS = dict()
+
 def add_treering_info(detectors, tr_filename=None):
     """
     Adds tree ring info based on a model derived from measured sensors.
@@ -868,10 +1398,15 @@ def add_treering_info(detectors, tr_filename=None):
         tr_filename = os.path.join(lsstUtils.getPackageDir('imsim'),
                                    'data', 'tree_ring_data',
                                    'tree_ring_parameters_2018-04-26.txt')
-    TR = TreeRings(tr_filename)
     for detector in detectors:
         [Rx, Ry, Sx, Sy] = [int(s) for s in list(detector.name) if s.isdigit()]
-        (tr_center, tr_function) = TR.Read_DC2_Tree_Ring_Model(Rx, Ry, Sx, Sy)
+        key = (tr_filename, Rx, Ry, Sx, Sy)
+        if key not in _TREE_RING_MODELS:
+            if tr_filename not in _TREE_RINGS:
+                _TREE_RINGS[tr_filename] = TreeRings(tr_filename)
+            _TREE_RING_MODELS[key] = _TREE_RINGS[tr_filename]\
+                .Read_DC2_Tree_Ring_Model(Rx, Ry, Sx, Sy)
+        (tr_center, tr_function) = _TREE_RING_MODELS[key]
         new_center = galsim.PositionD(tr_center.x + detector._xCenterPix, tr_center.y + detector._yCenterPix)
         detector.tree_rings = (new_center, tr_function)
     return None
@@ -959,9 +1494,10 @@ def make_psf(psf_name, obs_md, log_level='WARN', rng=None, **kwds):
     psf_name: str
         Either "DoubleGaussian", "Kolmogorov", or "Atmospheric".
         The name is case-insensitive.
-    obs_md: lsst.sims.utils.ObservationMetaData
+    obs_md: lsst.sims.utils.ObservationMetaData or InstCatHandle
         Metadata associated with the visit, e.g., pointing direction,
-        observation time, seeing, etc..
+        observation time, seeing, etc., or the handle of the visit's
+        instance catalog.
     log_level: str ['WARN']
         Logging level ('DEBUG', 'INFO', 'WARN', 'ERROR', 'CRITICAL').
     rng: galsim.BaseDeviate
@@ -974,6 +1510,9 @@ def make_psf(psf_name, obs_md, log_level='WARN', rng=None, **kwds):
     -------
     lsst.sims.GalSimInterface.PSFbase: Instance of a subclass of PSFbase.
     """
+    if isinstance(obs_md, InstCatHandle):
+        obs_md = obs_md.obs_md
+
     if psf_name.lower() == 'doublegaussian':
         return SNRdocumentPSF(obs_md.OpsimMetaData['FWHMgeom'])
 
@@ -0,0 +1,152 @@
+"""
+On-disk cache of parsed instance catalog objects.
+"""
+import os
+import json
+import shutil
+import hashlib
+import numpy as np
+from .instcat_parser import PARSER_VERSION
+
+__all__ = ['InstCatCache']
+
+
+def _file_stats(filename):
+    """
+    Return the absolute path, modification time (ns), and size of a file.
+    """
+    stat = os.stat(filename)
+    return [os.path.abspath(filename), stat.st_mtime_ns, stat.st_size]
+
+
+class InstCatCache:
+    """
+    Class to manage a binary cache of the parsed object entries of an
+    instance catalog.
+
+    The parsed objects are stored as a sequence of .npy files, one
+    per chunk read by the InstCatTrimmer, in a directory whose name
+    is a hash of the catalog path, modification time, size, and the
+    parser version.  A manifest file records the stats of all of the
+    files read to build the cache, including those given by includeobj
+    directives, so that changes to any of them invalidate the cache.
+    The chunks are loaded as memory maps.
+    """
+    manifest_name = 'manifest.json'
+
+    def __init__(self, instcat, cache_dir):
+        """
+        Parameters
+        ----------
+        instcat: str
+            Path to the instance catalog.
+        cache_dir: str
+            Directory in which to store the cached catalogs.
+        """
+        self.instcat = os.path.abspath(instcat)
+        self.cache_dir = cache_dir
+        key = json.dumps(_file_stats(self.instcat) + [PARSER_VERSION])
+        self.path = os.path.join(cache_dir,
+                                 hashlib.sha1(key.encode('utf-8')).hexdigest())
+
+    def is_valid(self):
+        """
+        Return True if the cache exists and none of the files used
+        to create it have changed.
+        """
+        try:
+            with open(os.path.join(self.path, self.manifest_name)) as fd:
+                manifest = json.load(fd)
+            return (manifest['parser_version'] == PARSER_VERSION and
+                    all(_file_stats(stats[0]) == stats
+                        for stats in manifest['files']))
+        except (OSError, ValueError, KeyError):
+            return False
+
+    def chunks(self):
+        """
+        Generator that returns the cached chunks of parsed objects as
+        read-only memory-mapped structured arrays.
+        """
+        with open(os.path.join(self.path, self.manifest_name)) as fd:
+            manifest = json.load(fd)
+        for chunk_file in manifest['chunks']:
+            yield np.load(os.path.join(self.path, chunk_file), mmap_mode='r')
+
+    def writer(self):
+        "Return an InstCatCacheWriter for this cache."
+        return InstCatCacheWriter(self)
+
+
+class InstCatCacheWriter:
+    """
+    Class to write the chunks of parsed objects to a temporary
+    directory that is moved into place when the cache is committed,
+    so that partially written caches are never used.
+    """
+    def __init__(self, cache):
+        """
+        Parameters
+        ----------
+        cache: InstCatCache
+            The cache to write.
+        """
+        self.cache = cache
+        os.makedirs(cache.cache_dir, exist_ok=True)
+        self.tmp_path = '{}.tmp-{}'.format(cache.path, os.getpid())
+        shutil.rmtree(self.tmp_path, ignore_errors=True)
+        os.makedirs(self.tmp_path)
+        self.chunk_files = []
+
+    def append(self, objects):
+        """
+        Write a chunk of parsed objects.
+
+        Parameters
+        ----------
+        objects: numpy.ndarray
+            Structured array returned by parse_object_lines.
+        """
+        chunk_file = 'chunk_{:05d}.npy'.format(len(self.chunk_files))
+        np.save(os.path.join(self.tmp_path, chunk_file), objects)
+        self.chunk_files.append(chunk_file)
+
+    def commit(self, opened_files):
+        """
+        Write the manifest and move the cache into place.
+
+        Parameters
+        ----------
+        opened_files: list
+            Paths of all of the files read to produce the cached chunks.
+        """
+        manifest = dict(parser_version=PARSER_VERSION,
+                        instcat=self.cache.instcat,
+                        files=[_file_stats(_) for _ in opened_files],
+                        chunks=self.chunk_files)
+        with open(os.path.join(self.tmp_path,
+                               self.cache.manifest_name), 'w') as output:
+            json.dump(manifest, output)
+        if self.cache.is_valid():
+            # Another process has written the cache in the meantime.
+            self.abort()
+            return
+        # Move an invalid cache aside before replacing it, so that the
+        # cache path never refers to a partially deleted directory.
+        old_path = '{}.old-{}'.format(self.cache.path, os.getpid())
+        shutil.rmtree(old_path, ignore_errors=True)
+        try:
+            os.rename(self.cache.path, old_path)
+        except OSError:
+            # There is no cache to replace.
+            pass
+        try:
+            os.rename(self.tmp_path, self.cache.path)
+        except OSError:
+            # Another process has written the cache in the meantime.
+            self.abort()
+        shutil.rmtree(old_path, ignore_errors=True)
+
+    def abort(self):
+        "Remove the temporary cache directory."
+        shutil.rmtree(self.tmp_path, ignore_errors=True)
@@ -0,0 +1,202 @@
+"""
+Columnar parser for the object lines of phosim-style instance catalogs.
+"""
+from collections import defaultdict
+import numpy as np
+
+__all__ = ['parse_object_lines', 'concatenate_objects', 'object_dtype',
+           'empty_objects', 'PARSER_VERSION']
+
+# Version of the parsed object layout.  This should be incremented
+# whenever the output of parse_object_lines changes so that any
+# cached parsed catalogs are invalidated.
+PARSER_VERSION = 1
+
+_POINT_SOURCE = 1
+_SERSIC_2D = 2
+_RANDOM_WALK = 3
+_FITS_IMAGE = 4
+
+# Column layouts of the object-type specific parameters that follow
+# the object type token (column 12) in each object line.  The
+# extinction model entries follow these parameters.
+_SHAPE_COLUMNS = {_POINT_SOURCE: (),
+                  _SERSIC_2D: ('semi_major_arcsec', 'semi_minor_arcsec',
+                               'position_angle_degrees', 'sersic_index'),
+                  _RANDOM_WALK: ('semi_major_arcsec', 'semi_minor_arcsec',
+                                 'position_angle_degrees', 'npoints'),
+                  _FITS_IMAGE: ('pixel_scale', 'rotation_angle')}
+
+# Columns common to all object types.
+_COMMON_COLUMNS = ((2, 'ra_phosim'), (3, 'dec_phosim'), (4, 'mag_norm'),
+                   (6, 'redshift'), (7, 'gamma1'), (8, 'gamma2'),
+                   (9, 'kappa'))
+
+# Columns containing strings, with their token positions.
+_STRING_COLUMNS = ((1, 'unique_id'), (5, 'sed_name'), (12, 'fits_image_file'))
+
+_NUMERIC_FIELDS = [('object_type', int), ('ra_phosim', float),
+                   ('dec_phosim', float), ('mag_norm', float),
+                   ('redshift', float), ('gamma1', float), ('gamma2', float),
+                   ('kappa', float), ('semi_major_arcsec', float),
+                   ('semi_minor_arcsec', float),
+                   ('position_angle_degrees', float),
+                   ('sersic_index', float), ('npoints', int),
+                   ('pixel_scale', float), ('rotation_angle', float),
+                   ('internal_av', float), ('internal_rv', float),
+                   ('galactic_av', float), ('galactic_rv', float)]
+
+
+def object_dtype(id_len=1, sed_len=1, fits_len=1):
+    """
+    The numpy structured array dtype for parsed instance catalog objects.
+
+    Parameters
+    ----------
+    id_len: int [1]
+        Number of characters to allocate for the uniqueId strings.
+    sed_len: int [1]
+        Number of characters to allocate for the SED filenames.
+    fits_len: int [1]
+        Number of characters to allocate for the FITS image filenames.
+
+    Returns
+    -------
+    numpy.dtype
+    """
+    return np.dtype([('unique_id', 'U{}'.format(max(id_len, 1))),
+                     ('sed_name', 'U{}'.format(max(sed_len, 1))),
+                     ('fits_image_file', 'U{}'.format(max(fits_len, 1)))]
+                    + _NUMERIC_FIELDS)
+
+
+def empty_objects():
+    "Return a zero-length structured array of parsed objects."
+    return np.zeros(0, dtype=object_dtype())
+
+
+def _object_type(type_token):
+    """
+    Return the object type code for the object type token from an
+    instance catalog line.
+    """
+    type_name = type_token.lower()
+    if type_name == 'point':
+        return _POINT_SOURCE
+    if type_name == 'sersic2d':
+        return _SERSIC_2D
+    if type_name == 'knots':
+        return _RANDOM_WALK
+    if type_token.endswith('.fits') or type_token.endswith('.fits.gz'):
+        return _FITS_IMAGE
+    raise RuntimeError("Do not know how to handle "
+                       "object type: %s" % type_token)
+
+
+def parse_object_lines(object_lines):
+    """
+    Parse object lines from a phosim-style instance catalog into a
+    numpy structured array.
+
+    Each line is tokenized once.  The lines are then grouped by column
+    layout, i.e., by object type and by whether the internal and
+    Galactic extinction models are 'none', so that each column of a
+    group can be converted to a numeric array in a single call.  Lines
+    that are not object entries are skipped.
+
+    Parameters
+    ----------
+    object_lines: list
+        List of object line entries from the instance catalog.
+
+    Returns
+    -------
+    numpy.ndarray: Structured array with dtype given by object_dtype(...)
+        and the objects in the order of the input lines.  The gamma2
+        values are as given in the instance catalog, i.e., without
+        the wl_params.gamma2_sign convention applied.
+    """
+    layouts = defaultdict(list)
+    num_objects = 0
+    for line in object_lines:
+        params = line.split()
+        if not params or params[0] != 'object':
+            continue
+        obj_type = _object_type(params[12])
+        i_int_dust = 13 + len(_SHAPE_COLUMNS[obj_type])
+        internal = params[i_int_dust].lower() != 'none'
+        i_gal_dust = i_int_dust + 3 if internal else i_int_dust + 1
+        galactic = params[i_gal_dust].lower() != 'none'
+        num_tokens = i_gal_dust + 3 if galactic else i_gal_dust + 1
+        layouts[(obj_type, internal, galactic)]\
+            .append((num_objects, params[:num_tokens]))
+        num_objects += 1
+
+    # Transpose the token lists for each layout into columns.
+    groups = []
+    str_lens = defaultdict(lambda: 1)
+    for (obj_type, internal, galactic), entries in layouts.items():
+        rows, tokens = zip(*entries)
+        columns = list(zip(*tokens))
+        strings = dict()
+        for icol, name in _STRING_COLUMNS:
+            if name == 'fits_image_file' and obj_type != _FITS_IMAGE:
+                continue
+            strings[name] = np.array(columns[icol])
+            str_lens[name] = max(str_lens[name],
+                                 strings[name].dtype.itemsize//4)
+        groups.append((obj_type, internal, galactic, np.array(rows),
+                       columns, strings))
+
+    objects = np.zeros(num_objects,
+                       dtype=object_dtype(str_lens['unique_id'],
+                                          str_lens['sed_name'],
+                                          str_lens['fits_image_file']))
+    for obj_type, internal, galactic, rows, columns, strings in groups:
+        objects['object_type'][rows] = obj_type
+        for name, values in strings.items():
+            objects[name][rows] = values
+        for icol, name in _COMMON_COLUMNS:
+            objects[name][rows] = np.array(columns[icol], dtype=float)
+        shape_columns = _SHAPE_COLUMNS[obj_type]
+        for icol, name in enumerate(shape_columns, 13):
+            objects[name][rows] = np.array(columns[icol],
+                                           dtype=objects.dtype[name])
+        icol = 13 + len(shape_columns)
+        if internal:
+            objects['internal_av'][rows] = np.array(columns[icol + 1],
+                                                    dtype=float)
+            objects['internal_rv'][rows] = np.array(columns[icol + 2],
+                                                    dtype=float)
+            icol += 3
+        else:
+            icol += 1
+        if galactic:
+            objects['galactic_av'][rows] = np.array(columns[icol + 1],
+                                                    dtype=float)
+            objects['galactic_rv'][rows] = np.array(columns[icol + 2],
+                                                    dtype=float)
+    return objects
+
+
+def concatenate_objects(object_arrays):
+    """
+    Concatenate structured arrays of parsed objects, promoting the
+    string columns to the widest width among the inputs.
+
+    Parameters
+    ----------
+    object_arrays: sequence
+        Sequence of structured arrays returned by parse_object_lines.
+
+    Returns
+    -------
+    numpy.ndarray
+    """
+    object_arrays = list(object_arrays)
+    if not object_arrays:
+        return empty_objects()
+    str_lens = [max(array.dtype[name].itemsize//4 for array in object_arrays)
+                for name in ('unique_id', 'sed_name', 'fits_image_file')]
+    dtype = object_dtype(*str_lens)
+    return np.concatenate([array.astype(dtype) for array in object_arrays])
@@ -0,0 +1,193 @@
+"""
+Precomputed grids of band fluxes of SED templates over redshift and
+extinction for fast flux lookup.
+"""
+import numpy as np
+from .batch_photometry import BatchPhotometry
+
+__all__ = ['SedFluxGrid', 'get_flux_grid']
+
+
+def _grid_weights(grid, values):
+    """
+    Return the lower cell indices and the linear interpolation weights
+    for values on a 1D grid.
+    """
+    if len(grid) == 1:
+        return np.zeros(len(values), dtype=int), np.zeros(len(values))
+    index = np.clip(np.searchsorted(grid, values, side='right') - 1,
+                    0, len(grid) - 2)
+    weight = (values - grid[index])/(grid[index + 1] - grid[index])
+    return index, weight
+
+
+class SedFluxGrid:
+    """
+    Class to compute band fluxes of instance catalog objects by
+    interpolating in grids of the ADU values of each SED template,
+    normalized to mag_norm=0, tabulated over redshift, internal Av,
+    and Galactic Av for a fixed Rv.
+
+    The logarithm of the ADU values is interpolated linearly in each
+    dimension, which is very accurate in the extinction dimensions
+    since the effective extinction over a bandpass varies slowly.
+    When the grid for a template is built, it is checked against the
+    exact values at the midpoints of the redshift cells, and
+    templates for which the relative error exceeds the tolerance are
+    not interpolated.  Objects with such templates, or with parameters
+    outside of the grids, are computed exactly with BatchPhotometry.
+    """
+    def __init__(self, bandpass, phot_params, tolerance=1e-3, z_grid=None,
+                 iAv_grid=None, gAv_grid=None, Rv=3.1):
+        """
+        Parameters
+        ----------
+        bandpass: lsst.sims.photUtils.Bandpass
+            The bandpass for which to compute the fluxes.
+        phot_params: lsst.sims.photUtils.PhotometricParameters
+            Photometric parameters for the visit.
+        tolerance: float [1e-3]
+            Maximum relative error of the interpolated ADU values.
+        z_grid: numpy.ndarray [None]
+            Redshift grid.  If None, use 0 to 3 in steps of 0.02.
+        iAv_grid: numpy.ndarray [None]
+            Internal Av grid.  If None, use 0 to 2 in steps of 0.25.
+        gAv_grid: numpy.ndarray [None]
+            Galactic Av grid.  If None, use 0 to 1 in steps of 0.25.
+        Rv: float [3.1]
+            Rv value for the internal and Galactic extinction.  Objects
+            with other Rv values are computed exactly.
+        """
+        self.photometry = BatchPhotometry(bandpass, phot_params)
+        self.tolerance = tolerance
+        self.z_grid = (np.linspace(0, 3, 151) if z_grid is None
+                       else np.asarray(z_grid, dtype=float))
+        self.iAv_grid = (np.linspace(0, 2, 9) if iAv_grid is None
+                         else np.asarray(iAv_grid, dtype=float))
+        self.gAv_grid = (np.linspace(0, 1, 5) if gAv_grid is None
+                         else np.asarray(gAv_grid, dtype=float))
+        self.Rv = Rv
+        self._tables = dict()
+
+    @property
+    def shape(self):
+        "The shape of the grid for each template."
+        return len(self.z_grid), len(self.iAv_grid), len(self.gAv_grid)
+
+    def _exact_log_adu(self, sed_file, redshift, iAv, gAv):
+        num = len(redshift)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.log(self.photometry.adu([sed_file]*num, np.zeros(num),
+                                              redshift, iAv,
+                                              np.full(num, self.Rv), gAv,
+                                              np.full(num, self.Rv)))
+
+    def table(self, sed_file):
+        """
+        Return the grid of log(ADU) values for an SED template, or None
+        if interpolation in the grid does not meet the tolerance.
+        """
+        if sed_file not in self._tables:
+            redshift, iAv, gAv = [_.ravel() for _ in
+                                  np.meshgrid(self.z_grid, self.iAv_grid,
+                                              self.gAv_grid, indexing='ij')]
+            table = self._exact_log_adu(sed_file, redshift, iAv, gAv)\
+                        .reshape(self.shape)
+            self._tables[sed_file] = table
+            # Check the interpolation at the redshift cell midpoints,
+            # offset in extinction from the grid nodes.
+            z_mid = (self.z_grid[:-1] + self.z_grid[1:])/2.
+            iAv_mid = np.full(len(z_mid), self.iAv_grid[:2].mean())
+            gAv_mid = np.full(len(z_mid), self.gAv_grid[:2].mean())
+            expected = self._exact_log_adu(sed_file, z_mid, iAv_mid, gAv_mid)
+            interpolated = self._interpolate(table, z_mid, iAv_mid, gAv_mid)
+            finite = np.isfinite(expected) & np.isfinite(interpolated)
+            if (np.any(finite) and
+                    np.max(np.abs(np.expm1(interpolated[finite]
+                                           - expected[finite])))
+                    > self.tolerance):
+                self._tables[sed_file] = None
+        return self._tables[sed_file]
+
+    def _interpolate(self, table, redshift, iAv, gAv):
+        "Trilinear interpolation of a log(ADU) table."
+        indexes, weights = zip(*[_grid_weights(grid, values) for grid, values
+                                 in ((self.z_grid, redshift),
+                                     (self.iAv_grid, iAv),
+                                     (self.gAv_grid, gAv))])
+        result = np.zeros(len(redshift))
+        for corner in np.ndindex(2, 2, 2):
+            weight = np.ones(len(redshift))
+            cell = []
+            for offset, index, wt, size in zip(corner, indexes, weights,
+                                               table.shape):
+                weight *= wt if offset else 1. - wt
+                cell.append(np.minimum(index + offset, size - 1))
+            # Skip zero-weight corners so that NaN values at grid nodes
+            # not used by an object do not propagate.
+            values = np.where(weight > 0, table[tuple(cell)], 0.)
+            result += weight*values
+        return result
+
+    def in_grid(self, redshift, iAv, iRv, gAv, gRv):
+        """
+        Return a boolean array that is True for objects whose
+        parameters are covered by the grids.
+        """
+        redshift, iAv, iRv, gAv, gRv = [np.asarray(_, dtype=float) for _ in
+                                         (redshift, iAv, iRv, gAv, gRv)]
+        return ((redshift >= self.z_grid[0]) & (redshift <= self.z_grid[-1])
+                & (iAv >= self.iAv_grid[0]) & (iAv <= self.iAv_grid[-1])
+                & (gAv >= self.gAv_grid[0]) & (gAv <= self.gAv_grid[-1])
+                & ((iAv == 0) | np.isclose(iRv, self.Rv))
+                & ((gAv == 0) | np.isclose(gRv, self.Rv)))
+
+    def adu(self, sed_files, mag_norm, redshift, iAv, iRv, gAv, gRv):
+        """
+        Compute the ADU values for arrays of objects, interpolating in
+        the template grids where possible.  The arguments and return
+        value are as for BatchPhotometry.adu.
+        """
+        sed_files = np.asarray(sed_files)
+        mag_norm, redshift, iAv, iRv, gAv, gRv \
+            = [np.asarray(_, dtype=float) for _ in
+               (mag_norm, redshift, iAv, iRv, gAv, gRv)]
+        adu = np.full(len(sed_files), np.nan)
+        exact = np.ones(len(sed_files), dtype=bool)
+        in_grid = self.in_grid(redshift, iAv, iRv, gAv, gRv)
+        templates, template_ids = np.unique(sed_files, return_inverse=True)
+        for template_id, sed_file in enumerate(templates):
+            rows = np.where((template_ids == template_id) & in_grid)[0]
+            if len(rows) == 0:
+                continue
+            table = self.table(sed_file)
+            if table is None:
+                continue
+            log_adu = self._interpolate(table, redshift[rows], iAv[rows],
+                                        gAv[rows])
+            ok = np.isfinite(log_adu)
+            adu[rows[ok]] = np.exp(log_adu[ok])*10.**(-0.4*mag_norm[rows[ok]])
+            exact[rows[ok]] = False
+        if np.any(exact):
+            adu[exact] = self.photometry.adu(sed_files[exact], mag_norm[exact],
+                                             redshift[exact], iAv[exact],
+                                             iRv[exact], gAv[exact],
+                                             gRv[exact])
+        return adu
+
+
+_FLUX_GRIDS = dict()
+
+
+def get_flux_grid(bandpass_name, bandpass, phot_params, tolerance):
+    """
+    Return a SedFluxGrid for the bandpass and photometric parameters,
+    reusing a previously created one, with its template tables, if
+    possible.
+    """
+    key = (bandpass_name, tolerance, phot_params.nexp, phot_params.exptime,
+           phot_params.gain, phot_params.effarea)
+    if key not in _FLUX_GRIDS:
+        _FLUX_GRIDS[key] = SedFluxGrid(bandpass, phot_params,
+                                       tolerance=tolerance)
+    return _FLUX_GRIDS[key]
@@ -2,24 +2,164 @@
 Wrapper code for lsst.sims.photUtils.Sed to defer reading of SED data and
 related calculations until they are needed in order to save memory.
 """
-import copy
+import hashlib
+import threading
+from collections import OrderedDict
 import numpy as np
 import lsst.sims.photUtils as sims_photUtils
 
-__all__ = ['SedWrapper']
+__all__ = ['SedWrapper', 'SedTemplateCache']
+
+
+class SedTemplateCache:
+    """
+    Least-recently-used cache of the wavelength and flambda arrays of
+    SED template files, keyed by file path and bounded by the total
+    size of the cached arrays.
+
+    Attributes
+    ----------
+    max_bytes: int
+        Maximum number of bytes of array data to cache.
+    nbytes: int
+        Number of bytes of array data currently cached.
+    hits: int
+        Number of requests served from the cache.
+    misses: int
+        Number of requests that required reading the SED file.
+    """
+    def __init__(self, max_bytes=2**28):
+        """
+        Parameters
+        ----------
+        max_bytes: int [2**28]
+            Maximum number of bytes of array data to cache.
+        """
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+        # Serialize access by threads simulating different sensors.
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._cache)
+
+    def get(self, sed_file):
+        """
+        Return the wavelength and flambda arrays for an SED file,
+        reading the file if it is not in the cache.  The returned arrays
+        are read-only.
+
+        Parameters
+        ----------
+        sed_file: str
+            Path to the SED file.
+
+        Returns
+        -------
+        (numpy.ndarray, numpy.ndarray): wavelength and flambda arrays.
+        """
+        with self._lock:
+            try:
+                arrays = self._cache[sed_file]
+            except KeyError:
+                self.misses += 1
+                sed_obj = sims_photUtils.Sed()
+                sed_obj.readSED_flambda(sed_file)
+                arrays = (sed_obj.wavelen, sed_obj.flambda)
+                for array in arrays:
+                    array.setflags(write=False)
+                self._cache[sed_file] = arrays
+                self.nbytes += sum(array.nbytes for array in arrays)
+                while self.nbytes > self.max_bytes and len(self._cache) > 1:
+                    _, evicted = self._cache.popitem(last=False)
+                    self.nbytes -= sum(array.nbytes for array in evicted)
+            else:
+                self.hits += 1
+                self._cache.move_to_end(sed_file)
+            return arrays
+
+    def clear(self):
+        "Empty the cache and reset the counters."
+        with self._lock:
+            self._cache.clear()
+            self.nbytes = 0
+            self.hits = 0
+            self.misses = 0
 
 
 class CCMmodel:
     """
     Helper class to cache a(x) and b(x) arrays evaluated on wavelength
     grids for intrinsic and Galactic extinction calculations.
+
+    The arrays for each grid are cached under a hash of the grid
+    values, so that SEDs on different grids do not evict each other's
+    entries, and the least recently used grids are dropped beyond
+    max_grids.  The cached arrays are read-only, so tables computed
+    in a parent process, e.g., with the precompute method, are shared
+    with forked worker processes.
     """
-    def __init__(self):
-        self.wavelen = dict()
-        self.a = dict()
-        self.b = dict()
-        for ext_type in ('intrinsic', 'Galactic'):
-            self.wavelen[ext_type] = None
+    def __init__(self, max_grids=64):
+        """
+        Parameters
+        ----------
+        max_grids: int [64]
+            Maximum number of wavelength grids for which to cache the
+            a(x), b(x) arrays.
+        """
+        self.max_grids = max_grids
+        self._ab = OrderedDict()
+        # Serialize access by threads simulating different sensors.
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._ab)
+
+    @staticmethod
+    def _grid_key(wavelen):
+        wavelen = np.ascontiguousarray(wavelen, dtype=float)
+        return len(wavelen), hashlib.sha1(wavelen.data).hexdigest()
+
+    def ab(self, wavelen):
+        """
+        Return the CCM a(x) and b(x) arrays for the specified
+        wavelength grid.
+
+        Parameters
+        ----------
+        wavelen: numpy.ndarray
+            Wavelength grid in nm.
+
+        Returns
+        -------
+        (numpy.ndarray, numpy.ndarray)
+        """
+        key = self._grid_key(wavelen)
+        with self._lock:
+            try:
+                self._ab.move_to_end(key)
+                return self._ab[key]
+            except KeyError:
+                a_x, b_x = sims_photUtils.Sed(wavelen=wavelen,
+                                              flambda=np.ones(len(wavelen)))\
+                                         .setupCCM_ab()
+                for array in (a_x, b_x):
+                    array.setflags(write=False)
+                self._ab[key] = (a_x, b_x)
+                while len(self._ab) > self.max_grids:
+                    self._ab.popitem(last=False)
+                return a_x, b_x
+
+    def precompute(self, wavelen):
+        """
+        Compute and cache the a(x), b(x) arrays for a wavelength grid,
+        e.g., BandpassDict.wavelenMatch for Galactic extinction, in
+        advance.
+        """
+        self.ab(wavelen)
 
     def add_dust(self, sed_obj, Av, Rv, ext_type):
         """
@@ -36,20 +176,22 @@ class CCMmodel:
         ext_type: str
             Extinction type: 'intrinsic' or 'Galactic'
         """
-        if (self.wavelen[ext_type] is None or
-            not np.array_equal(sed_obj.wavelen, self.wavelen[ext_type])):
-            self.a[ext_type], self.b[ext_type] = sed_obj.setupCCM_ab()
-            self.wavelen[ext_type] = copy.deepcopy(sed_obj.wavelen)
-        sed_obj.addDust(self.a[ext_type], self.b[ext_type],
-                        A_v=Av, R_v=Rv)
+        a_x, b_x = self.ab(sed_obj.wavelen)
+        sed_obj.addDust(a_x, b_x, A_v=Av, R_v=Rv)
 
 
 class SedWrapper:
     """
     Wrapper class to defer reading of SED data and related calculations
     until they are needed in order to avoid excess memory usage.
+
+    Instances have no __dict__ so that the per-object overhead before
+    the SED data are read is small.
     """
-    shared_resources = dict(ccm_model=CCMmodel())
+    __slots__ = ('sed_file', 'mag_norm', 'redshift', 'iAv', 'iRv', 'gAv',
+                 'gRv', 'bp_dict', '_sed_obj', '_adu')
+    shared_resources = dict(ccm_model=CCMmodel(),
+                            sed_cache=SedTemplateCache())
     def __init__(self, sed_file, mag_norm, redshift, iAv, iRv, gAv, gRv,
                  bp_dict):
         self.sed_file = sed_file
@@ -61,6 +203,7 @@ class SedWrapper:
         self.gRv = gRv
         self.bp_dict = bp_dict
         self._sed_obj = None
+        self._adu = None
 
     @property
     def sed_obj(self):
@@ -81,13 +224,23 @@ class SedWrapper:
         del self._sed_obj
         self._sed_obj = None
 
+    def set_adu(self, bandpass, adu):
+        """
+        Set a precomputed ADU value, e.g., from BatchPhotometry, for the
+        specified bandpass so that calcADU need not compute the SED.
+        """
+        self._adu = (bandpass, adu)
+
     def calcADU(self, bandpass, photParams):
         "Calculate the ADU for the specified bandpass."
+        if self._adu is not None and self._adu[0] is bandpass:
+            return self._adu[1]
         return self.sed_obj.calcADU(bandpass, photParams)
 
     def _compute_SED(self):
-        self._sed_obj = sims_photUtils.Sed()
-        self._sed_obj.readSED_flambda(self.sed_file)
+        wavelen, flambda \
+            = self.shared_resources['sed_cache'].get(self.sed_file)
+        self._sed_obj = sims_photUtils.Sed(wavelen=wavelen, flambda=flambda)
         fnorm = sims_photUtils.getImsimFluxNorm(self._sed_obj, self.mag_norm)
         self._sed_obj.multiplyFluxNorm(fnorm)
         if self.iAv != 0:
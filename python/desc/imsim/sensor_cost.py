@@ -0,0 +1,83 @@
+"""
+Model of the relative cost of simulating each sensor, used to order
+the sensors for processing.
+"""
+import numpy as np
+from .instcat_parser import _SERSIC_2D
+
+__all__ = ['SensorCostModel']
+
+
+class SensorCostModel:
+    """
+    Linear model of the time to simulate a sensor based on the
+    objects in its trimmed instance catalog: the number of objects,
+    the number of sersic galaxies, the number of bright objects, and
+    the sum of the object fluxes relative to an object at the bright
+    magnitude limit.  The default coefficients are rough values in
+    seconds; the estimates are logged along with the actual run times
+    so that they can be tuned with the constructor arguments.
+    """
+    def __init__(self, per_object=2e-3, per_sersic=3e-3, per_bright=2.,
+                 per_flux=0.5, bright_mag=16.):
+        """
+        Parameters
+        ----------
+        per_object: float [2e-3]
+            Cost of each object.
+        per_sersic: float [3e-3]
+            Additional cost of each sersic galaxy.
+        per_bright: float [2.]
+            Additional cost of each object brighter than bright_mag.
+        per_flux: float [0.5]
+            Cost per unit flux, in units of the flux of an object with
+            mag_norm = bright_mag.
+        bright_mag: float [16.]
+            mag_norm value defining bright objects.
+        """
+        self.per_object = per_object
+        self.per_sersic = per_sersic
+        self.per_bright = per_bright
+        self.per_flux = per_flux
+        self.bright_mag = bright_mag
+
+    def features(self, objects):
+        """
+        Compute the model features for a sensor.
+
+        Parameters
+        ----------
+        objects: numpy.ndarray
+            Structured array of the sensor's objects as returned by
+            parse_object_lines.
+
+        Returns
+        -------
+        dict
+        """
+        mag_norm = objects['mag_norm']
+        return dict(num_objects=len(objects),
+                    num_sersic=int(np.sum(objects['object_type']
+                                          == _SERSIC_2D)),
+                    num_bright=int(np.sum(mag_norm < self.bright_mag)),
+                    flux_sum=float(np.sum(10.**(-0.4*(mag_norm
+                                                      - self.bright_mag)))))
+
+    def estimate(self, objects):
+        """
+        Estimate the cost of simulating a sensor.
+
+        Parameters
+        ----------
+        objects: numpy.ndarray
+            Structured array of the sensor's objects.
+
+        Returns
+        -------
+        float
+        """
+        features = self.features(objects)
+        return (self.per_object*features['num_objects']
+                + self.per_sersic*features['num_sersic']
+                + self.per_bright*features['num_bright']
+                + self.per_flux*features['flux_sum'])
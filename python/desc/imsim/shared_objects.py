@@ -0,0 +1,145 @@
+"""
+Structured arrays of parsed instance catalog objects in shared memory.
+"""
+import os
+import weakref
+import tempfile
+import numpy as np
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    # Python < 3.8, so use memory-mapped temporary files instead.
+    shared_memory = None
+
+__all__ = ['SharedObjectTable']
+
+
+def _release(shm, path, unlink):
+    """
+    Close a SharedMemory block and, if this process created it,
+    unlink it, or, if this process created the memory-mapped file,
+    delete it.  Processes that have the file mapped can still read
+    it after it is deleted.
+    """
+    if shm is not None:
+        try:
+            shm.close()
+        except BufferError:
+            # Arrays using the buffer still exist; the mapping will be
+            # released when they are deleted.
+            pass
+        if unlink:
+            try:
+                shm.unlink()
+            except FileNotFoundError:
+                pass
+    elif unlink and path is not None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def _memmap_dir():
+    "Directory for the memory-mapped files, preferably RAM-backed."
+    return '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+
+class SharedObjectTable:
+    """
+    Structured array of parsed instance catalog objects, as returned
+    by parse_object_lines, held in a multiprocessing.shared_memory
+    block or, if that is not available (Python < 3.8), in a
+    memory-mapped temporary file.
+
+    Only the name of the block or file, the dtype, and the shape are
+    pickled, so passing a SharedObjectTable to a worker process, e.g.,
+    via multiprocessing.Pool.apply_async, does not copy the objects:
+    the worker attaches to the existing block or file and reads the
+    rows it needs from it.  The block is unlinked, or the file
+    deleted, when the instance in the creating process is garbage
+    collected or at interpreter exit.
+    """
+    def __init__(self, objects, use_memmap=None):
+        """
+        Parameters
+        ----------
+        objects: numpy.ndarray
+            Structured array of the objects to copy into shared memory.
+        use_memmap: bool [None]
+            Use a memory-mapped file instead of a shared_memory block.
+            If None, then a file is used only if shared_memory is not
+            available.
+        """
+        objects = np.ascontiguousarray(objects)
+        if use_memmap is None:
+            use_memmap = shared_memory is None
+        shm, path = None, None
+        if not use_memmap:
+            shm = shared_memory.SharedMemory(create=True,
+                                             size=max(objects.nbytes, 1))
+        elif objects.nbytes > 0:
+            # Empty files cannot be mapped, so empty tables are just
+            # pickled.
+            fd, path = tempfile.mkstemp(prefix='imsim_objects_',
+                                        suffix='.dat', dir=_memmap_dir())
+            os.close(fd)
+        self._attach(objects.dtype, objects.shape, owner=True, shm=shm,
+                     path=path)
+        self.array[...] = objects
+        if path is not None:
+            self.array.flush()
+
+    def _attach(self, dtype, shape, owner, shm=None, path=None):
+        self._shm = shm
+        self._path = path
+        self.dtype = dtype
+        self.shape = shape
+        if shm is not None:
+            self.array = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        elif path is not None:
+            self.array = np.memmap(path, dtype=dtype, shape=shape,
+                                   mode='w+' if owner else 'r+')
+        else:
+            self.array = np.zeros(shape, dtype=dtype)
+        self._finalizer = weakref.finalize(self, _release, shm, path, owner)
+
+    def __getstate__(self):
+        state = dict(dtype=self.dtype, shape=self.shape)
+        if self._shm is not None:
+            state['name'] = self._shm.name
+        else:
+            state['path'] = self._path
+            if self._path is None:
+                state['array'] = np.array(self.array)
+        return state
+
+    def __setstate__(self, state):
+        if 'name' in state:
+            shm = shared_memory.SharedMemory(name=state['name'])
+            self._attach(state['dtype'], state['shape'], owner=False,
+                         shm=shm)
+        else:
+            self._attach(state['dtype'], state['shape'], owner=False,
+                         path=state['path'])
+            if 'array' in state:
+                self.array = state['array']
+
+    @property
+    def name(self):
+        "The name of the shared memory block or memory-mapped file."
+        return self._shm.name if self._shm is not None else self._path
+
+    def __len__(self):
+        return len(self.array)
+
+    def __getitem__(self, index):
+        return self.array[index]
+
+    def close(self):
+        """
+        Release this process's mapping of the shared memory and, if this
+        process created the block or file, unlink or delete it.
+        """
+        self.array = None
+        self._finalizer()
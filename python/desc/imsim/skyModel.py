@@ -4,6 +4,7 @@ Note that this extends the default classes located in
 sims_GalSimInterface/python/lsst/sims/GalSimInterface/galSimNoiseAndBackground.py
 '''
 from __future__ import absolute_import, division
+import threading
 import numpy as np
 import astropy.units as u
 import galsim
@@ -36,6 +37,28 @@ def make_sky_model(obs_metadata, photParams, seed=None, bandpassDict=None,
                        addBackground=addBackground, logger=logger)
 
 
+# The bandpasses and the skybrightness.SkyModel do not depend on the
+# visit, so they are created once per process and shared by all of the
+# sky model instances.
+_SHARED_RESOURCES = dict()
+# The skybrightness.SkyModel is stateful, so serialize its use by
+# threads simulating different sensors.
+_SKY_MODEL_LOCK = threading.Lock()
+
+def _default_bandpass_dict():
+    "Return the shared BandpassDict of the LSST filter bandpasses."
+    if 'bandpass_dict' not in _SHARED_RESOURCES:
+        _SHARED_RESOURCES['bandpass_dict'] \
+            = BandpassDict.loadBandpassesFromFiles()[0]
+    return _SHARED_RESOURCES['bandpass_dict']
+
+def _skybrightness_model():
+    "Return the shared skybrightness.SkyModel."
+    if 'sky_model' not in _SHARED_RESOURCES:
+        _SHARED_RESOURCES['sky_model'] = skybrightness.SkyModel(mags=False)
+    return _SHARED_RESOURCES['sky_model']
+
+
 class SkyCountsPerSec(object):
     """
     This is a class that is used to calculate the number of sky counts per
@@ -141,11 +164,11 @@ class ESOSkyModel(NoiseAndBackgroundBase):
         self.photParams = photParams
 
         if bandpassDict is None:
-            self.bandpassDict = BandpassDict.loadBandpassesFromFiles()[0]
+            self.bandpassDict = _default_bandpass_dict()
 
         # Computing the skybrightness.SkyModel object is expensive, so
-        # do it only once in the constructor.
-        self.skyModel = skybrightness.SkyModel(mags=False)
+        # do it only once per process and reuse it for subsequent visits.
+        self.skyModel = _skybrightness_model()
 
         self.addNoise = addNoise
         self.addBackground = addBackground
@@ -239,7 +262,6 @@ class ESOSkyModel(NoiseAndBackgroundBase):
             camera=camera, obs_metadata=self.obs_metadata, epoch=2000.0,
             includeDistortion=True)
         mjd = self.obs_metadata.mjd.TAI
-        self.skyModel.setRaDecMjd(ra, dec, mjd, degrees=True)
 
         bandPassName = self.obs_metadata.bandpass
 
@@ -248,9 +270,11 @@ class ESOSkyModel(NoiseAndBackgroundBase):
         # visit as a whole.  TODO: Undo this change when we write
         # separate images per exposure.
         exposureTime = self.photParams.nexp*self.photParams.exptime
-        skycounts_persec = SkyCountsPerSec(self.skyModel, self.photParams,
-                                           self.bandpassDict)
-        return float(skycounts_persec(bandPassName)*exposureTime*u.s)
+        with _SKY_MODEL_LOCK:
+            self.skyModel.setRaDecMjd(ra, dec, mjd, degrees=True)
+            skycounts_persec = SkyCountsPerSec(self.skyModel, self.photParams,
+                                               self.bandpassDict)
+            return float(skycounts_persec(bandPassName)*exposureTime*u.s)
 
 class FastSiliconSkyModel(ESOSkyModel):
     """
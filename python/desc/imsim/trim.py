@@ -2,11 +2,15 @@
 Function to apply chip-centered acceptance cones on instance catalogs.
 """
 from collections import defaultdict
-import pickle
 import numpy as np
+from scipy.spatial import cKDTree
 import lsst.sims.coordUtils
 from lsst.sims.utils import _angularSeparation
 import desc.imsim
+from .instcat_cache import InstCatCache
+from .checkpoint_store import read_drawn_objects
+from .instcat_parser import parse_object_lines, concatenate_objects,\
+    _SERSIC_2D
 
 __all__ = ['InstCatTrimmer']
 
@@ -29,39 +33,54 @@ def degrees_separation(ra0, dec0, ra, dec):
     return np.degrees(_angularSeparation(np.radians(ra0), np.radians(dec0),
                                          np.radians(ra), np.radians(dec)))
 
+
+def unit_vectors(ra, dec):
+    """
+    Compute the Cartesian unit vectors for locations on the sky.
+
+    Parameters
+    ----------
+    ra: float or numpy.array
+        Right ascension of location(s) in degrees.
+    dec: float or numpy.array
+        Declination of location(s) in degrees.
+
+    Returns
+    -------
+    numpy.array: (N, 3) array of unit vectors.
+    """
+    ra = np.radians(np.atleast_1d(ra))
+    dec = np.radians(np.atleast_1d(dec))
+    cos_dec = np.cos(dec)
+    return np.array([cos_dec*np.cos(ra), cos_dec*np.sin(ra), np.sin(dec)]).T
+
+
 class Disaggregator:
     """
-    Class to disaggregate instance catalog object lines per chip using
-    acceptance cones.
+    Class to disaggregate instance catalog objects per chip using
+    acceptance cones.  A KD-tree of the object unit vectors is built
+    once per chunk of objects so that each acceptance cone query only
+    considers the nearby objects.
     """
-    def __init__(self, object_lines, trimmer):
+    def __init__(self, objects, trimmer):
         """
         Parameters
         ----------
-        object_lines: list
-            list of object entries from an instance catalog.
+        objects: numpy.ndarray
+            Structured array of parsed instance catalog objects as
+            returned by desc.imsim.parse_object_lines.
         trimmer: InstCatTrimmer
             An instance of the InstCatTrimmer class to provide
             visit-level metadata.
         """
-        self.object_lines = object_lines
+        self.objects = objects
         self.trimmer = trimmer
-
-        # Extract the ra, dec values for each object.
-        self._ids = []
-        self._ra = np.zeros(len(object_lines), dtype=np.float)
-        self._dec = np.zeros(len(object_lines), dtype=np.float)
-        self._sersic = np.zeros(len(object_lines), dtype=np.int)
-        self._magnorm = np.zeros(len(object_lines), dtype=np.float)
-        for i, line in enumerate(object_lines):
-            tokens = line.strip().split()
-            self._ids.append(tokens[1])
-            self._ra[i] = np.float(tokens[2])
-            self._dec[i] = np.float(tokens[3])
-            if 'sersic2d' in line:
-                self._sersic[i] = 1
-            self._magnorm[i] = np.float(tokens[4])
+        self._sersic = (objects['object_type'] == _SERSIC_2D).astype(int)
         self._camera = desc.imsim.get_obs_lsstSim_camera()
+        self._tree = None
+        if len(objects) > 0:
+            self._tree = cKDTree(unit_vectors(objects['ra_phosim'],
+                                              objects['dec_phosim']))
 
     def compute_chip_center(self, chip_name):
         """
@@ -77,16 +96,22 @@ class Disaggregator:
         -------
         (float, float): The RA, Dec in degrees of the center of the CCD.
         """
-        center_x, center_y = desc.imsim.get_chip_center(chip_name, self._camera)
-        return lsst.sims.coordUtils.raDecFromPixelCoords(
-            xPix=center_x, yPix=center_y, chipName=chip_name,
-            camera=self._camera, obs_metadata=self.trimmer.obs_md, epoch=2000.0,
-            includeDistortion=True)
+        # The chip centers only depend on the visit, so cache them
+        # in the trimmer for use with subsequent chunks.
+        if chip_name not in self.trimmer.chip_centers:
+            center_x, center_y \
+                = desc.imsim.get_chip_center(chip_name, self._camera)
+            self.trimmer.chip_centers[chip_name] \
+                = lsst.sims.coordUtils.raDecFromPixelCoords(
+                    xPix=center_x, yPix=center_y, chipName=chip_name,
+                    camera=self._camera, obs_metadata=self.trimmer.obs_md,
+                    epoch=2000.0, includeDistortion=True)
+        return self.trimmer.chip_centers[chip_name]
 
-    def get_object_entries(self, chip_name, radius=0.18, sort_magnorm=True):
+    def get_object_indices(self, chip_name, radius=0.18, sort_magnorm=True):
         """
-        Get the object entries within an acceptance cone centered on
-        a specified CCD.
+        Get the indices of the object entries within an acceptance
+        cone centered on a specified CCD.
 
         Parameters
         ----------
@@ -95,36 +120,69 @@ class Disaggregator:
         radius: float [0.18]
             Radius, in degrees, of the acceptance cone.
         sort_magnorm: bool [True]
-            Flag to sort the output list by ascending magnorm value.
+            Flag to sort the output indices by ascending magnorm value.
 
         Returns
         -------
-        list, int: (list of object entries from the original instance catalog,
-                    number of sersic objects for minsource application)
-
+        numpy.ndarray, int: (indices of the selected objects,
+                             number of sersic objects for minsource
+                             application)
         """
         self.trimmer.logger.debug("computing object offsets from %s center",
                                   chip_name)
+        if self._tree is None:
+            return np.zeros(0, dtype=int), 0
         ra0, dec0 = self.compute_chip_center(chip_name)
-        seps = degrees_separation(ra0, dec0, self._ra, self._dec)
+
+        # Find the candidates within the chord length corresponding
+        # to the cone radius, padded slightly to guard against
+        # roundoff, then apply the exact separation cut.
+        chord = 2.*np.sin(np.radians(radius)/2.)*(1. + 1e-8)
+        candidates = np.array(sorted(self._tree.query_ball_point(
+            unit_vectors(ra0, dec0)[0], chord)), dtype=int)
+        seps = degrees_separation(ra0, dec0,
+                                  self.objects['ra_phosim'][candidates],
+                                  self.objects['dec_phosim'][candidates])
+        index = candidates[seps < radius]
         if chip_name in self.trimmer.drawn_objects_dict:
-            not_drawn = [not x in self.trimmer.drawn_objects_dict[chip_name]
-                         for x in self._ids]
-            index = np.where((seps < radius) & not_drawn)
+            drawn = list(self.trimmer.drawn_objects_dict[chip_name])
+            not_drawn = ~np.isin(self.objects['unique_id'][index], drawn)
+            index = index[not_drawn]
             self.trimmer.logger.debug("avoiding drawn objects")
             self.trimmer.logger.debug(index)
-        else:
-            index = np.where(seps < radius)
 
-        # Collect the selected objects.
-        selected = [self.object_lines[i] for i in index[0]]
         if sort_magnorm:
             # Sort by magnorm.
             self.trimmer.logger.debug('sorting by magnorm')
-            sorted_index = np.argsort(self._magnorm[index])
-            selected = [selected[i] for i in sorted_index]
+            index = index[np.argsort(self.objects['mag_norm'][index],
+                                     kind='stable')]
 
-        return selected, sum(self._sersic[index])
+        return index, sum(self._sersic[index])
+
+    def get_object_entries(self, chip_name, radius=0.18, sort_magnorm=True):
+        """
+        Get the object entries within an acceptance cone centered on
+        a specified CCD.
+
+        Parameters
+        ----------
+        chip_name: str
+            Name of the CCD, e.g., "R:2,2 S:1,1".
+        radius: float [0.18]
+            Radius, in degrees, of the acceptance cone.
+        sort_magnorm: bool [True]
+            Flag to sort the output list by ascending magnorm value.
+
+        Returns
+        -------
+        numpy.ndarray, int: (structured array of the selected objects,
+                             number of sersic objects for minsource
+                             application)
+
+        """
+        index, nsersic = self.get_object_indices(chip_name, radius=radius,
+                                                 sort_magnorm=sort_magnorm)
+        return self.objects[index], nsersic
 
 class InstCatTrimmer(dict):
     """
@@ -140,17 +198,26 @@ class InstCatTrimmer(dict):
     minsource: int
         Minimum number of sersic objects to require for a sensor-visit
         to be simulated.
+    objects: numpy.ndarray
+        Structured array of the objects selected for any of the
+        sensors, with each object appearing once.
+    indices: dict
+        Arrays of the row indices into objects for each sensor.
 
+    Only the indices are stored for each sensor, and the object arrays
+    returned by item access are indexed from objects on demand, so
+    that the objects are not copied for every sensor at once.
     """
     def __init__(self, instcat, sensor_list, checkpoint_files=None,
                  chunk_size=int(3e5), radius=0.18, numRows=None,
-                 minsource=None, log_level='INFO', sort_magnorm=True):
+                 minsource=None, log_level='INFO', sort_magnorm=True,
+                 cache_dir=None):
         """
         Parameters
         ----------
-        instcat: str
-            Path to input instance catalog.  The file can have includeobj
-            entries.
+        instcat: str or InstCatHandle
+            Path to input instance catalog, or a handle for it.  The
+            file can have includeobj entries.
         sensor_list: list
             List of sensors, e.g., "R:2,2 S:1,1", for which to provide
             object lists.
@@ -174,16 +241,25 @@ class InstCatTrimmer(dict):
         sort_magnorm: bool [True]
             Sort the objects in each chunk by mag_norm to draw brighter
             objects first.
+        cache_dir: str [None]
+            Directory containing binary caches of parsed instance
+            catalogs.  If a valid cache for instcat exists, the parsed
+            objects are loaded from it; otherwise, the cache is written
+            as the catalog is read.  If None, or if numRows is not None,
+            then no cache is used.
         """
         super(InstCatTrimmer, self).__init__()
         self.logger = desc.imsim.get_logger(log_level, 'InstCatTrimmer')
-        self.instcat_file = instcat
+        self.instcat = desc.imsim.InstCatHandle.get(instcat)
+        self.instcat_file = self.instcat.instcat_file
+        self.chip_centers = dict()
         self._read_commands()
         if minsource is not None:
             self.minsource = minsource
         self._read_drawn_objects(checkpoint_files)
         self._process_objects(sensor_list, chunk_size, radius=radius,
-                              numRows=numRows, sort_magnorm=sort_magnorm)
+                              numRows=numRows, sort_magnorm=sort_magnorm,
+                              cache_dir=cache_dir)
 
     def _read_drawn_objects(self, checkpoint_files):
         """
@@ -193,64 +269,124 @@ class InstCatTrimmer(dict):
         if checkpoint_files is None:
             return
         for detname, ckpt_file in checkpoint_files.items():
-            with open(ckpt_file, 'rb') as fd:
-                ckpt = pickle.load(fd)
-                self.drawn_objects_dict[detname] = ckpt['drawn_objects']
+            self.drawn_objects_dict[detname] = read_drawn_objects(ckpt_file)
 
     def _process_objects(self, sensor_list, chunk_size, radius=0.18,
-                         numRows=None, sort_magnorm=True):
+                         numRows=None, sort_magnorm=True, cache_dir=None):
         """
-        Loop over chunks of lines from the instance catalog
+        Loop over chunks of objects from the instance catalog
         and disaggregate the entries into the separate object lists
         for each sensor using the Disaggregator class to apply the
         acceptance cone cut centered on each sensor.
         """
+        cache = None
+        if cache_dir is not None and numRows is None:
+            cache = InstCatCache(self.instcat_file, cache_dir)
+        if cache is not None and cache.is_valid():
+            self.logger.debug("reading parsed objects from %s", cache.path)
+            chunks = cache.chunks()
+        else:
+            chunks = self._read_chunks(chunk_size, numRows=numRows,
+                                       cache=cache)
         num_gals = defaultdict(lambda: 0)
-        self.update({sensor: [] for sensor in sensor_list})
-        with desc.imsim.fopen(self.instcat_file, mode='rt') as fd:
-            nread = 0
-            while numRows is None or nread < numRows:
-                object_lines = []
-                ichunk = 0
-                for ichunk, line in zip(range(chunk_size), fd):
-                    nread += 1
-                    if (not line.startswith('object') or ' inf ' in line):
-                        continue
-                    object_lines.append(line)
-                self.logger.debug("read %d objects", nread)
-                disaggregator = Disaggregator(object_lines, self)
-                for sensor in self:
-                    self.logger.debug("getting objects for %s", sensor)
-                    obj_list, nsersic = disaggregator\
-                        .get_object_entries(sensor, radius=radius,
-                                            sort_magnorm=sort_magnorm)
-                    self[sensor].extend(obj_list)
-                    num_gals[sensor] += nsersic
-                if ichunk < chunk_size - 1:
-                    break
-        for sensor in self:
+        indices = {sensor: [] for sensor in sensor_list}
+        tables = []
+        offset = 0
+        for chunk in chunks:
+            disaggregator = Disaggregator(chunk, self)
+            chunk_indices = dict()
+            for sensor in sensor_list:
+                self.logger.debug("getting objects for %s", sensor)
+                chunk_indices[sensor], nsersic = disaggregator\
+                    .get_object_indices(sensor, radius=radius,
+                                        sort_magnorm=sort_magnorm)
+                num_gals[sensor] += nsersic
+            # Keep each object selected for any sensor only once, and
+            # map the per-sensor indices to rows of the combined table.
+            selected = np.unique(np.concatenate(
+                [np.zeros(0, dtype=int)] + list(chunk_indices.values())))
+            tables.append(chunk[selected])
+            for sensor, index in chunk_indices.items():
+                indices[sensor].append(offset
+                                       + np.searchsorted(selected, index))
+            offset += len(selected)
+        self.objects = concatenate_objects(tables)
+        self.indices = dict()
+        for sensor in sensor_list:
+            self.indices[sensor] = np.concatenate(
+                [np.zeros(0, dtype=int)] + indices[sensor])
             # Apply minsource criterion on galaxies.
             if self.minsource is not None and num_gals[sensor] < self.minsource:
-                self[sensor] = []
+                self.indices[sensor] = self.indices[sensor][:0]
+            super(InstCatTrimmer, self).__setitem__(sensor,
+                                                    self.indices[sensor])
 
-    def _read_commands(self):
-        """Read in the commands from the instance catalog."""
-        max_lines = 50  # There should be fewer than 50, but put a hard
-                        # limit to avoid suspect catalogs.
-        self.command_lines = []
-        phosim_commands = dict()
-        with desc.imsim.fopen(self.instcat_file, mode='rt') as input_:
-            for line, _ in zip(input_, range(max_lines)):
-                if line.startswith('object'):
-                    break
-                if line.startswith('#'):
-                    continue
-                self.command_lines.append(line)
-                tokens = line.strip().split()
-                phosim_commands[tokens[0]] = float(tokens[1])
+    def __getitem__(self, sensor):
+        return self.objects[super(InstCatTrimmer, self).__getitem__(sensor)]
+
+    def get(self, sensor, default=None):
+        return self[sensor] if sensor in self else default
+
+    def values(self):
+        return (self[sensor] for sensor in self)
+
+    def items(self):
+        return ((sensor, self[sensor]) for sensor in self)
+
+    def _read_chunks(self, chunk_size, numRows=None, cache=None):
+        """
+        Generator to read chunks of lines from the instance catalog
+        and return the parsed objects in each chunk.  If an
+        InstCatCache is provided, the parsed chunks are written to it.
+        """
+        writer = None if cache is None else cache.writer()
+        opened_files = []
         try:
-            self.minsource = phosim_commands['minsource']
-        except KeyError:
-            self.minsource = None
-        phosim_commands['bandpass'] = 'ugrizy'[int(phosim_commands['filter'])]
-        self.obs_md = desc.imsim.phosim_obs_metadata(phosim_commands)
+            with desc.imsim.fopen_blocks(self.instcat_file,
+                                         block_size=chunk_size,
+                                         opened_files=opened_files) as blocks:
+                nread = 0
+                chunk_lines = []
+                for block in blocks:
+                    if numRows is not None:
+                        block = block[:numRows - nread]
+                    nread += len(block)
+                    while block:
+                        nfill = chunk_size - len(chunk_lines)
+                        chunk_lines.extend(block[:nfill])
+                        block = block[nfill:]
+                        if len(chunk_lines) == chunk_size:
+                            yield self._parse_chunk(chunk_lines, nread, writer)
+                            chunk_lines = []
+                    if numRows is not None and nread >= numRows:
+                        break
+                yield self._parse_chunk(chunk_lines, nread, writer)
+        except BaseException:
+            if writer is not None:
+                writer.abort()
+            raise
+        if writer is not None:
+            self.logger.debug("writing parsed objects to %s", cache.path)
+            writer.commit(opened_files)
+
+    def _parse_chunk(self, lines, nread, writer):
+        """
+        Parse the object lines in a chunk of lines from the instance
+        catalog, skipping any with infinite magnitudes, and write the
+        parsed objects to the cache writer, if provided.
+        """
+        self.logger.debug("read %d lines", nread)
+        objects = parse_object_lines([line for line in lines
+                                      if line.startswith('object')
+                                      and ' inf ' not in line])
+        if writer is not None:
+            writer.append(objects)
+        return objects
+
+    def _read_commands(self):
+        """
+        Get the commands from the header of the instance catalog, which
+        the InstCatHandle reads only once.
+        """
+        self.minsource = self.instcat.commands.get('minsource')
+        self.obs_md = self.instcat.obs_md
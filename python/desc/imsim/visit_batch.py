@@ -0,0 +1,104 @@
+"""
+Driver to simulate a sequence of visits in a single python process.
+"""
+import gc
+import time
+import warnings
+from astropy._erfa import ErfaWarning
+from lsst.sims.GalSimInterface import LSSTCameraWrapper
+from .imSim import read_config, InstCatHandle, make_psf, get_logger
+from .ImageSimulator import ImageSimulator
+
+__all__ = ['simulate_visits']
+
+
+def simulate_visits(instcats, psf_name='Kolmogorov', processes=1,
+                    config=None, seed=267, outdir='fits', sensor_list=None,
+                    apply_sensor_model=True, create_centroid_file=False,
+                    file_id=None, log_level='WARN', stop_on_error=False):
+    """
+    Simulate the visits for a list of instance catalogs back-to-back.
+
+    The resources that do not depend on the visit are loaded once and
+    reused for all of the visits: the LSSTCameraWrapper is passed to
+    each ImageSimulator, and the bandpasses, skybrightness.SkyModel,
+    cosmic ray catalog, and tree ring models are cached at module
+    level the first time they are used.  A new multiprocessing pool is
+    forked for each visit so that the workers inherit these resources
+    along with the visit's GalSimInterpreters.
+
+    Parameters
+    ----------
+    instcats: list
+        The instance catalogs of the visits.
+    psf_name: str ['Kolmogorov']
+        Either "DoubleGaussian", "Kolmogorov", or "Atmospheric".
+    processes: int [1]
+        Number of processes to use for each visit.
+    config: str [None]
+        Filename of config file to use.  If None, then the default
+        config will be used.
+    seed: int [267]
+        Random number seed to pass to the GalSimInterpreter objects.
+    outdir: str ['fits']
+        Output directory to write the FITS images.
+    sensor_list: tuple or other container [None]
+        The names of sensors (e.g., "R:2,2 S:1,1") to simulate.
+        If None, then all sensors in the camera will be considered.
+    apply_sensor_model: bool [True]
+        Flag to apply galsim.SiliconSensor model.
+    create_centroid_file: bool [False]
+        Flag to write centroid files.
+    file_id: str [None]
+        String to use for the checkpoint files.  The visit number is
+        appended for each visit.  If None, then no checkpoint files
+        will be used.
+    log_level: str ['WARN']
+        Logging level ('DEBUG', 'INFO', 'WARN', 'ERROR', 'CRITICAL').
+    stop_on_error: bool [False]
+        If True, then re-raise any exception raised while simulating a
+        visit.  Otherwise, log it and continue with the next visit.
+
+    Returns
+    -------
+    dict: The ImageSimulator.run results, or the exception raised,
+        for each instance catalog.
+    """
+    logger = get_logger(log_level, name='simulate_visits')
+    read_config(config)
+    camera_wrapper = LSSTCameraWrapper()
+    results = dict()
+    for instcat in instcats:
+        t0 = time.time()
+        try:
+            with warnings.catch_warnings():
+                warnings.filterwarnings('ignore', 'ERFA', ErfaWarning)
+                instcat_handle = InstCatHandle(instcat)
+                visit = instcat_handle.commands['obshistid']
+                psf = make_psf(psf_name, instcat_handle, log_level=log_level)
+                visit_file_id = None if file_id is None \
+                    else '{}-{}'.format(file_id, visit)
+                image_simulator \
+                    = ImageSimulator(instcat_handle, psf, config=config,
+                                     seed=seed,
+                                     outdir=outdir, sensor_list=sensor_list,
+                                     apply_sensor_model=apply_sensor_model,
+                                     create_centroid_file=create_centroid_file,
+                                     file_id=visit_file_id,
+                                     log_level=log_level,
+                                     camera_wrapper=camera_wrapper)
+                results[instcat] = image_simulator.run(processes=processes)
+        except Exception as eobj:
+            if stop_on_error:
+                raise
+            logger.exception("simulation of %s failed", instcat)
+            results[instcat] = eobj
+        else:
+            logger.info("%s: visit %s done in %.1f s", instcat, visit,
+                        time.time() - t0)
+        # Release the visit's GalSimInterpreters and images before
+        # starting the next one.
+        image_simulator = None
+        psf = None
+        gc.collect()
+    return results
@@ -0,0 +1,79 @@
+"""
+Manifest of the sensors of a visit whose output files are complete.
+"""
+import os
+import json
+import time
+
+__all__ = ['VisitManifest']
+
+
+class VisitManifest:
+    """
+    Class to record the sensors of a visit that have been simulated,
+    so that a restarted job can drop them from its sensor list before
+    the instance catalog is parsed.
+
+    The manifest is a JSON lines file in the output directory with one
+    record per completed sensor, listing the output files written for
+    it.  A record is appended only after all of the sensor's files have
+    been written, and each record is appended with a single write, so
+    the workers of a job can share the file.
+    """
+    def __init__(self, outdir, visit, band):
+        """
+        Parameters
+        ----------
+        outdir: str
+            The output directory of the FITS files.
+        visit: int
+            The visit number, i.e., obshistid.
+        band: str
+            The band of the visit.
+        """
+        self.manifest_file = os.path.join(
+            outdir, 'manifest_{}-{}.jsonl'.format(visit, band))
+
+    def exists(self):
+        "Return True if the manifest file exists."
+        return os.path.isfile(self.manifest_file)
+
+    def completed_sensors(self):
+        """
+        Read the manifest.
+
+        Returns
+        -------
+        dict: The lists of output files keyed by sensor name.
+        """
+        completed = dict()
+        if not self.exists():
+            return completed
+        with open(self.manifest_file) as fd:
+            for line in fd:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Partially written record.
+                    continue
+                completed[record['sensor']] = record['files']
+        return completed
+
+    def record(self, det_name, files):
+        """
+        Add a completed sensor to the manifest.
+
+        Parameters
+        ----------
+        det_name: str
+            The sensor name, e.g., "R:2,2 S:1,1".
+        files: list
+            The output files written for the sensor.
+        """
+        line = json.dumps(dict(sensor=det_name, files=list(files),
+                               time=time.time())) + '\n'
+        outdir = os.path.dirname(self.manifest_file)
+        if outdir and not os.path.isdir(outdir):
+            os.makedirs(outdir, exist_ok=True)
+        with open(self.manifest_file, 'a') as output:
+            output.write(line)
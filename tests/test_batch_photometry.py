@@ -0,0 +1,87 @@
+"""
+Unit tests for the vectorized flux calculations.
+"""
+import os
+import unittest
+import numpy as np
+from lsst.sims.photUtils import BandpassDict
+import desc.imsim
+
+
+class BatchPhotometryTestCase(unittest.TestCase):
+    "TestCase class for BatchPhotometry."
+    def setUp(self):
+        self.instcat = os.path.join(os.environ['IMSIM_DIR'], 'tests',
+                                    'tiny_instcat.txt')
+
+    def tearDown(self):
+        pass
+
+    def test_adu(self):
+        "Compare the vectorized ADU values to those from SedWrapper."
+        commands = desc.imsim.metadata_from_file(self.instcat)
+        phot_params = desc.imsim.photometricParameters(commands)
+        with desc.imsim.fopen(self.instcat, mode='rt') as input_:
+            objects = desc.imsim.parse_object_lines(list(input_))
+        sed_dirs = desc.imsim.imSim.sed_dirs(self.instcat)
+        sed_files = [desc.imsim.imSim.find_file_path(sed_name, sed_dirs)
+                     for sed_name in objects['sed_name']]
+        bp_dict = BandpassDict.loadTotalBandpassesFromFiles()
+        for band in 'ri':
+            photometry = desc.imsim.BatchPhotometry(bp_dict[band], phot_params,
+                                                    chunk_size=7)
+            adu = photometry.adu(sed_files, objects['mag_norm'],
+                                 objects['redshift'], objects['internal_av'],
+                                 objects['internal_rv'],
+                                 objects['galactic_av'],
+                                 objects['galactic_rv'])
+            for i, obj in enumerate(objects):
+                sed_obj = desc.imsim.SedWrapper(
+                    sed_files[i], obj['mag_norm'], obj['redshift'],
+                    obj['internal_av'], obj['internal_rv'],
+                    obj['galactic_av'], obj['galactic_rv'], bp_dict)
+                expected = sed_obj.calcADU(bp_dict[band], phot_params)
+                if np.isnan(expected):
+                    self.assertTrue(np.isnan(adu[i]))
+                else:
+                    self.assertAlmostEqual(adu[i]/expected, 1, 8)
+
+    def test_flux_grid(self):
+        "Compare the interpolated ADU values to the exact values."
+        commands = desc.imsim.metadata_from_file(self.instcat)
+        phot_params = desc.imsim.photometricParameters(commands)
+        bp_dict = BandpassDict.loadTotalBandpassesFromFiles()
+        sed_file = desc.imsim.imSim.find_file_path(
+            'galaxySED/Exp.40E09.02Z.spec.gz',
+            desc.imsim.imSim.sed_dirs(self.instcat))
+        rng = np.random.RandomState(4321)
+        nobj = 50
+        sed_files = [sed_file]*nobj
+        mag_norm = rng.uniform(20, 25, nobj)
+        redshift = rng.uniform(0, 1.5, nobj)
+        iAv = rng.uniform(0, 1, nobj)
+        gAv = rng.uniform(0, 0.2, nobj)
+        Rv = np.full(nobj, 3.1)
+        tolerance = 0.01
+        flux_grid = desc.imsim.SedFluxGrid(bp_dict['r'], phot_params,
+                                           tolerance=tolerance,
+                                           z_grid=np.linspace(0, 1.5, 76),
+                                           gAv_grid=np.linspace(0, 0.2, 3))
+        adu = flux_grid.adu(sed_files, mag_norm, redshift, iAv, Rv, gAv, Rv)
+        expected = flux_grid.photometry.adu(sed_files, mag_norm, redshift,
+                                            iAv, Rv, gAv, Rv)
+        self.assertIsNotNone(flux_grid.table(sed_file))
+        np.testing.assert_allclose(adu, expected, rtol=tolerance)
+
+        # Objects outside of the grid are computed exactly.
+        redshift[0] = 2.
+        adu = flux_grid.adu(sed_files[:1], mag_norm[:1], redshift[:1],
+                            iAv[:1], Rv[:1], gAv[:1], Rv[:1])
+        expected = flux_grid.photometry.adu(sed_files[:1], mag_norm[:1],
+                                            redshift[:1], iAv[:1], Rv[:1],
+                                            gAv[:1], Rv[:1])
+        self.assertEqual(adu[0], expected[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+"""
+Unit tests for the CheckpointStore class.
+"""
+import os
+import glob
+import pickle
+import unittest
+import numpy as np
+import galsim
+from desc.imsim import CheckpointStore, read_drawn_objects
+
+
+class MockDetector:
+    "Minimal stand-in for a GalSimDetector."
+    def __init__(self, name):
+        self.name = name
+        self.wcs = galsim.PixelScale(0.2)
+
+
+class MockInterpreter:
+    "Minimal stand-in for a GalSimInterpreter."
+    def __init__(self):
+        self.detectors = [MockDetector('R22_S11')]
+        self.detectorImages = dict()
+        self.drawn_objects = set()
+
+    def _getFileName(self, detector, band):
+        return '_'.join((detector.name, band)) + '.fits'
+
+
+class CheckpointStoreTestCase(unittest.TestCase):
+    "TestCase class for the CheckpointStore."
+    def setUp(self):
+        self.checkpoint_file = 'checkpoint-test_store-R22_S11.ckpt'
+        self.name = 'R22_S11_r.fits'
+        image = galsim.ImageF(20, 30, xmin=0, ymin=0)
+        image.array[:] = 5.
+        self.images = {self.name: image}
+
+    def tearDown(self):
+        for item in glob.glob(self.checkpoint_file + '*'):
+            os.remove(item)
+
+    def draw(self, store, unique_id, row):
+        "Draw a stamp covering one row of the image."
+        image = self.images[self.name]
+        image[galsim.BoundsI(image.xmin, image.xmax, image.ymin + row,
+                             image.ymin + row)] += 1.
+        store.append(unique_id)
+
+    def test_commit_and_restore(self):
+        "Test that only committed objects and images are restored."
+        store = CheckpointStore(self.checkpoint_file)
+        for i in range(3):
+            self.draw(store, 'obj{}'.format(i), i)
+        store.commit(self.images)
+        for i in range(3, 5):
+            self.draw(store, 'obj{}'.format(i), i)
+        store.commit(self.images)
+        committed = self.images[self.name].array.copy()
+        # Objects logged after the last commit are dropped on restore.
+        self.draw(store, 'obj5', 5)
+        store.close()
+
+        self.assertEqual(read_drawn_objects(self.checkpoint_file),
+                         set('obj{}'.format(i) for i in range(5)))
+
+        gs_interpreter = MockInterpreter()
+        store = CheckpointStore(self.checkpoint_file)
+        self.assertEqual(store.restore(gs_interpreter, 'r'), 5)
+        restored = gs_interpreter.detectorImages[self.name]
+        np.testing.assert_array_equal(restored.array, committed)
+        self.assertEqual(restored.xmin, self.images[self.name].xmin)
+        self.assertEqual(restored.ymin, self.images[self.name].ymin)
+
+        # Continue drawing after the restore.
+        self.images = gs_interpreter.detectorImages
+        self.draw(store, 'obj6', 6)
+        store.commit(self.images)
+        store.close()
+        self.assertEqual(len(read_drawn_objects(self.checkpoint_file)), 6)
+        gs_interpreter = MockInterpreter()
+        CheckpointStore(self.checkpoint_file).restore(gs_interpreter, 'r')
+        np.testing.assert_array_equal(
+            gs_interpreter.detectorImages[self.name].array,
+            self.images[self.name].array)
+
+        store.remove()
+        self.assertEqual(glob.glob(self.checkpoint_file + '*'), [])
+
+    def test_dirty_rows(self):
+        "Test that only the rows of the drawn stamps are written."
+        store = CheckpointStore(self.checkpoint_file)
+        image = self.images[self.name]
+        store.commit(self.images)
+        # The image is replaced by a view of the same pixels.
+        self.assertIsNot(self.images[self.name], image)
+        self.assertTrue(np.shares_memory(self.images[self.name].array,
+                                         image.array))
+        store.commit(self.images)
+        # Draw stamps far apart on the image, and change a row between
+        # them without drawing a stamp on it.  Such changes are not
+        # tracked, so only the rows of the stamps are written to the
+        # image files.
+        image.array[10, :] = 0.
+        for row in (3, 25):
+            self.draw(store, 'obj{}'.format(row), row)
+            store.commit(self.images)
+        self.draw(store, 'obj4', 4)
+        store.commit(self.images)
+        store.close()
+
+        gs_interpreter = MockInterpreter()
+        CheckpointStore(self.checkpoint_file).restore(gs_interpreter, 'r')
+        restored = gs_interpreter.detectorImages[self.name].array
+        expected = np.full(image.array.shape, 5.)
+        expected[[3, 4, 25]] = 6.
+        np.testing.assert_array_equal(restored, expected)
+
+    def test_empty_checkpoint(self):
+        "Test that an empty checkpoint file is treated as no checkpoint."
+        open(self.checkpoint_file, 'w').close()
+        self.assertFalse(CheckpointStore.is_legacy(self.checkpoint_file))
+        self.assertEqual(read_drawn_objects(self.checkpoint_file), set())
+        store = CheckpointStore(self.checkpoint_file)
+        self.assertEqual(store.restore(MockInterpreter(), 'r'), 0)
+        self.draw(store, 'obj0', 0)
+        store.commit(self.images)
+        store.close()
+        self.assertEqual(read_drawn_objects(self.checkpoint_file), {'obj0'})
+
+    def test_legacy_checkpoint(self):
+        "Test reading the drawn objects from a pickled checkpoint."
+        with open(self.checkpoint_file, 'wb') as output:
+            pickle.dump(dict(drawn_objects={'obj0', 'obj1'}), output)
+        self.assertTrue(CheckpointStore.is_legacy(self.checkpoint_file))
+        self.assertEqual(read_drawn_objects(self.checkpoint_file),
+                         {'obj0', 'obj1'})
+
+        # Convert the legacy checkpoint to a store.
+        gs_interpreter = MockInterpreter()
+        gs_interpreter.drawn_objects = {'obj0', 'obj1'}
+        gs_interpreter.detectorImages = self.images
+        CheckpointStore(self.checkpoint_file).write(gs_interpreter)
+        self.assertFalse(CheckpointStore.is_legacy(self.checkpoint_file))
+        self.assertFalse(os.path.exists(self.checkpoint_file + '.tmp'))
+        self.assertEqual(read_drawn_objects(self.checkpoint_file),
+                         {'obj0', 'obj1'})
+
+
+if __name__ == '__main__':
+    unittest.main()
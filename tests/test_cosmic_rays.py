@@ -5,7 +5,8 @@ import os
 import unittest
 import numpy as np
 import astropy.io.fits as fits
-from desc.imsim import CosmicRays, write_cosmic_ray_catalog
+from desc.imsim import CosmicRays, write_cosmic_ray_catalog,\
+    get_cosmic_ray_catalog
 
 
 class CosmicRaysTestCase(unittest.TestCase):
@@ -36,6 +37,20 @@ class CosmicRaysTestCase(unittest.TestCase):
         self.assertEqual(crs[0][0].y0, 20)
         self.assertEqual(tuple(crs[0][0].pixel_values), (0, 10, 0))
 
+    def test_get_cosmic_ray_catalog(self):
+        "Test that the catalog is read once and reused."
+        crs = get_cosmic_ray_catalog(self.test_catalog, 0.2)
+        self.assertEqual(len(crs), 3)
+        self.assertEqual(crs.ccd_rate, 0.2)
+        # The cosmic rays are reused, but each call has its own RNG.
+        new_crs = get_cosmic_ray_catalog(self.test_catalog, 0.2)
+        self.assertIsNot(new_crs, crs)
+        self.assertIs(new_crs[0], crs[0])
+        crs.set_seed(1000)
+        self.assertIsNot(new_crs.rng, crs.rng)
+        self.assertIsNot(get_cosmic_ray_catalog(self.test_catalog, None)[0],
+                         crs[0])
+
     def test_paint_cr(self):
         "Test the painting of a CR into an input image array."
         imarr = np.zeros((3, 3))
@@ -0,0 +1,119 @@
+"""
+Unit tests for the executor backends.
+"""
+import time
+import unittest
+import desc.imsim
+
+
+def square(x):
+    "Function to be run by the executors."
+    return x*x
+
+
+def fail(x):
+    "Function that raises an exception."
+    raise ValueError(x)
+
+
+def append_later(items, item):
+    "Function to be run by the PipelineStage."
+    time.sleep(0.1)
+    items.append(item)
+
+
+class ExecutorsTestCase(unittest.TestCase):
+    "TestCase class for the executor backends."
+    def setUp(self):
+        self.executors = [desc.imsim.SerialExecutor(),
+                          desc.imsim.ThreadExecutor(max_workers=2),
+                          desc.imsim.ProcessExecutor(processes=2)]
+
+    def tearDown(self):
+        for executor in self.executors:
+            executor.shutdown()
+
+    def test_submit(self):
+        "Test the submission and gathering of tasks."
+        for executor in self.executors:
+            futures = [executor.submit(square, x) for x in range(5)]
+            executor.shutdown()
+            self.assertEqual(executor.gather(futures), [0, 1, 4, 9, 16])
+            # The executors can be reused after shutdown.
+            futures = [executor.submit(square, 3)]
+            executor.shutdown()
+            self.assertEqual(executor.gather(futures), [9])
+            self.assertEqual(executor.partition(['b', 'a']), ['b', 'a'])
+
+    def test_failure(self):
+        "Test that task exceptions are raised by gather."
+        for executor in self.executors:
+            futures = [executor.submit(fail, 'oops')]
+            executor.shutdown()
+            self.assertRaises(ValueError, executor.gather, futures)
+
+    def test_attributes(self):
+        "Test the flags that control the creation of GalSimInterpreters."
+        serial, threads, processes = self.executors
+        self.assertTrue(serial.in_process and not serial.parallel)
+        self.assertTrue(threads.in_process and threads.parallel)
+        self.assertFalse(processes.in_process)
+        self.assertTrue(processes.parallel)
+        self.assertTrue(desc.imsim.ProcessExecutor(start_method='fork').forked)
+        self.assertFalse(
+            desc.imsim.ProcessExecutor(start_method='spawn').forked)
+
+    def test_mpi_executor(self):
+        "Test the MpiExecutor with a single rank."
+        try:
+            from mpi4py import MPI
+        except ImportError:
+            # mpi4py is an optional dependency.
+            return
+        executor = desc.imsim.MpiExecutor(comm=MPI.COMM_SELF)
+        self.assertEqual(executor.partition(['b', 'a']), ['a', 'b'])
+        futures = [executor.submit(square, 2), executor.submit(fail, 1)]
+        executor.shutdown()
+        results = executor.gather(futures)
+        self.assertEqual(results[0], 4)
+        self.assertIsInstance(results[1], ValueError)
+
+    def test_completed_futures(self):
+        "Test that futures are returned in the order they finish."
+        for executor in self.executors[1:]:
+            futures = [executor.submit(time.sleep, dt) for dt in (0.5, 0.01)]
+            completed = list(desc.imsim.completed_futures(futures,
+                                                          poll_interval=0.01))
+            self.assertEqual(completed, futures[::-1])
+            executor.shutdown()
+
+    def test_pipeline_stage(self):
+        "Test that the PipelineStage runs one task at a time."
+        stage = desc.imsim.pipeline_stage()
+        self.assertIs(stage, desc.imsim.pipeline_stage())
+        items = []
+        stage.submit(append_later, items, 0)
+        self.assertEqual(items, [])
+        # Submitting the next task waits for the previous one.
+        stage.submit(append_later, items, 1)
+        self.assertEqual(items, [0])
+        stage.drain()
+        self.assertEqual(items, [0, 1])
+        stage.submit(fail, 2)
+        self.assertRaises(ValueError, stage.drain)
+
+    def test_pipeline_stage_threads(self):
+        "Test submitting to the PipelineStage from several threads."
+        stage = desc.imsim.pipeline_stage()
+        executor = desc.imsim.ThreadExecutor(max_workers=4)
+        items = []
+        futures = [executor.submit(stage.submit, append_later, items, i)
+                   for i in range(8)]
+        executor.gather(futures)
+        executor.shutdown()
+        stage.drain()
+        self.assertEqual(sorted(items), list(range(8)))
+
+
+if __name__ == '__main__':
+    unittest.main()
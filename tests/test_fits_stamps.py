@@ -0,0 +1,96 @@
+"""
+Unit tests for the FITS postage stamp cache.
+"""
+import os
+import gzip
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import galsim
+import desc.imsim
+
+
+class FitsStampCacheTestCase(unittest.TestCase):
+    "TestCase class for FitsStampCache."
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.test_dir, 'stamp_cache')
+        self.data = b'SIMPLE  =                    T' + bytes(2849)
+        self.fits_file = os.path.join(self.test_dir, 'stamp.fits')
+        with open(self.fits_file, 'wb') as output:
+            output.write(self.data)
+        self.fits_gz_file = os.path.join(self.test_dir, 'stamp_gz.fits.gz')
+        with gzip.open(self.fits_gz_file, 'wb') as output:
+            output.write(self.data)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_stamp_cache(self):
+        "Test the decompression and memoization of stamp paths."
+        stamp_cache = desc.imsim.FitsStampCache(self.cache_dir)
+        self.assertEqual(stamp_cache(self.fits_file), self.fits_file)
+
+        local_path = stamp_cache(self.fits_gz_file)
+        self.assertEqual(os.path.dirname(local_path), self.cache_dir)
+        self.assertTrue(local_path.endswith('stamp_gz.fits'))
+        with open(local_path, 'rb') as input_:
+            self.assertEqual(input_.read(), self.data)
+        self.assertEqual(os.listdir(self.cache_dir),
+                         [os.path.basename(local_path)])
+
+        # A new cache instance reuses the decompressed file.
+        mtime = os.stat(local_path).st_mtime_ns
+        new_cache = desc.imsim.FitsStampCache(self.cache_dir)
+        self.assertEqual(new_cache(self.fits_gz_file), local_path)
+        self.assertEqual(os.stat(local_path).st_mtime_ns, mtime)
+
+        # Missing files are returned as is.
+        missing = os.path.join(self.test_dir, 'missing.fits.gz')
+        self.assertEqual(stamp_cache(missing), missing)
+
+
+class StampImageCacheTestCase(unittest.TestCase):
+    "TestCase class for StampImageCache."
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.fits_files = []
+        for i in range(3):
+            image = galsim.ImageF(np.full((10, 10), i, dtype=np.float32))
+            fits_file = os.path.join(self.test_dir, 'stamp{}.fits'.format(i))
+            if i == 2:
+                fits_file += '.gz'
+            image.write(fits_file)
+            self.fits_files.append(fits_file)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_get(self):
+        "Test the reading and reuse of stamp images."
+        cache = desc.imsim.StampImageCache(max_bytes=800)
+        image = cache.get(self.fits_files[0])
+        self.assertTrue(image.isconst)
+        self.assertIs(cache.get(self.fits_files[0]), image)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        np.testing.assert_array_equal(cache.get(self.fits_files[2]).array, 2)
+
+        # Adding a third image evicts the least recently used one.
+        cache.get(self.fits_files[0])
+        cache.get(self.fits_files[1])
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.nbytes, 800)
+        self.assertIs(cache.get(self.fits_files[0]), image)
+        self.assertEqual(cache.misses, 3)
+        cache.get(self.fits_files[2])
+        self.assertEqual(cache.misses, 4)
+
+        self.assertRaises(OSError, cache.get,
+                          os.path.join(self.test_dir, 'missing.fits'))
+        cache.clear()
+        self.assertEqual((len(cache), cache.nbytes, cache.hits), (0, 0, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -50,5 +50,33 @@ class FopenTestCase(unittest.TestCase):
             # Make sure all of the expected lines have been processed.
             self.assertEqual(self.lines[-1], expected)
 
+    def test_fopen_opened_files(self):
+        "Test the recording of the files read by fopen."
+        opened_files = []
+        with desc.imsim.fopen(self.fopen_test_file, mode='rt',
+                              opened_files=opened_files) as input_:
+            lines = [line for line in input_]
+        self.assertEqual(len(lines), len(self.lines))
+        self.assertEqual(opened_files,
+                         [os.path.abspath(_) for _ in
+                          (self.fopen_test_file, self.fopen_include_file1,
+                           self.fopen_include_file2)])
+    def test_fopen_blocks(self):
+        "Test the threaded block reader."
+        for block_size in (1, 2, 100):
+            opened_files = []
+            with desc.imsim.fopen_blocks(self.fopen_test_file,
+                                         block_size=block_size,
+                                         opened_files=opened_files) as blocks:
+                blocks = list(blocks)
+            for block in blocks:
+                self.assertLessEqual(len(block), block_size)
+            self.assertEqual([line.strip() for block in blocks
+                              for line in block], self.lines)
+            self.assertEqual(opened_files,
+                             [os.path.abspath(_) for _ in
+                              (self.fopen_test_file, self.fopen_include_file1,
+                               self.fopen_include_file2)])
+
 if __name__ == '__main__':
     unittest.main()
@@ -2,11 +2,64 @@
 Unit tests for the ImageSimulator module.
 """
 import os
+import pickle
 import random
 import string
 import unittest
 import gzip
+import sqlite3
+import types
+import numpy as np
+import galsim
 import desc.imsim
+from desc.imsim.ImageSimulator import CheckpointSummary, ProgressAggregator,\
+    SimulateSensor
+
+
+class MockObject:
+    "Minimal stand-in for a GalSimCelestialObject."
+    def __init__(self, unique_id, flux):
+        self.uniqueId = unique_id
+        self.galSimType = 'pointSource'
+        self._flux = flux
+        self.sed = types.SimpleNamespace(delete_sed_obj=lambda: None)
+
+    def flux(self, band):
+        return self._flux
+
+
+class MockObjectList(list):
+    "Minimal stand-in for a GsObjectList."
+    def compute_fluxes(self, band):
+        return 0
+
+    def reset(self):
+        pass
+
+
+class MockInterpreter:
+    """
+    Minimal stand-in for a GalSimInterpreter that draws each object
+    into its own stamp through a SiliconSensor that shares the
+    interpreter's random number generator.
+    """
+    def __init__(self, seed):
+        self._rng = galsim.UniformDeviate(seed)
+        self.sensor = galsim.SiliconSensor(rng=self._rng)
+        self.noiseWrapper = None
+        self.detectorImages = dict()
+        self.drawn_objects = set()
+        self.checkpoint_store = None
+        self.nobj_checkpoint = 1000
+        self.stamps = dict()
+
+    def drawObject(self, gs_obj, **kwds):
+        stamp = galsim.ImageF(32, 32, scale=0.2)
+        galsim.Gaussian(sigma=0.3, flux=gs_obj.flux('r'))\
+            .drawImage(stamp, method='phot', rng=self._rng,
+                       sensor=self.sensor)
+        self.stamps[gs_obj.uniqueId] = stamp.array
+
 
 class ImageSimulatorTestCase(unittest.TestCase):
     """TestCase class for the ImageSimulator code."""
@@ -51,6 +104,103 @@ class ImageSimulatorTestCase(unittest.TestCase):
         fn = desc.imsim.ImageSimulator.checkpoint_file(file_id, det_name)
         self.assertEqual(fn, fn_expected)
 
+    def test_generate_object_seed(self):
+        """Unit test for the per-object random number seeds."""
+        seed = desc.imsim.generate_object_seed(267, 1, 'R:2,2 S:1,1', 1234)
+        self.assertEqual(seed, desc.imsim.generate_object_seed(
+            267, 1, 'R:2,2 S:1,1', 1234))
+        self.assertTrue(0 < seed < 2**32)
+        self.assertNotEqual(seed, desc.imsim.generate_object_seed(
+            267, 1, 'R:2,2 S:1,1', 1235))
+        self.assertNotEqual(seed, desc.imsim.generate_object_seed(
+            267, 1, 'R:2,2 S:1,2', 1234))
+        self.assertNotEqual(seed, desc.imsim.generate_object_seed(
+            268, 1, 'R:2,2 S:1,1', 1234))
+
+    def test_sensor_spec(self):
+        """Unit test for pickling SensorSpecs."""
+        instcat = os.path.join(os.environ['IMSIM_DIR'], 'tests',
+                               'tiny_instcat.txt')
+        commands = desc.imsim.metadata_from_file(instcat)
+        obs_md = desc.imsim.phosim_obs_metadata(commands)
+        phot_params = desc.imsim.photometricParameters(commands)
+        psf = desc.imsim.make_psf('DoubleGaussian', obs_md)
+        config = desc.imsim.read_config()
+        config_snapshot = {section: dict(config[section])
+                           for section in config.imsim_sections}
+        spec = desc.imsim.SensorSpec('R:2,2 S:1,1', obs_md, phot_params, psf,
+                                     config_snapshot, outdir=self.outdir)
+        self.assertEqual(spec.visit, obs_md.OpsimMetaData['obshistID'])
+        prefix = config['persistence']['raw_file_prefix']
+        self.assertEqual(spec.output_file(),
+                         os.path.join(self.outdir, '{}{}_R22_S11_{}.fits'
+                                      .format(prefix, spec.visit,
+                                              obs_md.bandpass)))
+
+        # The PSF is only pickled if requested.
+        self.assertIsNone(pickle.loads(pickle.dumps(spec)).psf)
+        spec.ship_psf = True
+        new_spec = pickle.loads(pickle.dumps(spec))
+        self.assertIsNotNone(new_spec.psf)
+        self.assertEqual(new_spec.output_file(raw=False),
+                         spec.output_file(raw=False))
+
+        # Per-object seeds are used unless disabled in the config or
+        # by the caller.
+        self.assertTrue(SimulateSensor(spec).per_object_seeds)
+        self.assertFalse(SimulateSensor(spec, per_object_seeds=False)
+                         .per_object_seeds)
+        spec.config['objects']['per_object_seeds'] = False
+        self.assertFalse(SimulateSensor(spec).per_object_seeds)
+
+    def test_per_object_seeds(self):
+        """
+        Test that the objects are drawn the same way in any order with
+        per-object seeds, including the sensor model.
+        """
+        config = desc.imsim.read_config()
+        spec = types.SimpleNamespace(
+            det_name='R:2,2 S:1,1', log_level='WARN', seed=267, visit=230,
+            config={section: dict(config[section])
+                    for section in config.imsim_sections},
+            obs_md=types.SimpleNamespace(bandpass='r'))
+        simulate_sensor = SimulateSensor(spec, per_object_seeds=True)
+        logger = desc.imsim.get_logger('WARN')
+        objects = [MockObject('1234', 2e4), MockObject('5678', 3e4)]
+        stamps = []
+        for gs_objects in (objects, objects[::-1]):
+            gs_interpreter = MockInterpreter(spec.seed)
+            simulate_sensor.draw_objects(gs_interpreter,
+                                         MockObjectList(gs_objects), logger)
+            stamps.append(gs_interpreter.stamps)
+        for unique_id in stamps[0]:
+            np.testing.assert_array_equal(stamps[0][unique_id],
+                                          stamps[1][unique_id])
+
+    def test_progress_aggregator(self):
+        """Unit test for writing progress info with the ProgressAggregator."""
+        db_file = os.path.join(self.outdir, 'progress.sqlite3')
+        checkpoint_summary = CheckpointSummary(db_file=db_file)
+        for det_name in ('R22_S11', 'R22_S12'):
+            checkpoint_summary.insert_record(det_name, 1000)
+        progress = ProgressAggregator(db_file, interval=0.1)
+        progress.start()
+        for nobj in (500, 1000):
+            progress.queue.put(('R22_S11', dict(objects_drawn=nobj,
+                                                rss_mb=100.)))
+        progress.queue.put(('R22_S11', dict(status='done')))
+        progress.queue.put(('R22_S12', dict(status='failed')))
+        progress.stop()
+        checkpoint_summary.close()
+
+        conn = sqlite3.connect(db_file)
+        rows = conn.execute("""select detector, objects_drawn, total_objects,
+                            status, rss_mb from summary
+                            order by detector""").fetchall()
+        conn.close()
+        os.remove(db_file)
+        self.assertEqual(rows, [('R22_S11', 1000, 1000, 'done', 100.),
+                                ('R22_S12', 0, 1000, 'failed', None)])
 
 if __name__ == '__main__':
     unittest.main()
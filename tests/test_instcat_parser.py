@@ -112,6 +112,25 @@ class InstanceCatalogParserTestCase(unittest.TestCase):
         self.assertAlmostEqual(obs.mjd.TAI, metadata['mjd'], 7)
         self.assertEqual(obs.bandpass, 'r')
 
+    def test_instcat_handle(self):
+        """
+        Test that the InstCatHandle caches the commands and metadata.
+        """
+        instcat = desc.imsim.InstCatHandle(self.phosim_file)
+        self.assertIs(desc.imsim.InstCatHandle.get(instcat), instcat)
+        self.assertEqual(instcat.commands,
+                         desc.imsim.metadata_from_file(self.phosim_file))
+        self.assertIs(instcat.commands, instcat.commands)
+        self.assertIs(instcat.obs_md, instcat.obs_md)
+        self.assertIs(instcat.phot_params, instcat.phot_params)
+        self.assertEqual(instcat.obs_md.OpsimMetaData['obshistID'], 230)
+        self.assertEqual(instcat.phot_params.bandpass, 'r')
+
+        # make_psf accepts a handle in place of the ObservationMetaData.
+        psf = desc.imsim.make_psf('DoubleGaussian', instcat)
+        self.assertEqual(type(psf), type(desc.imsim.make_psf(
+            'DoubleGaussian', instcat.obs_md)))
+
     def test_object_extraction_stars(self):
         """
         Test that method to get GalSimCelestialObjects from
@@ -363,6 +382,132 @@ class InstanceCatalogParserTestCase(unittest.TestCase):
                               lines, obs_md, phot_params,
                               self.extra_commands)
 
+    def test_parse_object_lines(self):
+        "Test the columnar parsing of instance catalog object lines."
+        cat_file = os.path.join(os.environ['IMSIM_DIR'], 'tests',
+                                'tiny_instcat.txt')
+        with desc.imsim.fopen(cat_file, mode='rt') as input_:
+            lines = [x for x in input_]
+        objects = desc.imsim.parse_object_lines(lines)
+        object_lines = [x for x in lines if x.startswith('object')]
+        self.assertEqual(len(objects), len(object_lines))
+        for obj, line in zip(objects, object_lines):
+            tokens = line.split()
+            self.assertEqual(obj['unique_id'], tokens[1])
+            self.assertEqual(obj['ra_phosim'], float(tokens[2]))
+            self.assertEqual(obj['dec_phosim'], float(tokens[3]))
+            self.assertEqual(obj['mag_norm'], float(tokens[4]))
+            self.assertEqual(obj['sed_name'], tokens[5])
+            self.assertEqual(obj['redshift'], float(tokens[6]))
+            if tokens[12] == 'sersic2d':
+                self.assertEqual(obj['object_type'], desc.imsim._SERSIC_2D)
+                self.assertEqual(obj['semi_major_arcsec'], float(tokens[13]))
+                self.assertEqual(obj['sersic_index'], float(tokens[16]))
+            if tokens[-3] == 'CCM':
+                self.assertEqual(obj['galactic_av'], float(tokens[-2]))
+                self.assertEqual(obj['galactic_rv'], float(tokens[-1]))
+            else:
+                self.assertEqual(obj['galactic_av'], 0)
+                self.assertEqual(obj['galactic_rv'], 0)
+
+        # Check that string columns are promoted on concatenation.
+        combined = desc.imsim.concatenate_objects([objects[:1], objects[1:]])
+        np.testing.assert_array_equal(combined['unique_id'],
+                                      objects['unique_id'])
+        np.testing.assert_array_equal(combined['sed_name'],
+                                      objects['sed_name'])
+
+        with self.assertRaises(RuntimeError):
+            desc.imsim.parse_object_lines([object_lines[0]
+                                           .replace(' point ', ' blob ')])
+
+    def test_chip_downselect(self):
+        "Test the single-pass partitioning of objects among chips."
+        rng = np.random.RandomState(8675309)
+        nobj = 2000
+        x_pupil = rng.uniform(-0.03, 0.03, size=nobj)
+        y_pupil = rng.uniform(-0.03, 0.03, size=nobj)
+        mag_norm = rng.uniform(14, 30, size=nobj)
+        logger = desc.imsim.get_logger('WARN', 'test_chip_downselect')
+        chip_names = ['R:2,2 S:1,1', 'R:2,2 S:1,2', 'R:0,1 S:0,0',
+                      'R:4,3 S:2,2']
+        on_chip_dict = desc.imsim.imSim._chip_downselect(
+            mag_norm, x_pupil, y_pupil, logger, target_chips=chip_names)
+        for chip_name in chip_names:
+            expected = desc.imsim.imSim._chip_downselect(
+                mag_norm, x_pupil, y_pupil, logger,
+                target_chips=[chip_name])[chip_name]
+            np.testing.assert_array_equal(on_chip_dict[chip_name][0],
+                                          expected[0])
+
+    def test_gs_object_list_streaming(self):
+        "Test the batched construction of objects in GsObjectList."
+        commands = desc.imsim.metadata_from_file(self.phosim_file)
+        obs_md = desc.imsim.phosim_obs_metadata(commands)
+        phot_params = desc.imsim.photometricParameters(commands)
+        with desc.imsim.fopen(self.phosim_file, mode='rt') as input_:
+            lines = [x for x in input_]
+        chip_name = 'R:2,2 S:1,1'
+        expected = desc.imsim.imSim.GsObjectList(lines, obs_md, phot_params,
+                                                 self.phosim_file,
+                                                 chip_name=chip_name)
+        expected_ids = [gs_obj.uniqueId for gs_obj in expected]
+        self.assertGreater(len(expected_ids), 0)
+        # The objects are constructed lazily from the selection arrays.
+        self.assertIsInstance(expected.gs_objects,
+                              desc.imsim.imSim.LazyGsObjects)
+        self.assertFalse(hasattr(expected[0].sed, '__dict__'))
+        for batch_size in (1, 3, 1000):
+            gs_objects = desc.imsim.imSim.GsObjectList(
+                lines, obs_md, phot_params, self.phosim_file,
+                chip_name=chip_name, batch_size=batch_size)
+            self.assertEqual(len(gs_objects), len(expected_ids))
+            self.assertEqual([gs_obj.uniqueId for gs_obj in gs_objects],
+                             expected_ids)
+            self.assertIsNone(gs_objects._gs_objects)
+            self.assertEqual(gs_objects[1].uniqueId, expected_ids[1])
+
+    def test_gs_object_list_shards(self):
+        "Test the splitting of a GsObjectList into shards."
+        commands = desc.imsim.metadata_from_file(self.phosim_file)
+        obs_md = desc.imsim.phosim_obs_metadata(commands)
+        phot_params = desc.imsim.photometricParameters(commands)
+        with desc.imsim.fopen(self.phosim_file, mode='rt') as input_:
+            lines = [x for x in input_]
+        gs_objects = desc.imsim.imSim.GsObjectList(lines, obs_md, phot_params,
+                                                   self.phosim_file,
+                                                   chip_name='R:2,2 S:1,1')
+        expected_ids = [gs_obj.uniqueId for gs_obj in gs_objects]
+        for num_shards in (1, 2, 3):
+            shards = gs_objects.shards(num_shards)
+            self.assertEqual(len(shards), num_shards)
+            self.assertEqual(sum(len(shard) for shard in shards),
+                             len(expected_ids))
+            for ishard, shard in enumerate(shards):
+                self.assertEqual([gs_obj.uniqueId for gs_obj in shard],
+                                 expected_ids[ishard::num_shards])
+        self.assertRaises(RuntimeError, shards[0].shards, 2)
+
+    def test_path_resolver(self):
+        "Test the resolution of file paths using directory listings."
+        tmp_dirs = [tempfile.mkdtemp() for _ in range(2)]
+        try:
+            os.makedirs(os.path.join(tmp_dirs[1], 'subdir'))
+            for path in (os.path.join(tmp_dirs[0], 'a.txt'),
+                         os.path.join(tmp_dirs[1], 'a.txt'),
+                         os.path.join(tmp_dirs[1], 'subdir', 'b.txt')):
+                with open(path, 'w') as output:
+                    output.write('\n')
+            resolver = desc.imsim.imSim.PathResolver(tmp_dirs)
+            for file_name in ('a.txt', 'subdir/b.txt', 'c.txt', 'subdir',
+                              os.path.join(tmp_dirs[1], 'a.txt')):
+                self.assertEqual(resolver(file_name),
+                                 desc.imsim.imSim.find_file_path(file_name,
+                                                                 tmp_dirs))
+        finally:
+            for tmp_dir in tmp_dirs:
+                shutil.rmtree(tmp_dir)
+
     def test_photometricParameters(self):
         "Test the photometricParameters function."
         commands = desc.imsim.metadata_from_file(self.phosim_file)
@@ -0,0 +1,86 @@
+"""
+Unit tests for the SED wrapper code.
+"""
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import lsst.sims.photUtils as sims_photUtils
+from desc.imsim import SedTemplateCache
+from desc.imsim.sed_wrapper import CCMmodel
+
+
+class SedTemplateCacheTestCase(unittest.TestCase):
+    "TestCase class for the SedTemplateCache."
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.wavelen = np.linspace(300., 1200., 901)
+        self.sed_files = []
+        for i in range(3):
+            sed_file = os.path.join(self.test_dir, 'sed_%d.txt' % i)
+            np.savetxt(sed_file, np.array([self.wavelen,
+                                           (i + 1.)*np.ones(901)]).T)
+            self.sed_files.append(sed_file)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_cache(self):
+        "Test the hit and miss counting and the LRU eviction."
+        # Allow room for the arrays from two of the SED files.
+        cache = SedTemplateCache(max_bytes=2*2*8*len(self.wavelen))
+        wavelen, flambda = cache.get(self.sed_files[0])
+        np.testing.assert_array_equal(wavelen, self.wavelen)
+        np.testing.assert_array_equal(flambda, np.ones(len(self.wavelen)))
+        self.assertFalse(flambda.flags.writeable)
+        self.assertEqual((cache.hits, cache.misses), (0, 1))
+
+        self.assertIs(cache.get(self.sed_files[0])[1], flambda)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+        cache.get(self.sed_files[1])
+        cache.get(self.sed_files[0])
+        # Reading a third file evicts the least recently used one.
+        cache.get(self.sed_files[2])
+        self.assertEqual(len(cache), 2)
+        self.assertEqual((cache.hits, cache.misses), (2, 3))
+        cache.get(self.sed_files[0])
+        self.assertEqual((cache.hits, cache.misses), (3, 3))
+        cache.get(self.sed_files[1])
+        self.assertEqual((cache.hits, cache.misses), (3, 4))
+        self.assertLessEqual(cache.nbytes, cache.max_bytes)
+
+        cache.clear()
+        self.assertEqual((len(cache), cache.nbytes, cache.hits, cache.misses),
+                         (0, 0, 0, 0))
+
+
+class CCMmodelTestCase(unittest.TestCase):
+    "TestCase class for the CCMmodel cache."
+    def test_ab_cache(self):
+        "Test the caching of the a(x), b(x) arrays for multiple grids."
+        ccm_model = CCMmodel(max_grids=2)
+        grids = [np.linspace(300., 1200., 901), np.linspace(250., 1100., 851),
+                 np.linspace(300., 1200., 9001)]
+        a0, b0 = ccm_model.ab(grids[0])
+        sed_obj = sims_photUtils.Sed(wavelen=grids[0],
+                                     flambda=np.ones(len(grids[0])))
+        a_x, b_x = sed_obj.setupCCM_ab()
+        np.testing.assert_array_equal(a0, a_x)
+        np.testing.assert_array_equal(b0, b_x)
+        self.assertFalse(a0.flags.writeable)
+
+        # Alternating between grids does not recompute the arrays.
+        ccm_model.ab(grids[1])
+        self.assertIs(ccm_model.ab(grids[0].copy())[0], a0)
+        self.assertEqual(len(ccm_model), 2)
+
+        # The least recently used grid is dropped.
+        ccm_model.precompute(grids[2])
+        self.assertEqual(len(ccm_model), 2)
+        self.assertIs(ccm_model.ab(grids[0])[0], a0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,44 @@
+"""
+Unit tests for the sensor cost model.
+"""
+import os
+import unittest
+import numpy as np
+import desc.imsim
+
+
+class SensorCostModelTestCase(unittest.TestCase):
+    "TestCase class for SensorCostModel."
+    def setUp(self):
+        instcat = os.path.join(os.environ['IMSIM_DIR'], 'tests',
+                               'tiny_instcat.txt')
+        with desc.imsim.fopen(instcat, mode='rt') as input_:
+            self.objects = desc.imsim.parse_object_lines(list(input_))
+
+    def tearDown(self):
+        pass
+
+    def test_features(self):
+        "Test the computation of the model features."
+        cost_model = desc.imsim.SensorCostModel(bright_mag=20.)
+        features = cost_model.features(self.objects)
+        mag_norm = self.objects['mag_norm']
+        self.assertEqual(features['num_objects'], len(self.objects))
+        self.assertEqual(features['num_sersic'],
+                         sum(self.objects['object_type']
+                             == desc.imsim.instcat_parser._SERSIC_2D))
+        self.assertEqual(features['num_bright'], sum(mag_norm < 20.))
+        self.assertAlmostEqual(features['flux_sum'],
+                               sum(10.**(-0.4*(mag_norm - 20.))))
+
+    def test_estimate(self):
+        "Test that the cost estimate increases with the objects included."
+        cost_model = desc.imsim.SensorCostModel()
+        order = np.argsort(self.objects['mag_norm'])
+        self.assertEqual(cost_model.estimate(self.objects[:0]), 0)
+        self.assertLess(cost_model.estimate(self.objects[order[1:]]),
+                        cost_model.estimate(self.objects))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+"""
+Unit tests for the SharedObjectTable class.
+"""
+import os
+import pickle
+import unittest
+import numpy as np
+import desc.imsim
+
+
+class SharedObjectTableTestCase(unittest.TestCase):
+    """
+    TestCase class for SharedObjectTable.
+    """
+    def setUp(self):
+        instcat = os.path.join(os.environ['IMSIM_DIR'], 'tests',
+                               'tiny_instcat.txt')
+        self.sensor = 'R:2,2 S:1,1'
+        self.trimmer = desc.imsim.InstCatTrimmer(instcat, [self.sensor],
+                                                 minsource=None)
+
+    def tearDown(self):
+        pass
+
+    def test_trimmer_indices(self):
+        "Test the per-sensor indices into the combined object table."
+        objects = self.trimmer.objects[self.trimmer.indices[self.sensor]]
+        np.testing.assert_array_equal(objects, self.trimmer[self.sensor])
+
+    def test_pickling(self):
+        "Test that unpickled tables attach to the same shared memory."
+        table = desc.imsim.SharedObjectTable(self.trimmer.objects)
+        state = pickle.dumps(table)
+        self.assertLess(len(state), 1000)
+        new_table = pickle.loads(state)
+        self.assertEqual(new_table.name, table.name)
+        np.testing.assert_array_equal(new_table.array, self.trimmer.objects)
+        new_table.close()
+        table.close()
+
+    def test_memmap(self):
+        "Test the memory-mapped file used without shared_memory."
+        table = desc.imsim.SharedObjectTable(self.trimmer.objects,
+                                             use_memmap=True)
+        self.assertTrue(os.path.isfile(table.name))
+        new_table = pickle.loads(pickle.dumps(table))
+        self.assertEqual(new_table.name, table.name)
+        np.testing.assert_array_equal(new_table.array, self.trimmer.objects)
+        new_table.close()
+        table.close()
+        self.assertFalse(os.path.isfile(table.name))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,7 +2,10 @@
 Unit tests for InstCatTrimmer class.
 """
 import os
+import shutil
+import tempfile
 import unittest
+import numpy as np
 import desc.imsim
 
 
@@ -35,6 +38,48 @@ class InstCatTrimmerTestCase(unittest.TestCase):
                                              chunk_size=chunk_size)
             self.assertEqual(len(objs[sensor]), 24)
 
+    def test_instcat_cache(self):
+        """Test the binary cache of parsed instance catalog objects."""
+        instcat = os.path.join(os.environ['IMSIM_DIR'], 'tests',
+                               'tiny_instcat.txt')
+        sensor = 'R:2,2 S:1,1'
+        cache_dir = tempfile.mkdtemp()
+        try:
+            cache = desc.imsim.InstCatCache(instcat, cache_dir)
+            self.assertFalse(cache.is_valid())
+            objs0 = desc.imsim.InstCatTrimmer(instcat, [sensor], minsource=10,
+                                              chunk_size=10,
+                                              cache_dir=cache_dir)
+            self.assertTrue(cache.is_valid())
+            self.assertEqual(len(list(cache.chunks())), 5)
+            objs1 = desc.imsim.InstCatTrimmer(instcat, [sensor], minsource=10,
+                                              chunk_size=10,
+                                              cache_dir=cache_dir)
+            self.assertEqual(len(objs1[sensor]), 24)
+            np.testing.assert_array_equal(objs0[sensor], objs1[sensor])
+
+            # A writer does not replace a valid cache.
+            writer = cache.writer()
+            writer.append(objs0.objects[:1])
+            writer.commit([instcat])
+            self.assertFalse(os.path.exists(writer.tmp_path))
+            self.assertEqual(len(list(cache.chunks())), 5)
+
+            # An invalid cache is replaced.
+            with open(os.path.join(cache.path, cache.manifest_name),
+                      'w') as output:
+                output.write('{}')
+            self.assertFalse(cache.is_valid())
+            writer = cache.writer()
+            writer.append(objs0.objects[:1])
+            writer.commit([instcat])
+            self.assertTrue(cache.is_valid())
+            self.assertEqual(len(list(cache.chunks())), 1)
+            self.assertEqual(sorted(os.listdir(cache_dir)),
+                             [os.path.basename(cache.path)])
+        finally:
+            shutil.rmtree(cache_dir)
+
     def test_inf_filter(self):
         """
         Test filtering of the ` inf ` string (i.e., bracked by spaces)
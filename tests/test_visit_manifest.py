@@ -0,0 +1,43 @@
+"""
+Unit tests for the VisitManifest class.
+"""
+import os
+import shutil
+import unittest
+from desc.imsim import VisitManifest
+
+
+class VisitManifestTestCase(unittest.TestCase):
+    "TestCase class for the VisitManifest."
+    def setUp(self):
+        self.outdir = 'visit_manifest_dir'
+
+    def tearDown(self):
+        if os.path.isdir(self.outdir):
+            shutil.rmtree(self.outdir)
+
+    def test_record(self):
+        "Test recording and reading completed sensors."
+        manifest = VisitManifest(self.outdir, 230, 'r')
+        self.assertFalse(manifest.exists())
+        self.assertEqual(manifest.completed_sensors(), dict())
+
+        files = [os.path.join(self.outdir, 'lsst_a_230_R22_S11_r.fits')]
+        manifest.record('R:2,2 S:1,1', files)
+        manifest.record('R:2,2 S:1,2', [])
+        # Simulate a record that was interrupted while being written.
+        with open(manifest.manifest_file, 'a') as output:
+            output.write('{"sensor": "R:2,2 S:2,2", "fil')
+
+        manifest = VisitManifest(self.outdir, 230, 'r')
+        self.assertTrue(manifest.exists())
+        self.assertEqual(manifest.completed_sensors(),
+                         {'R:2,2 S:1,1': files, 'R:2,2 S:1,2': []})
+
+        # Manifests are separate for each visit and band.
+        self.assertFalse(VisitManifest(self.outdir, 231, 'r').exists())
+        self.assertFalse(VisitManifest(self.outdir, 230, 'i').exists())
+
+
+if __name__ == '__main__':
+    unittest.main()